@@ -1,17 +1,21 @@
-from tac_scenario_generator.adapters.combat_mission.adapter import \
-    CombatMissionAdapter
+from importlib import import_module
+
+# The adapter class for each game id, as (module, class name). Adapters are
+# only imported when they are asked for, so that importing this package stays
+# cheap whatever the adapters themselves depend on.
+ADAPTERS = {
+    'cmbo': ('tac_scenario_generator.adapters.combat_mission.adapter', 'CombatMissionAdapter'),
+    'cmbb': ('tac_scenario_generator.adapters.combat_mission.adapter', 'CombatMissionAdapter'),
+    'cmak': ('tac_scenario_generator.adapters.combat_mission.adapter', 'CombatMissionAdapter'),
+}
 
 
 def get_adapter(game_id):
     """Given a game id as a string, return the matching adapter class. Raises a
     ValueError if the game_id is not recognized.
     """
-    adapters = {
-        'cmbo': CombatMissionAdapter,
-        'cmbb': CombatMissionAdapter,
-        'cmak': CombatMissionAdapter
-    }
     try:
-        return adapters[game_id](game_id)
+        module_name, class_name = ADAPTERS[game_id]
     except KeyError:
-        raise ValueError(f'Unrecognized game_id {game_id}. Must be one of {adapters.keys()}')
+        raise ValueError(f'Unrecognized game_id {game_id}. Must be one of {ADAPTERS.keys()}')
+    return getattr(import_module(module_name), class_name)(game_id)
@@ -1,13 +1,21 @@
-import csv
 import json
 import logging
 import random
 from collections import defaultdict
-from pathlib import Path
 
-from tac_scenario_generator.adapters.combat_mission.driver import \
-    CombatMissionDriver
-from tac_scenario_generator.settings import DEBUG_DIR
+from tac_scenario_generator.adapters.combat_mission.budget import (BudgetGroup,
+                                                                   fit_budget)
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    ScenarioConfigError
+from tac_scenario_generator.adapters.combat_mission.force_store import (
+    ForceStore, ForceTable, get_force_data_directory)
+from tac_scenario_generator.adapters.combat_mission.journal import \
+    PopulationJournal
+from tac_scenario_generator.adapters.combat_mission.sampling import \
+    compile_sampler
+from tac_scenario_generator.adapters.combat_mission.scenario import \
+    compile_scenario
+from tac_scenario_generator.settings import DEBUG_DIR, JOURNAL_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +24,16 @@ logger = logging.getLogger(__name__)
 # represent "infinite rarity". i.e., that the unit is not available.
 INFINITE_RARITY_VALUE = 999
 
+# Units which are never picked at random, per unit type.
+RANDOM_UNIT_EXCLUSIONS = {
+    # Assault boats are just too weird to deal with.
+    'Vehicle': ['Assault Boat'],
+}
+
+
+def get_oob_debug_path(army):
+    return DEBUG_DIR / f'{army}_oob.json'
+
 
 def infinite_defaultdict():
     return defaultdict(infinite_defaultdict)
@@ -27,34 +45,116 @@ class CombatMissionAdapter:
     generation Combat Mission games.
     """
 
-    def __init__(self, game_id):
+    def __init__(self, game_id, driver=None):
+        """driver is the CombatMissionDriver used to populate the game. It is
+        only created when the game is first populated, so that generating
+        oobs never loads the screen capture and OCR dependencies, and works
+        without a display.
+        """
         self._game_id = game_id
-        self._driver = CombatMissionDriver(game_id)
+        self._driver = driver
         self._force_data = infinite_defaultdict()
+        self._force_store = None
+        self._samplers = {}
+        self.budgets = {}
 
-    def generate_and_populate(self, scenario_config):
+    def generate_and_populate(self, scenario_config, plan=None):
         """This method will parse the scenario config, generate a configuration
         manifest, and implement that manifest into the scenario editor.
         Presumes that the user has already navigated to the scenario editor.
+        Returns the allied and axis oobs, as returned by generate_oobs(). See
+        generate() for plan.
         """
-        self.year = scenario_config['year']
-        self.month = scenario_config['month']
-        self.region = scenario_config['region']
-        army_configs = scenario_config.get('armies')
+        allied_oob, axis_oob = self.generate(scenario_config, plan=plan)
+        oobs = [oob for oob in (allied_oob, axis_oob) if oob]
 
-        allied_oob, axis_oob = self.generate_oobs(army_configs)
-
-        if allied_oob:
-            self._driver.populate_oob(allied_oob)
-        if axis_oob:
-            self._driver.populate_oob(axis_oob)
+        journal = PopulationJournal.start(JOURNAL_PATH, oobs)
+        for oob in oobs:
+            self._get_driver().populate_oob(oob, get_vocabulary=self.get_unit_names, journal=journal)
 
         logger.info('Generation and population complete.')
+        return (allied_oob, axis_oob)
 
-    def generate_oob(self, army, config):
+    def generate(self, scenario_config, save_debug=True, plan=None):
+        """Parses the scenario config and generates the allied and axis oobs,
+        as returned by generate_oobs(), without touching the game. Unless plan,
+        the ScenarioPlan returned by compile_scenario() for the config, is
+        given, the config is checked against the force data first, and a
+        ScenarioConfigError raised if there is anything wrong with it. See
+        generate_oob() for save_debug.
+        """
+        if plan is None:
+            self.compile_scenario(scenario_config)
+        self.set_scenario(scenario_config)
+        return self.generate_oobs(scenario_config.get('armies'), save_debug=save_debug)
+
+    def compile_scenario(self, scenario_config):
+        """Checks scenario_config against the game's force data, and returns
+        it as a ScenarioPlan. Raises a ScenarioConfigError if there is anything
+        wrong with it. This takes milliseconds, so call it before doing
+        anything slow with the config.
+        """
+        return compile_scenario(self, scenario_config)
+
+    def resume(self, scenario_config, journal_path=JOURNAL_PATH):
+        """Carries on populating the oobs of a run which stopped part way
+        through, such as after a crash, from where its journal says it got to.
+        The oobs are read back from the journal, rather than generated again.
+        Presumes that the game is still on whichever
+        screen the run stopped on.
+        """
+        self.set_scenario(scenario_config)
+        journal = PopulationJournal.open(journal_path)
+        for oob in journal.oobs:
+            self._get_driver().populate_oob(oob, get_vocabulary=self.get_unit_names, journal=journal)
+
+        logger.info('Population resumed and complete.')
+
+    def _get_driver(self):
+        if self._driver is None:
+            from tac_scenario_generator.adapters.combat_mission.driver import \
+                CombatMissionDriver
+            self._driver = CombatMissionDriver(self._game_id)
+        return self._driver
+
+    def set_scenario(self, scenario_config):
+        """Sets the year, month and region of the scenario, which determine
+        the rarity of each unit, and the optional point budgets.
+
+        budgets maps an army or nation name to a dict of points, and optionally
+        a tolerance in points either side, which defaults to 0. A nation's own
+        budget covers that nation, and an army's budget covers the army's
+        nations which don't have their own. For example:
+            budgets:
+              Axis:
+                points: 1500
+                tolerance: 50
+              Canadian:
+                points: 800
+        """
+        self.year = scenario_config['year']
+        self.month = scenario_config['month']
+        self.region = scenario_config['region']
+        self.budgets = scenario_config.get('budgets') or {}
+        # A date the compiled force data doesn't cover fails here, rather than
+        # part way through generating.
+        store = self._get_force_store()
+        if store:
+            store.check_date(self.region, self.month, self.year)
+
+    def generate_oob(self, army, config, rng=random, save_debug=True):
         """Returns a ready-to-populate order of battle. Presumse the adapter
         has been initialized with a year, month, and region.
 
+        rng is the random.Random to generate the oob with, which defaults to
+        the random module's shared one. Unless save_debug is False, the oob is
+        also dumped to the debug directory.
+
+        If any point budgets apply to the army (see set_scenario()), the
+        units are fitted to them, and the oob also has a 'budgets' key, with a
+        report of how close each budget came to its points, as returned by
+        fit_budget().
+
         An example output oob:
         {
             'army': 'Allied',
@@ -73,6 +173,7 @@ class CombatMissionAdapter:
         logger.info(f'Generating {army} OOB from this config: {config}')
 
         oob = {'army': army, 'nations': {}}
+        groups = []
 
         for nation, waves in config.items():
             nation_index = oob['nations'][nation] = {}
@@ -84,33 +185,106 @@ class CombatMissionAdapter:
                         unit_type_index = division_index[unit_type] = []
                         for unit_config in unit_configs:
                             units = self._generate_units(
-                                army=army, nation=nation, division=division, unit_type=unit_type, **unit_config
+                                army=army, nation=nation, division=division, unit_type=unit_type, rng=rng,
+                                **unit_config
                             )
-                            unit_type_index.extend(units)
-                    # TODO: could sort the units within each unit type to
-                    # minimize the amount of division/fitness/etc. juggling
-
-        debug_path = DEBUG_DIR / f'{army}_oob.json'
-        with open(debug_path, 'w') as f:
-            json.dump(oob, f, indent=4)
-        logger.debug(f'{army} oob debug artifact dumped to {debug_path}')
+                            groups.append({
+                                'nation': nation, 'division': division, 'unit_type': unit_type,
+                                'unit_config': unit_config, 'units': units, 'index': unit_type_index,
+                            })
+
+        budget_reports = self._fit_budgets(army, groups, rng)
+        if budget_reports:
+            oob['budgets'] = budget_reports
+        for group in groups:
+            group['index'].extend(group['units'])
+
+        if save_debug:
+            debug_path = get_oob_debug_path(army)
+            with open(debug_path, 'w') as f:
+                json.dump(oob, f, indent=4)
+            logger.debug(f'{army} oob debug artifact dumped to {debug_path}')
         logger.info(f'{army} OOB generated.')
 
         return oob
 
-    def generate_oobs(self, army_configs):
+    def _fit_budgets(self, army, groups, rng):
+        """Fits the units of groups, as built by generate_oob(), to the
+        budgets for army and its nations, in place. Returns a dict of the name
+        of each budget to its report.
+        """
+        scopes = {}
+        for group in groups:
+            if group['nation'] in self.budgets:
+                scopes.setdefault(group['nation'], []).append(group)
+            elif army in self.budgets:
+                scopes.setdefault(army, []).append(group)
+
+        reports = {}
+        for scope, scope_groups in scopes.items():
+            budget = self.budgets[scope]
+            budget_groups = [self._get_budget_group(**group) for group in scope_groups]
+            report = reports[scope] = fit_budget(budget_groups, budget['points'], budget.get('tolerance', 0), rng)
+            if report['within_tolerance']:
+                logger.info(f'{scope} costs {report["total"]} points, within budget.')
+            else:
+                logger.warning(
+                    f'{scope} costs {report["total"]} points, which is as close as its unit configs allow to the '
+                    f'budget of {report["points"]}±{report["tolerance"]}.'
+                )
+        return reports
+
+    def _get_budget_group(self, nation, division, unit_type, unit_config, units, index):
+        """Returns the BudgetGroup for a group of units generated from
+        unit_config. See _generate_units() for the unit_config keys.
+        """
+        unit_name = unit_config['unit_name']
+        if unit_config.get('count_min') is not None:
+            min_count, max_count = unit_config['count_min'], unit_config['count_max']
+        else:
+            min_count, max_count = 0, unit_config.get('count', 1)
+        # An empty group might have been left out by its chance roll, in which
+        # case it mustn't be filled in to make up the points.
+        extendable = bool(units) or unit_config.get('chance', 100) >= 100
+
+        try:
+            costs = self.get_unit_costs(nation=nation, division=division, unit_type=unit_type)
+        except FileNotFoundError as e:
+            name = self.get_force_data_name(nation=nation, division=division, unit_type=unit_type)
+            raise ScenarioConfigError(
+                f'{unit_name} {nation} {division} {unit_type} is in a budget, but there is no force data file '
+                f'{name}.csv to cost it.'
+            ) from e
+        if unit_name == 'random':
+            sampler = self.get_sampler(nation=nation, unit_type=unit_type, division=division)
+            options = [(name, weight, costs[name]) for name, weight in zip(sampler.names, sampler.weights)]
+        elif unit_name in costs:
+            options = [(unit_name, 1, costs[unit_name])]
+        else:
+            logger.warning(f'No cost for {nation} {unit_name} in the force data, so it is left out of the budget.')
+            costs = {unit_name: 0}
+            options = []
+        return BudgetGroup(
+            units, costs, options, min_count, max_count, extendable=extendable,
+            all_same=unit_config.get('all_same', False)
+        )
+
+    def generate_oobs(self, army_configs, rng=random, save_debug=True):
         """Returns both an allied and axis oob. Returns None for any army which
         has no army configuration. Assumes the adapter has been initialized
-        with a self.year, self.month, and self.region (if applicable).
+        with a self.year, self.month, and self.region (if applicable). See
+        generate_oob() for rng and save_debug.
         """
         allied_oob = None
         axis_oob = None
         if army_configs:
             logger.info('Generating OOBs.')
             if army_configs.get('Allied'):
-                allied_oob = self.generate_oob(army='Allied', config=army_configs['Allied'])
+                allied_oob = self.generate_oob(
+                    army='Allied', config=army_configs['Allied'], rng=rng, save_debug=save_debug
+                )
             if army_configs.get('Axis'):
-                axis_oob = self.generate_oob(army='Axis', config=army_configs['Axis'])
+                axis_oob = self.generate_oob(army='Axis', config=army_configs['Axis'], rng=rng, save_debug=save_debug)
             logger.info('OOBs generated.')
         else:
             logger.info('No army configs provided. Skipping OOB generation.')
@@ -129,7 +303,8 @@ class CombatMissionAdapter:
             count_max=None,
             chance_per_unit=100,
             chance=100,
-            all_same=False
+            all_same=False,
+            rng=random
     ):
         """Generates zero or more units in oob format.
 
@@ -161,16 +336,24 @@ class CombatMissionAdapter:
             to generate a random number between these two integers. Passing
             count_min and count_max disables the count/chance_per_unit calculation.
         count_max (int): Max number of units that may appear. See count_min.
+
+        rng (random.Random): Source of randomness. Defaults to the random
+            module's shared one.
         """
         units = []
 
-        if random.randint(1, 100) > chance:
+        if rng.randint(1, 100) > chance:
             return units
 
         _count = self._get_unit_count(
-            count=count, count_min=count_min, count_max=count_max, chance_per_unit=chance_per_unit
+            count=count, count_min=count_min, count_max=count_max, chance_per_unit=chance_per_unit, rng=rng
         )
 
+        # Random units which needn't be the same are drawn in one go.
+        if unit_name == 'random' and not all_same and _count > 0:
+            sampler = self.get_sampler(nation=nation, unit_type=unit_type, division=division)
+            return [{'name': name} for name in sampler.draw(_count, rng=rng)]
+
         for i in range(0, _count):
             # If all the units are supposed to be the same and we've generated
             # one already, then keep using that same unit name.
@@ -179,46 +362,108 @@ class CombatMissionAdapter:
             else:
                 _unit_name = unit_name
             unit = self._generate_unit(
-                army=army, nation=nation, division=division, unit_type=unit_type, unit_name=_unit_name
+                army=army, nation=nation, division=division, unit_type=unit_type, unit_name=_unit_name, rng=rng
             )
             units.append(unit)
 
         return units
 
+    def get_unit_names(self, nation, division, unit_type):
+        """Returns the names of every unit in the force data for the given
+        nation, division and unit type, or None if there is no force data for
+        them.
+        """
+        try:
+            force_data = self._get_force_data(nation=nation, unit_type=unit_type, division=division)
+        except FileNotFoundError:
+            return None
+        return list(force_data.names)
+
+    def get_unit_costs(self, nation, division, unit_type):
+        """Returns a dict of the name of every unit in the force data for the
+        given nation, division and unit type to its cost.
+        """
+        force_data = self._get_force_data(nation=nation, unit_type=unit_type, division=division)
+        return dict(zip(force_data.names, force_data.costs))
+
+    def preload_force_data(self, army_configs):
+        """Loads the force data needed to generate random units for
+        army_configs, and returns it as a dict of (nation, unit_type, division)
+        to its ForceTable, which can be handed to other adapters with
+        add_force_data() so that they needn't read it again.
+        """
+        force_data = {}
+        for config in (army_configs or {}).values():
+            for nation, waves in (config or {}).items():
+                for divisions in waves.values():
+                    for division, unit_types in divisions.items():
+                        for unit_type, unit_configs in unit_types.items():
+                            if any(unit_config['unit_name'] == 'random' for unit_config in unit_configs):
+                                force_data[(nation, unit_type, division)] = self._get_force_data(
+                                    nation=nation, unit_type=unit_type, division=division
+                                )
+        return force_data
+
+    def add_force_data(self, force_data):
+        """Adds force data, as returned by preload_force_data(), to the
+        adapter's cache.
+        """
+        for (nation, unit_type, division), table in force_data.items():
+            self._force_data[self._game_id][nation][unit_type][division] = table
+
+    def _get_force_store(self):
+        """Returns the game's compiled ForceStore, or None if it hasn't been
+        compiled, in which case the force data files are read instead.
+        """
+        if self._force_store is None:
+            self._force_store = ForceStore.open(self._game_id) or False
+        return self._force_store
+
+    def get_force_data_name(self, nation, division, unit_type):
+        """Returns the name of the force data file for the given nation,
+        division and unit type, less its extension.
+        """
+        return f'{nation}_{division}_{unit_type}'.replace(' ', '_').lower()
+
     def _get_force_data(self, nation, unit_type, division):
-        """Retrieves force data from cache, or from disk and adds to cache."""
+        """Retrieves force data, as a ForceTable, from cache, or from disk and
+        adds to cache.
+        """
         # try to get force data from memory cache
         force_data = self._force_data[self._game_id][nation][unit_type][division]
         # open the appropriate force_data file based on game, army, nation, unit type and division.
         if force_data == {}:
-            file_name = f'{nation}_{division}_{unit_type}.csv'
-            file_name.replace(' ', '_').lower()
-
-            force_data = []
-            with open(Path(__file__).parent / self._game_id / 'force_data' / file_name, 'r') as f:
-                reader = csv.DictReader(f, delimiter='\t')
-                for row in reader:
-                    force_data.append(row)
+            name = self.get_force_data_name(nation=nation, division=division, unit_type=unit_type)
+            store = self._get_force_store()
+            if store:
+                force_data = store.get_table(name)
+            else:
+                force_data = ForceTable.read_csv(get_force_data_directory(self._game_id) / f'{name}.csv')
 
             # add to the force data to the in memory cache
             self._force_data[self._game_id][nation][unit_type][division] = force_data
 
         return force_data
 
-    def _generate_unit(self, army, nation, division, unit_type, unit_name):
-        """Generates a single unit in oob format. See _generate_units for parameter descriptions."""
-        if unit_name == 'random':
+    def get_sampler(self, nation, unit_type, division):
+        """Returns the UnitSampler for random units of the given nation,
+        unit type and division at the adapter's region, month and year,
+        compiling it from the force data the first time it is needed.
+        """
+        rarity_key = f'{self.region}_{self.month}_{self.year}_rarity'
+        key = (nation, unit_type, division, rarity_key)
+        if key not in self._samplers:
             force_data = self._get_force_data(nation=nation, unit_type=unit_type, division=division)
+            self._samplers[key] = compile_sampler(
+                force_data.names, force_data.get_rarities(self.region, self.month, self.year), INFINITE_RARITY_VALUE,
+                exclude=RANDOM_UNIT_EXCLUSIONS.get(unit_type, ())
+            )
+        return self._samplers[key]
 
-            rarity_key = f'{self.region}_{self.month}_{self.year}_rarity'
-            force_data = [i for i in force_data if i[rarity_key] != INFINITE_RARITY_VALUE]
-            if unit_type == 'Vehicle':
-                # Removes the special case of assault boats, which are just too weird to deal with
-                force_data = [i for i in force_data if i['unit'] != 'Assault Boat']
-
-            unit_names = [unit['unit'] for unit in force_data]
-            weights = [int(100 / ((100 + int(unit[rarity_key])) / 100)) for unit in force_data]
-            _unit_name = random.choices(unit_names, weights=weights)[0]
+    def _generate_unit(self, army, nation, division, unit_type, unit_name, rng=random):
+        """Generates a single unit in oob format. See _generate_units for parameter descriptions."""
+        if unit_name == 'random':
+            _unit_name = self.get_sampler(nation=nation, unit_type=unit_type, division=division).draw_one(rng)
         else:
             _unit_name = unit_name
 
@@ -226,18 +471,18 @@ class CombatMissionAdapter:
 
         return unit
 
-    def _get_unit_count(self, count, count_min, count_max, chance_per_unit):
+    def _get_unit_count(self, count, count_min, count_max, chance_per_unit, rng=random):
         """See _generate_units() for parameter explanations."""
         if (count_min is not None and count_max is None) or (count_max is not None and count_min is None):
             raise ValueError('if count_min is provided, count_max must also be provided.')
         elif count_min is not None and count_max is not None:
             if count_min >= count_max:
                 raise ValueError('count_min must be less that count_max.')
-            _count = random.randint(count_min, count_max)
+            _count = rng.randint(count_min, count_max)
         else:
             _count = 0
             for _ in range(0, count):
-                if random.randint(1, 100) < chance_per_unit:
+                if rng.randint(1, 100) < chance_per_unit:
                     _count += 1
 
         return _count
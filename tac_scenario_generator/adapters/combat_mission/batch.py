@@ -0,0 +1,146 @@
+"""Generates a library of scenario variants from one scenario config, across
+all cores, without touching the game. Run with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.batch scenario_config.yaml library --seed 42
+
+Each variant is written to its own JSON file as soon as it is generated. Every
+variant has its own random stream, derived from the master seed and its index,
+so any one of them can be reproduced exactly, on its own, with --index.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import time
+from pathlib import Path
+
+import numpy
+import yaml
+
+from tac_scenario_generator.adapters.combat_mission.adapter import \
+    CombatMissionAdapter
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _init_worker().
+_worker = None
+
+
+def get_scenario_rng(master_seed, index):
+    """Returns the random.Random for the scenario at index. The streams for
+    different indexes are independent, and don't depend on how the batch was
+    split between workers.
+    """
+    seed_sequence = numpy.random.SeedSequence(master_seed, spawn_key=(index,))
+    return random.Random(int.from_bytes(seed_sequence.generate_state(4).tobytes(), 'little'))
+
+
+def get_scenario_path(directory, index):
+    return Path(directory) / f'scenario_{index:06d}.json'
+
+
+class ScenarioWriter():
+    """Generates scenario variants with one adapter, and writes each to its
+    own file in directory.
+    """
+    def __init__(self, scenario_config, master_seed, directory, force_data=None):
+        self._scenario_config = scenario_config
+        self._master_seed = master_seed
+        self._directory = Path(directory)
+        self._adapter = CombatMissionAdapter(scenario_config['game_id'])
+        self._adapter.set_scenario(scenario_config)
+        if force_data:
+            self._adapter.add_force_data(force_data)
+
+    def write(self, index):
+        """Generates the scenario at index and writes it to disk. Returns the
+        path it was written to.
+        """
+        rng = get_scenario_rng(self._master_seed, index)
+        allied_oob, axis_oob = self._adapter.generate_oobs(
+            self._scenario_config.get('armies'), rng=rng, save_debug=False
+        )
+        scenario = {
+            'master_seed': self._master_seed,
+            'index': index,
+            'allied_oob': allied_oob,
+            'axis_oob': axis_oob,
+        }
+        path = get_scenario_path(self._directory, index)
+        # Write to a temporary file first, so that an interrupted batch never
+        # leaves a half-written scenario behind.
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(scenario, f, indent=4)
+        os.replace(temp_path, path)
+        return path
+
+
+def _init_worker(scenario_config, master_seed, directory, force_data):
+    global _worker
+    # Generating thousands of OOBs would otherwise log each one.
+    logging.getLogger('tac_scenario_generator.adapters.combat_mission.adapter').setLevel(logging.WARNING)
+    _worker = ScenarioWriter(scenario_config, master_seed, directory, force_data)
+
+
+def _write_scenario(index):
+    return _worker.write(index)
+
+
+def generate_batch(scenario_config, directory, count, master_seed, workers=None):
+    """Generates count scenario variants from scenario_config into directory,
+    across workers processes, which defaults to one per core. Yields the path
+    of each scenario as it is written, in whatever order they finish.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    # Read the force data once, here, rather than once per worker.
+    adapter = CombatMissionAdapter(scenario_config['game_id'])
+    adapter.compile_scenario(scenario_config)
+    force_data = adapter.preload_force_data(scenario_config.get('armies'))
+    initargs = (scenario_config, master_seed, directory, force_data)
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        writer = ScenarioWriter(*initargs)
+        for index in range(count):
+            yield writer.write(index)
+        return
+
+    # Big enough chunks to amortise the inter-process overhead, small enough
+    # to keep every worker busy until the end.
+    chunk_size = max(1, min(64, count // (workers * 4)))
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.imap_unordered(_write_scenario, range(count), chunksize=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a library of scenario variants.')
+    parser.add_argument('scenario_config', help='Path to the scenario config to generate variants of.')
+    parser.add_argument('directory', help='Directory to write the scenarios to.')
+    parser.add_argument('-n', type=int, default=100, help='Number of scenarios to generate.')
+    parser.add_argument('--seed', type=int, required=True, help='Master seed for the library.')
+    parser.add_argument('--workers', type=int, help='Number of worker processes. Defaults to one per core.')
+    parser.add_argument('--index', type=int, help='Only regenerate the scenario at this index.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.scenario_config, 'r') as f:
+        scenario_config = yaml.safe_load(f)
+
+    if args.index is not None:
+        Path(args.directory).mkdir(parents=True, exist_ok=True)
+        path = ScenarioWriter(scenario_config, args.seed, args.directory).write(args.index)
+        logger.info(f'Scenario {args.index} written to {path}.')
+        return
+
+    start = time.perf_counter()
+    for i, _ in enumerate(generate_batch(scenario_config, args.directory, args.n, args.seed, args.workers), 1):
+        if i % 1000 == 0:
+            logger.info(f'{i} of {args.n} scenarios written.')
+    logger.info(f'{args.n} scenarios written to {args.directory} in {time.perf_counter() - start:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Benchmarks for the Combat Mission driver. Run with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.benchmark ocr cmak debug/screenshots/*.png
+
+to compare the latency and accuracy of the OCR backends on captured editor
+screenshots, against easyocr with its default settings. Each backend is run in a
+new process, so that the torch threads of one don't carry over to the next.
+This includes easyocr with its CPU profile, which only differs on a machine
+without CUDA, and whose settings can be tuned with --threads, --canvas-size,
+--mag-ratio and --no-quantize. Or run with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.benchmark replay replays/cmak
+
+to time populating the OOBs of a recording made with replay.py, without the
+game.
+"""
+import argparse
+import logging
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image
+from thefuzz import fuzz
+
+from tac_scenario_generator.adapters.combat_mission.adapter import \
+    CombatMissionAdapter
+from tac_scenario_generator.adapters.combat_mission.driver import \
+    CombatMissionDriver
+from tac_scenario_generator.adapters.combat_mission.ocr import (
+    DEFAULT_CPU_PROFILE, EasyOcrBackend, get_font_path)
+from tac_scenario_generator.adapters.combat_mission.replay import (
+    ReplayBundle, ReplayGui)
+from tac_scenario_generator.adapters.combat_mission.tables import print_table
+from tac_scenario_generator.adapters.combat_mission.tracing import tracer
+from tac_scenario_generator.settings import DEBUG_DIR
+
+logger = logging.getLogger(__name__)
+
+# Texts which match with at least this fuzz ratio count as the same text when
+# comparing a backend's readings with the reference readings.
+MATCH_FUZZ_RATIO = 90
+
+
+def get_recall(detections, reference_detections):
+    """Returns the fraction of the texts in reference_detections which also
+    appear in detections, or None if there are no reference texts.
+    """
+    texts = [text for _, text, _ in detections]
+    reference_texts = [text for _, text, _ in reference_detections]
+    if not reference_texts:
+        return None
+    found = sum(
+        any(fuzz.ratio(reference_text, text) >= MATCH_FUZZ_RATIO for text in texts)
+        for reference_text in reference_texts
+    )
+    return found / len(reference_texts)
+
+
+def benchmark_ocr(backends, images, reference_name=None):
+    """Runs each of backends, a dict of name to OcrBackend, over images, each
+    in a process of its own. Returns a dict of name to stats: load time, mean
+    and p95 latency per image, and recall against the readings of the reference
+    backend, which defaults to the first one.
+    """
+    reference_name = reference_name or next(iter(backends))
+    readings = {}
+    results = {}
+    for name, backend in backends.items():
+        # torch's threads are set once per process, so a backend run after
+        # another in the same process would inherit some of its settings.
+        with multiprocessing.Pool(1) as pool:
+            load_time, latencies, readings[name] = pool.apply(_run_ocr_backend, (backend, images))
+        results[name] = {'load_s': load_time, **get_latency_stats(latencies)}
+
+    for name in backends:
+        recalls = [
+            get_recall(detections, reference)
+            for detections, reference in zip(readings[name], readings[reference_name])
+        ]
+        recalls = [recall for recall in recalls if recall is not None]
+        results[name]['recall'] = statistics.mean(recalls) if recalls else None
+    return results
+
+
+def _run_ocr_backend(backend, images):
+    """Loads backend and reads images with it. Returns the load time, the
+    latency of each read and the readings.
+    """
+    start = time.perf_counter()
+    backend.load()
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    readings = []
+    for image in images:
+        start = time.perf_counter()
+        readings.append(backend.readtext(image))
+        latencies.append(time.perf_counter() - start)
+    return load_time, latencies, readings
+
+
+def get_latency_stats(latencies):
+    """Returns the mean, p95 and max of a list of latencies in seconds, in
+    milliseconds, or Nones if there are no latencies.
+    """
+    if not latencies:
+        return {'mean_ms': None, 'p95_ms': None, 'max_ms': None}
+    return {
+        'mean_ms': 1000 * statistics.mean(latencies),
+        'p95_ms': 1000 * sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        'max_ms': 1000 * max(latencies),
+    }
+
+
+def benchmark_replay(bundle, runs=1, pipeline=False):
+    """Populates the OOBs of a ReplayBundle runs times, each time with a new
+    driver, and returns a dict of run name to stats: the number of actions
+    (clicks), the total time, and the latency of each action, measured from the
+    previous click. The runs share one calibration profile, which starts empty,
+    so the first run is cold and later runs are warm. pipeline is passed on
+    to the drivers.
+    """
+    adapter = CombatMissionAdapter(bundle.game_id)
+    results = {}
+    with tempfile.TemporaryDirectory() as calibration_dir:
+        for run in range(runs):
+            gui = ReplayGui(bundle)
+            driver = CombatMissionDriver(
+                bundle.game_id, gui=gui, calibration_dir=calibration_dir, pipeline=pipeline
+            )
+            start = time.perf_counter()
+            for oob in bundle.oobs:
+                driver.populate_oob(oob, get_vocabulary=adapter.get_unit_names)
+            total_time = time.perf_counter() - start
+            if not gui.finished:
+                logger.warning(f'Run {run} finished with clicks of the recording left to replay.')
+            latencies = [b - a for a, b in zip([start] + gui.click_times, gui.click_times)]
+            results[f'run {run}'] = {
+                'actions': len(latencies),
+                'total_s': total_time,
+                **get_latency_stats(latencies),
+                'latencies': latencies,
+            }
+    return results
+
+
+def run_ocr_benchmark(args):
+    images = [Image.open(path).convert('RGB') for path in args.screenshots]
+    backends = {'easyocr': EasyOcrBackend(cpu_profile=None)}
+    cpu_profile = DEFAULT_CPU_PROFILE._replace(
+        **{key: value for key, value in vars(args).items() if key in DEFAULT_CPU_PROFILE._fields and value is not None}
+    )
+    backends['easyocr-cpu'] = EasyOcrBackend(cpu_profile=cpu_profile)
+    font_path = get_font_path(args.game_id)
+    if font_path.exists():
+        from tac_scenario_generator.adapters.combat_mission.glyphs import (
+            GlyphBackend, GlyphFont)
+        backends['glyph'] = GlyphBackend(GlyphFont.load(font_path))
+    else:
+        logger.warning(f'No glyph font for {args.game_id} at {font_path}, only benchmarking easyocr.')
+    print_table(benchmark_ocr(backends, images))
+
+
+def run_replay_benchmark(args):
+    bundle = ReplayBundle.load(args.bundle)
+    if args.trace:
+        tracer.enabled = True
+    results = benchmark_replay(bundle, runs=args.runs, pipeline=args.pipeline)
+    if tracer.enabled:
+        tracer.save(DEBUG_DIR)
+    if args.actions:
+        for name, stats in results.items():
+            print_table({f'{name} action {i}': {'ms': 1000 * latency} for i, latency in enumerate(stats['latencies'])})
+    for stats in results.values():
+        del stats['latencies']
+    print_table(results)
+    if args.max_total_s is not None:
+        slowest = max(stats['total_s'] for stats in results.values())
+        if slowest > args.max_total_s:
+            sys.exit(f'Slowest run took {slowest:.3f}s, more than the {args.max_total_s}s allowed.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the Combat Mission driver.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    ocr_parser = subparsers.add_parser('ocr', help='Compare OCR backends on screenshots.')
+    ocr_parser.add_argument('game_id')
+    ocr_parser.add_argument('screenshots', nargs='+')
+    ocr_parser.add_argument('--threads', type=int, help="Torch threads for easyocr's CPU profile.")
+    ocr_parser.add_argument('--canvas-size', type=int, help="easyocr's canvas_size in its CPU profile.")
+    ocr_parser.add_argument('--mag-ratio', type=float, help="easyocr's mag_ratio in its CPU profile.")
+    ocr_parser.add_argument(
+        '--no-quantize', dest='quantize', action='store_false', default=None,
+        help="Don't quantise easyocr's models in its CPU profile, which easyocr otherwise does by default."
+    )
+    ocr_parser.set_defaults(run=run_ocr_benchmark)
+    replay_parser = subparsers.add_parser('replay', help='Time populating the OOBs of a recording.')
+    replay_parser.add_argument('bundle', help='Directory of a recording made with replay.py.')
+    replay_parser.add_argument('--runs', type=int, default=2, help='Number of runs. The first run is cold.')
+    replay_parser.add_argument('--actions', action='store_true', help='Also print the latency of every action.')
+    replay_parser.add_argument('--pipeline', action='store_true', help='Run the drivers with OCR pipelining.')
+    replay_parser.add_argument('--trace', action='store_true', help='Save a trace of the runs to the debug directory.')
+    replay_parser.add_argument(
+        '--max-total-s', type=float, help='Exit with an error if any run takes longer than this, for CI.'
+    )
+    replay_parser.set_defaults(run=run_replay_benchmark)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
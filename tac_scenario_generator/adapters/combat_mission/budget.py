@@ -0,0 +1,98 @@
+import random
+
+
+class BudgetGroup():
+    """The units generated for one unit config, along with what the budget
+    fitting may do to them.
+
+    options is a list of (name, weight, cost) for each unit which may be added
+    to the group, where weight is its rarity weight. The group must keep
+    between min_count and max_count units. If extendable is False, units may
+    be removed or swapped but not added, such as when the group's chance roll
+    may have left it out entirely. If all_same is True, every unit in the group
+    must stay the same unit.
+    """
+    def __init__(self, units, costs, options, min_count, max_count, extendable=True, all_same=False):
+        self.units = units
+        self.costs = costs
+        self.options = options
+        self.min_count = min_count
+        self.max_count = max_count
+        self.extendable = extendable
+        self.all_same = all_same
+
+    def get_total(self):
+        return sum(self.costs[unit['name']] for unit in self.units)
+
+    def get_addable_options(self, room):
+        """Returns the options which could be added to the group without
+        costing more than room. Free units are never added, since they don't
+        bring the total any closer to the budget.
+        """
+        if not self.extendable or len(self.units) >= self.max_count:
+            return []
+        options = self.options
+        if self.all_same and self.units:
+            options = [option for option in options if option[0] == self.units[0]['name']]
+        return [option for option in options if 0 < option[2] <= room]
+
+
+def fit_budget(groups, points, tolerance=0, rng=random):
+    """Adds, removes and swaps units in groups, a list of BudgetGroup, until
+    their total cost is within tolerance of points, or as close below it as the
+    groups allow. Returns a report of the result.
+
+    Rather than regenerating until the total happens to fit, this first removes
+    random units while over budget, then adds rarity-weighted random units
+    which still fit while under budget, and finally tries swapping single units
+    for ones which land within tolerance. Each step is bounded by the number of
+    units the groups can hold, so this returns quickly even for large budgets.
+    """
+    total = sum(group.get_total() for group in groups)
+    low, high = points - tolerance, points + tolerance
+
+    while total > high:
+        removable = [
+            (group, i) for group in groups for i, unit in enumerate(group.units)
+            if len(group.units) > group.min_count and group.costs[unit['name']] > 0
+        ]
+        if not removable:
+            break
+        group, i = rng.choice(removable)
+        unit = group.units.pop(i)
+        total -= group.costs[unit['name']]
+
+    while total < low:
+        # Pick a group, then a unit within it by rarity, so that groups with
+        # many options don't crowd out the rest.
+        candidates = [(group, group.get_addable_options(high - total)) for group in groups]
+        candidates = [(group, options) for group, options in candidates if options]
+        if not candidates:
+            break
+        group, options = rng.choice(candidates)
+        name, _, cost = rng.choices(options, weights=[max(weight, 1) for _, weight, _ in options])[0]
+        group.units.append({'name': name})
+        total += cost
+
+    if not low <= total <= high:
+        swaps = []
+        for group in groups:
+            if group.all_same:
+                continue
+            for i, unit in enumerate(group.units):
+                for name, weight, cost in group.options:
+                    if low <= total - group.costs[unit['name']] + cost <= high:
+                        swaps.append((group, i, name, weight, cost))
+        if swaps:
+            group, i, name, _, cost = rng.choices(swaps, weights=[max(swap[3], 1) for swap in swaps])[0]
+            total += cost - group.costs[group.units[i]['name']]
+            group.units[i] = {'name': name}
+
+    report = {
+        'points': points,
+        'tolerance': tolerance,
+        'total': total,
+        'difference': total - points,
+        'within_tolerance': low <= total <= high,
+    }
+    return report
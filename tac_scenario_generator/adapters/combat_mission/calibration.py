@@ -0,0 +1,134 @@
+import base64
+import json
+import logging
+import os
+from pathlib import Path
+
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.settle import frames_differ
+
+logger = logging.getLogger(__name__)
+
+# Labels which are drawn at the same place on every run, for a given game and
+# screen resolution, and so can be located once and remembered.
+STATIC_LABELS = {
+    'cmbo': ['UNITS', 'OK', 'FORCE', 'LOCATION', 'On Map', 'Artillery', 'CHOSEN', 'Fortification'],
+    'cmbb': ['Unit', 'OK', 'Nation', 'Location', 'On Map', 'Division', 'Artillery/Air', 'CHOSEN', 'Fortification'],
+    'cmak': ['Unit', 'OK', 'Nation', 'Location', 'On Map', 'Division', 'Artillery/Air', 'CHOSEN', 'Fortification'],
+}
+
+# How many appearances of each label are remembered. Some labels, such as the
+# unit type tabs, are drawn differently when they are selected.
+MAX_LABEL_APPEARANCES = 4
+
+
+def get_profile_path(directory, game_id, screen_size):
+    width, height = screen_size
+    return Path(directory) / f'{game_id}_{width}x{height}.json'
+
+
+class CalibrationProfile():
+    """Remembers where the static labels of a game's UI are, along with
+    offsets derived from them, for one screen resolution. Each label is stored
+    with thumbnails of the ways it has appeared, as made by
+    settle.get_thumbnail(), so that the driver can check that the label is
+    still there with a capture of just those pixels, instead of finding it
+    again by OCR.
+
+    The profile is saved to disk whenever it changes, so that later runs start
+    warm.
+    """
+    def __init__(self, path, game_id, screen_size):
+        self._path = Path(path)
+        self._game_id = game_id
+        self._screen_size = tuple(screen_size)
+        self._labels = {}
+        self._offsets = {}
+
+    @classmethod
+    def load(cls, directory, game_id, screen_size):
+        """Loads the profile for the game and screen size from directory. If
+        there isn't one, or it can't be read, returns an empty profile which
+        will be saved there.
+        """
+        path = get_profile_path(directory, game_id, screen_size)
+        profile = cls(path, game_id, screen_size)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            profile._labels = {
+                text: (tuple(label['extents']), [_decode_thumbnail(appearance) for appearance in label['appearances']])
+                for text, label in data['labels'].items()
+            }
+            profile._offsets = data['offsets']
+            logger.debug(f'Loaded calibration profile {path} with {len(profile._labels)} labels.')
+        except FileNotFoundError:
+            logger.debug(f'No calibration profile at {path}, starting a new one.')
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f'Calibration profile {path} is invalid, starting a new one.')
+        return profile
+
+    def is_static_label(self, text):
+        return text in STATIC_LABELS.get(self._game_id, [])
+
+    def get_label(self, text):
+        """Returns ((left, top, right, bottom), thumbnails) for the label, or
+        None if it hasn't been calibrated.
+        """
+        return self._labels.get(text)
+
+    def matches_label(self, text, thumbnail):
+        """Returns whether thumbnail looks like one of the remembered
+        appearances of the label.
+        """
+        _, appearances = self._labels.get(text, (None, []))
+        return any(not frames_differ(thumbnail, appearance) for appearance in appearances)
+
+    def set_label(self, text, extents, thumbnail):
+        """Records the label at extents, looking like thumbnail. If it was
+        already there, thumbnail is remembered as another appearance of it,
+        replacing the oldest once there are MAX_LABEL_APPEARANCES.
+        """
+        extents = tuple(int(i) for i in extents)
+        old_extents, appearances = self._labels.get(text, (None, []))
+        if old_extents == extents and self.matches_label(text, thumbnail):
+            return
+        if old_extents != extents:
+            appearances = []
+        self._labels[text] = (extents, (appearances + [thumbnail])[-MAX_LABEL_APPEARANCES:])
+        self.save()
+
+    def get_offset(self, name):
+        return self._offsets.get(name)
+
+    def set_offset(self, name, value):
+        if self._offsets.get(name) != value:
+            self._offsets[name] = value
+            self.save()
+
+    def save(self):
+        data = {
+            'game_id': self._game_id,
+            'screen_size': list(self._screen_size),
+            'labels': {
+                text: {'extents': list(extents), 'appearances': [_encode_thumbnail(t) for t in appearances]}
+                for text, (extents, appearances) in self._labels.items()
+            },
+            'offsets': self._offsets,
+        }
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that a crash never leaves a
+        # half-written profile behind.
+        temp_path = self._path.with_suffix('.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_path, self._path)
+
+
+def _encode_thumbnail(thumbnail):
+    return {'size': list(thumbnail.size), 'pixels': base64.b64encode(thumbnail.tobytes()).decode()}
+
+
+def _decode_thumbnail(data):
+    return Image.frombytes('L', tuple(data['size']), base64.b64decode(data['pixels']))
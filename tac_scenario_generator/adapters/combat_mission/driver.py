@@ -1,21 +1,67 @@
 import logging
-import time
-from datetime import datetime
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import nullcontext
 from enum import Enum
+from functools import partial
 
-# TODO: if we stick with easyOCR, we should archive the model weights with this
-# project so that it's reproducible even if EasyOCR changes in the future.
-import easyocr
-import pyautogui
-from thefuzz import fuzz
-from thefuzz import process as fuzz_process
+from PIL import ImageChops
 
+from tac_scenario_generator.adapters.combat_mission import ocr_service
+from tac_scenario_generator.adapters.combat_mission.calibration import \
+    CalibrationProfile
 from tac_scenario_generator.adapters.combat_mission.errors import \
     ScreenStateError
-from tac_scenario_generator.settings import SCREENSHOTS_DIR
+from tac_scenario_generator.adapters.combat_mission.layout import (
+    Layout, get_bbox_extents, get_bbox_from_extents, translate_detections)
+from tac_scenario_generator.adapters.combat_mission.ocr import (
+    FallbackOcrBackend, get_ocr_backend)
+from tac_scenario_generator.adapters.combat_mission.pipeline import Prefetcher
+from tac_scenario_generator.adapters.combat_mission.planner import (
+    get_active_selections, plan_oob)
+from tac_scenario_generator.adapters.combat_mission.screen_cache import (
+    ScreenCache, fingerprint)
+from tac_scenario_generator.adapters.combat_mission.screenshots import \
+    ScreenshotWriter
+from tac_scenario_generator.adapters.combat_mission.settle import (
+    get_thumbnail, wait_for_change, wait_for_stable)
+from tac_scenario_generator.adapters.combat_mission.spatial import \
+    DetectionIndex
+from tac_scenario_generator.adapters.combat_mission.tracing import tracer
+from tac_scenario_generator.settings import (CALIBRATION_DIR, OCR_PIPELINE,
+                                             SCREENSHOT_RETENTION,
+                                             SCREENSHOTS_DIR, VERIFY_ADDS)
 
 logger = logging.getLogger(__name__)
 
+# When reading only a region of the screen, a match scoring below this is
+# treated as "not found", and the whole screen is read instead. This guards
+# against the layout being wrong, or a dropdown opening somewhere unexpected.
+ROI_MIN_FUZZ_RATIO = 80
+
+# After a click, the driver polls the affected part of the screen every
+# SETTLE_INTERVAL seconds. It waits up to SETTLE_CHANGE_TIMEOUT for the click to
+# have a visible effect, since some clicks legitimately change nothing, and then
+# up to SETTLE_TIMEOUT for the screen to stop changing.
+SETTLE_INTERVAL = 0.03
+SETTLE_CHANGE_TIMEOUT = 0.3
+SETTLE_TIMEOUT = 2.0
+
+# After adding a unit, the CHOSEN panel is compared with how it looked before
+# the click. A change no taller than this many rows of text is taken to be the
+# one new row. Anything taller, such as the panel scrolling, is ambiguous, and
+# the changed part is read to check the unit is there. A unit whose click
+# changed nothing is clicked again, up to ADD_ATTEMPTS times in all.
+NEW_ROW_MAX_ROWS = 1.5
+ADD_ATTEMPTS = 2
+
+# How many frames' detection indexes to keep around for queries.
+INDEX_CACHE_SIZE = 8
+
+# How far, in pixels, the top of a unit type tab may be from the top of the
+# Fortification tab.
+UNIT_TYPE_ROW_TOLERANCE = 10
+
 
 class CombatMissionDriver():
     """ABC for drivers which manage the state of and interactions with the
@@ -24,63 +70,179 @@ class CombatMissionDriver():
     class. CMBO (Combat Mission Beyond Overlord) has the most significant
     differences from the other two.
     """
-    def __init__(self, game_id):
+    def __init__(self, game_id, gui=None, calibration_dir=CALIBRATION_DIR, pipeline=OCR_PIPELINE, verify=VERIFY_ADDS):
+        """gui is the object used to capture the screen and click, which
+        defaults to the pyautogui module. Anything with the same screenshot(),
+        size(), moveTo() and click() functions will do, such as the recording
+        and replaying backends in replay.py.
+
+        If pipeline is True, regions which are about to be read are OCRed on a
+        background thread while the driver waits for them to settle. See
+        click_and_settle().
+
+        If verify is True, the CHOSEN panel is checked after each unit is
+        added. See _add_unit_verified().
+        """
         self._current_screen = Screen.SCENARIO_EDITOR
         self._game_id = game_id
+        self._gui = gui
+        self._calibration_dir = calibration_dir
 
         # These will be lazily populated as needed
-        self._reader = None
-        self._chosen_label_bbox = None
-        self._fortification_label_bbox = None
-
-    def populate_oob(self, oob):
+        self._ocr_backend = None
+        self._indexes = OrderedDict()
+        self._layout = None
+        self._calibration = None
+
+        # One cache per captured region, keyed by the region tuple. The full
+        # screen is keyed by None.
+        self._screen_caches = defaultdict(ScreenCache)
+        self._screenshot_writer = ScreenshotWriter(SCREENSHOTS_DIR, retention=SCREENSHOT_RETENTION)
+        # OCR backends aren't necessarily thread safe, so only one read runs
+        # at a time, whichever thread it is on.
+        self._ocr_lock = threading.Lock()
+        self._prefetcher = Prefetcher(self._readtext) if pipeline else None
+        self._verify = verify
+
+    def populate_oob(self, oob, get_vocabulary=None, journal=None):
         """Given an OOB as prepared by the adapter's generate_oob(), populate the units for
         the oob into the editor. Presumes that the screen is already navigated
         to the main scenario editor screen.
-        """
-        logger.info(f'Populating {oob["army"]} OOB')
-        self._go_to_unit_editor()
-
-        # Select correct army
-        if oob['army'] == 'Allied':
-            self.click_text('Axis')
-            self.click_text('Allied')
-        elif oob['army'] == 'Axis':
-            pass
-        else:
-            raise ValueError(f'Army must be either "Allied" or "Axis". Got {oob["army"]}.')
-
-        for nation, waves in oob['nations'].items():
-            nation_label_text = 'FORCE' if self._game_id == 'cmbo' else 'Nation'
-            self._click_below_label(nation_label_text)
-            self.click_text(nation)
-
-            for wave, divisions in waves.items():
-                wave_label_text = 'LOCATION' if self._game_id == 'cmbo' else 'Location'
-                self._click_below_label(wave_label_text)
-                self._click_wave_selection(wave)
 
-                for division, unit_types in divisions.items():
-                    if self._game_id != 'cmbo':
-                        self._click_below_label('Division')
-                        self.click_text(division)
+        get_vocabulary is an optional callable taking nation, division and
+        unit_type keyword arguments, which returns the names of every unit that
+        can appear in the unit list for them, or None if they aren't known.
+        Knowing what can appear lets the driver tell similar names apart.
 
-                    for unit_type, units in unit_types.items():
-                        if unit_type == 'Artillery' or unit_type == 'Air':
-                            unit_type_label_text = 'Artillery' if self._game_id == 'cmbo' else 'Artillery/Air'
-                        else:
-                            unit_type_label_text = unit_type
-                        self.click_unit_type(unit_type_label_text)
-
-                        for unit in units:
-                            self.add_unit(unit['name'])
-
-        self._go_to_scenario_editor()
-        logger.info(f'Finished populating {oob["army"]} OOB')
+        If journal, a PopulationJournal, is given, progress is recorded in it,
+        and whatever it records as already done for this army is skipped. This
+        is how a crashed run resumes, in which case the screen is presumed to
+        be wherever the journal says the run left it.
+        """
+        army = oob['army']
+        progress = journal.get_progress(army) if journal else None
+        if progress and progress.finished:
+            logger.info(f'{army} OOB was already populated')
+            return
+        if progress and progress.in_unit_editor:
+            self._current_screen = Screen.UNIT_EDITOR
+
+        logger.info(f'Populating {army} OOB')
+        self.execute_plan(plan_oob(oob, self._game_id), get_vocabulary, journal=journal, army=army, progress=progress)
+        if journal:
+            journal.record(event='finished', army=army)
+        logger.info(f'Finished populating {army} OOB')
+
+    def execute_plan(self, actions, get_vocabulary=None, journal=None, army=None, progress=None):
+        """Carries out a plan, as returned by plan_oob(). See populate_oob()
+        for get_vocabulary.
+
+        If journal is given, each action, and each unit added, is recorded in
+        it under army. progress is an ArmyProgress of an earlier, interrupted
+        run of the same plan, in which case the plan resumes from the first
+        action which wasn't finished, first making the selections which were
+        active at that point again.
+        """
+        first = 0
+        if progress:
+            unfinished = [i for i, action in enumerate(actions) if not self._is_done(i, action, progress)]
+            if not unfinished:
+                return
+            first = unfinished[0]
+            logger.info(f'Resuming {army} OOB from action {first + 1} of {len(actions)}')
+        if first and self._current_screen is Screen.UNIT_EDITOR:
+            for selection in get_active_selections(actions[:first]):
+                with tracer.span(selection.kind, target=selection.target):
+                    self._execute_action(selection, get_vocabulary)
+            if progress.pending and progress.pending[0] == first:
+                self._check_pending_unit(actions, progress, journal, army)
+
+        for i, action in enumerate(actions[first:], first):
+            with tracer.span(action.kind, target=action.target):
+                if action.kind != 'add_units':
+                    self._execute_action(action, get_vocabulary)
+                    if journal:
+                        journal.record(event='action', army=army, index=i, kind=action.kind)
+                    continue
+                done = progress.done if progress else set()
+                unit_indices = [j for j in range(len(action.target)) if (i, j) not in done]
+                track = None
+                if journal:
+                    track = partial(self._track_unit, journal, army, i, action.target, unit_indices)
+                self._execute_action(
+                    action._replace(target=tuple(action.target[j] for j in unit_indices)), get_vocabulary, track
+                )
+
+    def _track_unit(self, journal, army, action_index, unit_names, unit_indices, k):
+        unit_index = unit_indices[k]
+        return journal.adding_unit(army, action_index, unit_index, unit_names[unit_index])
+
+    def _is_done(self, index, action, progress):
+        if action.kind == 'add_units':
+            return all((index, j) in progress.done for j in range(len(action.target)))
+        return index in progress.actions
+
+    def _check_pending_unit(self, actions, progress, journal, army):
+        """Works out whether the unit which was being added when the journal
+        stopped was actually added, by comparing how many of that unit are in
+        the CHOSEN panel with how many the journal records as added. If it
+        was, it is recorded as done.
+        """
+        action_index, unit_index, unit_name = progress.pending
+        journaled = sum(
+            1 for i, j in progress.done if actions[i].kind == 'add_units' and actions[i].target[j] == unit_name
+        )
+        if self.count_chosen(unit_name) > journaled:
+            logger.info(f'{unit_name} was added before the run stopped')
+            progress.done.add((action_index, unit_index))
+            if journal:
+                journal.record(event='added', army=army, action=action_index, unit=unit_index, name=unit_name)
+        progress.pending = None
+
+    def _execute_action(self, action, get_vocabulary=None, track=None):
+        if action.kind == 'open_unit_editor':
+            self._go_to_unit_editor()
+        elif action.kind == 'select_army':
+            self.click_text('Axis' if action.target == 'Allied' else 'Allied')
+            self.click_text(action.target)
+        elif action.kind == 'select_nation':
+            nation_label_text = 'FORCE' if self._game_id == 'cmbo' else 'Nation'
+            self._click_below_label(nation_label_text, 'nation_list')
+            self.click_text(action.target, region='nation_list')
+        elif action.kind == 'select_wave':
+            wave_label_text = 'LOCATION' if self._game_id == 'cmbo' else 'Location'
+            self._click_below_label(wave_label_text, 'location_list')
+            self._click_wave_selection(action.target)
+        elif action.kind == 'select_division':
+            self._click_below_label('Division', 'division_list')
+            self.click_text(action.target, region='division_list')
+        elif action.kind == 'select_unit_type':
+            self.click_unit_type(action.target)
+        elif action.kind == 'add_units':
+            vocabulary = self._get_plan_vocabulary(action, get_vocabulary)
+            self.add_units(list(action.target), vocabulary=vocabulary, track=track)
+        elif action.kind == 'close_unit_editor':
+            self._go_to_scenario_editor()
+        else:
+            raise ValueError(f'Unrecognized action {action.kind}.')
 
-    def _click_below_label(self, label_text):
-        x, y, bbox = self.find_text(label_text)
-        self.click_at_location(x, y + self._get_bbox_height(bbox))
+    def _get_plan_vocabulary(self, action, get_vocabulary):
+        """Returns the vocabulary for an add_units action, which covers all of
+        the unit types it adds, or None if any of them has no vocabulary.
+        """
+        if not get_vocabulary:
+            return None
+        vocabulary = []
+        for unit_type in action.unit_types:
+            unit_names = get_vocabulary(nation=action.nation, division=action.division, unit_type=unit_type)
+            if unit_names is None:
+                return None
+            vocabulary.extend(unit_names)
+        return vocabulary
+
+    def _click_below_label(self, label_text, dropdown_region):
+        x, y, bbox = self.find_text(label_text, region=label_text)
+        self.click_and_settle(x, y + self._get_bbox_height(bbox), dropdown_region, prefetch=True)
 
     def _go_to_unit_editor(self):
         if self._current_screen is not Screen.SCENARIO_EDITOR:
@@ -106,17 +268,163 @@ class CombatMissionDriver():
 
     # TODO: reconsider all of the below functions, and get them above this line or delete them
 
-    def capture_screen(self):
-        # Capture the entire screen and return the screenshot image.
-        screenshot = pyautogui.screenshot()
-
-        screenshot_path = SCREENSHOTS_DIR / f'{str(int(datetime.now().timestamp()))}.png'
-        screenshot.save(screenshot_path)
+    def capture_screen(self, region=None, save_debug=True):
+        """Captures the screen, or only the given (left, top, width, height)
+        region of it, and returns the screenshot image. Unless save_debug is
+        False, a copy is handed to the background writer as a debug artifact,
+        but the image itself never goes through disk.
+        """
+        with tracer.span('screenshot', region=region):
+            screenshot = self._get_gui().screenshot(region=region)
+        if save_debug:
+            with tracer.span('submit_screenshot'):
+                self._screenshot_writer.submit(screenshot)
+
+        return screenshot
+
+    def read_screen(self, region=None, expected=()):
+        """Captures the screen and returns the OCR detections for it, in the
+        format returned by easyocr's readtext(). If region is given, only that
+        (left, top, width, height) part of the screen is read, but the bboxes
+        are still in screen coordinates. If the capture is identical to the
+        previously read one, the cached detections are returned without running
+        OCR again.
+
+        expected is the texts the caller is going to look for. If the OCR
+        backend has a fallback, and any of them aren't in the primary
+        backend's reading, the capture is read again by the fallback. The
+        glyph backend can't see text drawn in the other polarity to its font,
+        yet is confident about what it can see.
+        """
+        return self._read_capture(self.capture_screen(region), region, expected)
 
-        return screenshot, screenshot_path
+    def _read_capture(self, screenshot, region, expected=()):
+        """Returns the OCR detections for a screenshot taken of region by
+        capture_screen(). See read_screen().
+        """
+        read = partial(self._readtext, screenshot, region)
+        if self._prefetcher:
+            prefetched = self._prefetcher.take(screenshot, region)
+            if prefetched:
+                read = prefetched.result
+        cache = self._screen_caches[region]
+        with tracer.span('read_capture', region=region):
+            detections = cache.get_detections(screenshot, read)
+        if expected and not cache.final and isinstance(self._get_ocr_backend(), FallbackOcrBackend):
+            missing = [text for text in expected if not self._is_found(text, detections)]
+            if missing:
+                logger.debug(f'{missing} not found by the primary OCR backend, reading with the fallback.')
+                detections = self._readtext(screenshot, region, fallback=True)
+                cache.replace(detections)
+        if region is None:
+            self._get_layout().observe_detections(detections)
+        return detections
+
+    def _is_found(self, text, detections):
+        match = self._get_index(detections).find(text)
+        return match is not None and match['fuzz_ratio'] >= ROI_MIN_FUZZ_RATIO
+
+    def _readtext(self, image, region=None, fallback=False):
+        """Runs OCR over the given PIL image, passing the pixels to the OCR
+        backend in memory rather than via an encoded file. If fallback is True,
+        the backend must be a FallbackOcrBackend, and only its fallback is
+        used.
+        """
+        with self._ocr_lock, tracer.span('readtext', size=image.size, fallback=fallback):
+            try:
+                backend = self._get_ocr_backend()
+                detections = (backend.read_fallback if fallback else backend.readtext)(image)
+            except (EOFError, OSError):
+                logger.warning('Lost the connection to the OCR service, running OCR in process instead.')
+                self._ocr_backend = backend = get_ocr_backend(self._game_id)
+                detections = (backend.read_fallback if fallback else backend.readtext)(image)
+        if region:
+            detections = translate_detections(detections, region[0], region[1])
+        return detections
+
+    def _get_ocr_backend(self):
+        """Returns the OCR backend for the game. See get_ocr_backend(). The
+        resident OCR service is used for general purpose OCR if one is running,
+        otherwise easyocr runs in process.
+        """
+        if not self._ocr_backend:
+            self._ocr_backend = get_ocr_backend(self._game_id, ocr_service.connect())
+        return self._ocr_backend
+
+    def _get_gui(self):
+        # pyautogui needs a display as soon as it is imported, so it is only
+        # imported when it is actually going to be used.
+        if not self._gui:
+            import pyautogui
+            self._gui = pyautogui
+        return self._gui
+
+    def _get_layout(self):
+        if not self._layout:
+            self._layout = Layout(self._game_id, self._get_gui().size())
+        return self._layout
+
+    def _get_region(self, name):
+        """Resolves the named layout region to a screen region, first filling
+        in any of the anchors it depends on from the calibration profile.
+        Returns None if the region can't be resolved yet.
+        """
+        layout = self._get_layout()
+        for anchor in layout.get_required_anchors(name):
+            if anchor not in layout.anchors:
+                self._get_calibrated_bbox(anchor)
+        return layout.get_region(name)
+
+    def _get_anchor(self, text, detections):
+        """Returns the (left, top, right, bottom) extents of an anchor label.
+        Uses the position recorded in the layout or the calibration profile if
+        there is one, otherwise finds the label in detections, which must cover
+        the whole screen.
+        """
+        layout = self._get_layout()
+        if text not in layout.anchors and self._get_calibrated_bbox(text) is None:
+            bbox = self.get_bbox_for_text(text, detections)
+            layout.observe(text, bbox)
+            self._calibrate_label(text, bbox)
+        return layout.anchors[text]
+
+    def _get_calibration(self):
+        if not self._calibration:
+            self._calibration = CalibrationProfile.load(self._calibration_dir, self._game_id, self._get_gui().size())
+        return self._calibration
+
+    def _get_calibrated_bbox(self, text):
+        """Returns the bbox of text from the calibration profile, if it is a
+        calibrated label and the pixels at that position still match the
+        calibration. Otherwise returns None, and the label must be found by
+        OCR.
+        """
+        label = self._get_calibration().get_label(text)
+        if label is None:
+            return None
+        left, top, right, bottom = label[0]
+        label_pixels = self.capture_screen((left, top, right - left, bottom - top), save_debug=False)
+        if not self._get_calibration().matches_label(text, get_thumbnail(label_pixels)):
+            logger.debug(f'Calibrated label "{text}" does not match the screen, finding it by OCR.')
+            return None
+        bbox = get_bbox_from_extents((left, top, right, bottom))
+        self._get_layout().observe(text, bbox)
+        return bbox
+
+    def _calibrate_label(self, text, bbox):
+        """Records the position and pixels of text in the calibration profile,
+        if it is one of the game's static labels.
+        """
+        calibration = self._get_calibration()
+        if not calibration.is_static_label(text):
+            return
+        left, top, right, bottom = (int(i) for i in get_bbox_extents(bbox))
+        label_pixels = self.capture_screen((left, top, right - left, bottom - top), save_debug=False)
+        calibration.set_label(text, (left, top, right, bottom), get_thumbnail(label_pixels))
 
-    def get_bbox_for_text(self, target_text, image, best_match=True, max_matches=10):
-        """Gets the bbox for a given target_text in the given image. Uses fuzzy
+    def get_bbox_for_text(self, target_text, detections, best_match=True, max_matches=10):
+        """Gets the bbox for a given target_text in the given OCR detections,
+        as returned by read_screen(). Uses fuzzy
         matching if an exact match cannot be found. If best_match is True
         (default) then only a single, best-guess bbox for the best matching
         piece of text will be returned, no matter how unconfident this function
@@ -129,44 +437,14 @@ class CombatMissionDriver():
             [{'text': <text>:, 'bbox': <bbox>, 'fuzz_ratio': <fuzz_ratio>}]
         """
         logger.debug(f'Attempting to find the text "{target_text}" in image.')
-        if not self._reader:
-            self._reader = easyocr.Reader(['en'])
-
-        # Perform text detection on the image, storing all found pieces of text.
-        boxcars = self._reader.readtext(image)
-
-        # phrases will be populated with all the strings found on the page.
-        phrases = []
-        results = []
-        for detection in boxcars:
-            detected_text = detection[1]
-            bbox = detection[0]
-            phrases.append(detected_text)
-            if target_text in detected_text:
-                prepared_result = {'text': detected_text, 'bbox': bbox, 'fuzz_ratio': 100}
-                results.append(prepared_result)
-                if best_match:
-                    # We assume if we've found an exact match that it's the correct
-                    # instance of the phrase. This can be wrong if the actual
-                    # target isn't actually the first occurrence of the word on the
-                    # page, so we have to be careful about using the
-                    # best_match: True option.
-                    break
-
-        logger.debug(f'Available phrases: {phrases}')
-        # if there isn't an exact match or if we are trying to find all
-        # possible matches, then try to find the best match that we can using
-        # fuzzy matching
-        if not best_match or results == []:
-            best_match_texts = fuzz_process.extract(target_text, phrases, scorer=fuzz.ratio)
-            for text in best_match_texts:
-                match_index = phrases.index(text[0])
-                detection = boxcars[match_index]
-                results.append({'text': detection[1], 'bbox': detection[0], 'fuzz_ratio': text[1]})
-                if 0 < max_matches <= len(results):
-                    break
-
-        prepared_results = sorted(results, key=lambda d: d['fuzz_ratio'], reverse=True)
+        logger.debug(f'Available phrases: {[detection[1] for detection in detections]}')
+
+        # Exact matches score 100, and ties keep the order the text was found
+        # in. So, as with any exact match, we assume that the first occurrence
+        # of the text on the page is the correct one. This can be wrong, so we
+        # have to be careful about using the best_match: True option.
+        with tracer.span('match_text', text=target_text, phrases=len(detections)):
+            prepared_results = self._get_index(detections).query(target_text)
         logger.debug(prepared_results)
         if best_match:
             return prepared_results[0]['bbox']
@@ -175,6 +453,22 @@ class CombatMissionDriver():
         else:
             return prepared_results
 
+    def _get_index(self, detections):
+        """Returns a DetectionIndex for the detections. Indexes are cached, so
+        each frame's detections are only indexed, and their phrases
+        canonicalised, once however many queries are made against it.
+        """
+        key = id(detections)
+        if key in self._indexes:
+            self._indexes.move_to_end(key)
+        else:
+            # The index holds a reference to the detections, so their id
+            # can't be reused while the index is cached.
+            self._indexes[key] = DetectionIndex(detections)
+            if len(self._indexes) > INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        return self._indexes[key]
+
     def _find_center_of_bounding_box(self, bbox):
         # bbox should be a list of four points in the format: [[x1, y1], [x2, y2], [x3, y3], [x4, y4]]
         # We'll assume that bbox is always in the correct format with four points.
@@ -188,76 +482,259 @@ class CombatMissionDriver():
     def _get_bbox_height(self, bbox):
         return max(point[1] for point in bbox) - min(point[1] for point in bbox)
 
-    # TODO: note to self: might make sense to pre-calcualte and cache all the text locations.
-    def find_text(self, text):
-        screenshot, screenshot_path = self.capture_screen()
-
-        # TODO: would be nice to use the screenshot, instead of reading the image
-        # from disk here. Was having trouble, moved on.
-        bbox = self.get_bbox_for_text(text, str(screenshot_path))
+    def find_text(self, text, region=None):
+        """Returns the center and bbox of the given text on screen. Static
+        labels are taken from the calibration profile when their pixels still
+        match. Otherwise, if region names a region of the layout, only that
+        region is read, unless it can't be resolved yet or the text isn't found
+        in it confidently.
+        """
+        bbox = self._get_calibrated_bbox(text)
+        if bbox is not None:
+            x, y = self._find_center_of_bounding_box(bbox)
+            return (x, y, bbox)
+
+        screen_region = self._get_region(region) if region else None
+        if screen_region:
+            match = self._get_index(self.read_screen(screen_region, expected=[text])).find(text)
+            if match is not None and match['fuzz_ratio'] >= ROI_MIN_FUZZ_RATIO:
+                bbox = match['bbox']
+            else:
+                logger.debug(f'"{text}" not found in region {region}, reading the whole screen.')
+        if bbox is None:
+            bbox = self.get_bbox_for_text(text, self.read_screen(expected=[text]))
+            self._get_layout().observe(text, bbox)
+        self._calibrate_label(text, bbox)
         x, y = self._find_center_of_bounding_box(bbox)
 
         return (x, y, bbox)
 
     def click_at_location(self, target_x, target_y):
-        pyautogui.moveTo(target_x, target_y)
-        pyautogui.click()
-        pyautogui.moveTo(0, 0)
-
-    def click_text(self, target_text):
-        target_x, target_y, _ = self.find_text(target_text)
+        gui = self._get_gui()
+        if self._prefetcher:
+            self._prefetcher.discard()
+        with tracer.span('move', x=target_x, y=target_y):
+            gui.moveTo(target_x, target_y)
+        with tracer.span('click'):
+            gui.click()
+        with tracer.span('move', x=0, y=0):
+            gui.moveTo(0, 0)
+
+    def click_and_settle(self, target_x, target_y, region=None, prefetch=False):
+        """Clicks the location, then waits for the named layout region, or the
+        whole screen if it can't be resolved, to react to the click and settle.
+
+        Pass prefetch=True if the region is going to be read next. If the
+        driver is pipelined, each new frame of the region seen while waiting is
+        then OCRed in the background, so that by the time the region has
+        settled, reading it is already under way.
+        """
+        screen_region = self._get_region(region) if region else None
+        capture = partial(self.capture_screen, screen_region, save_debug=False)
+        if prefetch and self._prefetcher and screen_region:
+            capture = partial(self._capture_and_prefetch, capture, screen_region)
+        reference = get_thumbnail(capture())
         self.click_at_location(target_x, target_y)
-        # let the UI catch up to the click
-        time.sleep(0.2)
+        with tracer.span('wait_for_change', region=region):
+            changed = wait_for_change(capture, reference, SETTLE_CHANGE_TIMEOUT, SETTLE_INTERVAL)
+        if not changed:
+            logger.debug(f'No visible change in {region or "screen"} after clicking ({target_x}, {target_y}).')
+            return
+        with tracer.span('wait_for_stable', region=region):
+            wait_for_stable(capture, SETTLE_TIMEOUT, SETTLE_INTERVAL)
+
+    def _capture_and_prefetch(self, capture, region):
+        screenshot = capture()
+        self._prefetcher.submit(screenshot, region)
+        return screenshot
+
+    def click_text(self, target_text, region=None, settle_region=None, prefetch=False):
+        """Clicks the given text, found as by find_text(), then waits for
+        settle_region, or the region the text was found in, to settle. See
+        click_and_settle() for prefetch.
+        """
+        target_x, target_y, _ = self.find_text(target_text, region=region)
+        self.click_and_settle(target_x, target_y, settle_region or region, prefetch=prefetch)
 
     def click_unit_type(self, unit_type):
         """In the unit editor, click the indicated unit type so that you're viewing units of that type."""
         # This handles the special case of the 'infantry' unit type, which can
         # fail to be clicked on when the 'infantry' division is also selected.
         if unit_type in ['Infantry'] and self._game_id in ['cmak', 'cmbb']:
-            screenshot, screenshot_path = self.capture_screen()
-            matches = self.get_bbox_for_text(unit_type, str(screenshot_path), best_match=False, max_matches=0)
-            if not self._fortification_label_bbox:
-                self._fortification_label_bbox = self.get_bbox_for_text('Fortification', str(screenshot_path))
-            fort_top_x = self._fortification_label_bbox[0][1]
-            best_matches = []
-            for m in matches:
-                match_top_x = m['bbox'][0][1]
-                if match_top_x > fort_top_x - 10 and match_top_x < fort_top_x + 10:
-                    best_matches.append(m)
-            best_match = sorted(best_matches, key=lambda d: d['fuzz_ratio'], reverse=True)[0]
+            best_match = None
+            region = self._get_region('unit_type_tabs')
+            if region:
+                best_match = self._get_best_unit_type_match(unit_type, self.read_screen(region, expected=[unit_type]))
+            if best_match is None or best_match['fuzz_ratio'] < ROI_MIN_FUZZ_RATIO:
+                detections = self.read_screen(expected=['Fortification', unit_type])
+                self._get_anchor('Fortification', detections)
+                best_match = self._get_best_unit_type_match(unit_type, detections)
             x, y = self._find_center_of_bounding_box(best_match['bbox'])
-            self.click_at_location(x, y)
-            time.sleep(0.2)
+            self.click_and_settle(x, y, 'unit_list', prefetch=True)
         else:
-            self.click_text(unit_type)
+            self.click_text(unit_type, region='unit_type_tabs', settle_region='unit_list', prefetch=True)
+
+    def _get_best_unit_type_match(self, unit_type, detections):
+        """Returns the best match for unit_type on the same row as the
+        Fortification tab, or None if there isn't one. The Fortification tab
+        must already have been located.
+        """
+        fortification = self._get_layout().anchors['Fortification']
+        with tracer.span('match_text', text=unit_type, phrases=len(detections)):
+            return self._get_index(detections).find(
+                unit_type, same_row_as=fortification, row_tolerance=UNIT_TYPE_ROW_TOLERANCE
+            )
 
     def add_unit(self, unit_name):
-        # TODO: this function, as well as click_unit_type, above, would benefit
-        # from a refactor where we rethink what options we offer for "click
-        # text" so we can pass constraints like "must be to the left of this
-        # other text", "must be on the same line as this other text", etc. The
-        # way it's structured right now doesn't lend itself to that. hence,
-        # these custom functions.
-
-        # The reason we need this special function is so we don't accidentally
-        # click units that are in the "chosen" area.
-        screenshot, screenshot_path = self.capture_screen()
-        matches = self.get_bbox_for_text(unit_name, str(screenshot_path), best_match=False, max_matches=0)
-        if not self._chosen_label_bbox:
-            self._chosen_label_bbox = self.get_bbox_for_text('CHOSEN', str(screenshot_path))
-        best_match = None
-        for m in matches:
-            try:
-                best_match_fuzz_ratio = best_match['fuzz_ratio']
-            except TypeError:
-                best_match_fuzz_ratio = 0
-            if m['bbox'][0][0] < self._chosen_label_bbox[0][0] and m['fuzz_ratio'] > best_match_fuzz_ratio:
-                best_match = m
-        x, y = self._find_center_of_bounding_box(best_match['bbox'])
-        self.click_at_location(x, y)
-        logger.debug(f"Added unit {unit_name} by clicking the text {best_match['text']}")
-        time.sleep(0.2)
+        self.add_units([unit_name])
+
+    def add_units(self, unit_names, vocabulary=None, track=None):
+        """Adds each of unit_names, in order, from the units available for the
+        currently selected nation, wave, division and unit type. The unit list
+        is read once, every name is resolved against that one reading, and then
+        the units are clicked back to back. Before each click, the pixels of the
+        target row are compared against the reading, and the list is only read
+        again if they have changed.
+
+        vocabulary is an optional list of every unit name which can appear in
+        the unit list. See PhraseMatcher.match().
+
+        track is an optional callable taking the index of a unit in unit_names,
+        which returns a context manager to add that unit within, such as
+        PopulationJournal.adding_unit().
+        """
+        # Units are only matched left of the CHOSEN label, so we don't
+        # accidentally click units that are in the "chosen" area.
+        targets = self._resolve_units(unit_names, vocabulary)
+        for i, unit_name in enumerate(unit_names):
+            match, row_region, row_fingerprint = targets[unit_name]
+            if fingerprint(self.capture_screen(row_region, save_debug=False)) != row_fingerprint:
+                logger.debug(f'Unit list has changed since it was read, reading it again before adding {unit_name}.')
+                targets = self._resolve_units(unit_names[i:], vocabulary)
+                match, row_region, row_fingerprint = targets[unit_name]
+            x, y = self._find_center_of_bounding_box(match['bbox'])
+            with tracer.span('add_unit', unit=unit_name), (track(i) if track else nullcontext()):
+                self._add_unit_verified(unit_name, x, y)
+            logger.debug(f"Added unit {unit_name} by clicking the text {match['text']}")
+
+    def _add_unit_verified(self, unit_name, x, y):
+        """Clicks the unit at (x, y) in the unit list, and, if the driver
+        verifies adds, checks that it appeared in the CHOSEN panel. Only the
+        panel is captured, before and after the click, and the two compared
+        pixel by pixel. A one row change is the new unit. A taller change is
+        ambiguous, so only the changed rows are read, and must include the
+        unit. Raises a ScreenStateError if a different unit was added, or if
+        the panel doesn't change however many times the unit is clicked.
+
+        A click which registered but which the game is slow to draw would add
+        the unit twice if it were clicked again, so the panel is given up to
+        SETTLE_TIMEOUT to change before the unit is clicked again.
+        """
+        region = self._get_region('chosen_list') if self._verify else None
+        if not region:
+            self.click_and_settle(x, y, 'chosen_list')
+            return
+
+        capture = partial(self.capture_screen, region, save_debug=False)
+        for attempt in range(ADD_ATTEMPTS):
+            before = capture()
+            self.click_and_settle(x, y, 'chosen_list')
+            after = capture()
+            with tracer.span('verify_add', unit=unit_name):
+                if self._is_unit_added(unit_name, before, after, region):
+                    return
+            with tracer.span('wait_for_late_add', unit=unit_name):
+                if wait_for_change(capture, get_thumbnail(before), SETTLE_TIMEOUT, SETTLE_INTERVAL):
+                    wait_for_stable(capture, SETTLE_TIMEOUT, SETTLE_INTERVAL)
+                    if self._is_unit_added(unit_name, before, capture(), region):
+                        return
+            logger.warning(f'{unit_name} did not appear in the CHOSEN panel, clicking it again.')
+        raise ScreenStateError(f'Could not add {unit_name}. The CHOSEN panel did not change when it was clicked.')
+
+    def _is_unit_added(self, unit_name, before, after, region):
+        """Returns whether unit_name was added to the CHOSEN panel, given
+        captures of region, the panel, from before and after clicking it.
+        Returns False if the panel didn't change.
+        """
+        changed = ImageChops.difference(before.convert('RGB'), after.convert('RGB')).getbbox()
+        if changed is None:
+            return False
+        _, top, _, bottom = changed
+        chosen = self._get_layout().anchors['CHOSEN']
+        if bottom - top <= NEW_ROW_MAX_ROWS * (chosen[3] - chosen[1]):
+            return True
+
+        logger.debug(f'CHOSEN panel changed by {bottom - top}px after adding {unit_name}, reading the change.')
+        band = (region[0], region[1] + top, region[2], bottom - top)
+        detections = self._readtext(after.crop((0, top, after.width, bottom)), band)
+        if not self._get_index(detections).count(unit_name, ROI_MIN_FUZZ_RATIO):
+            raise ScreenStateError(
+                f'Clicked {unit_name}, but the CHOSEN panel now shows {[d[1] for d in detections]} instead.'
+            )
+        return True
+
+    def count_chosen(self, unit_name):
+        """Returns how many of unit_name are listed in the CHOSEN panel, which
+        is a single read of the panel rather than of the whole unit editor.
+        """
+        region = self._get_region('chosen_list')
+        detections = self.read_screen(region)
+        if not region:
+            self._get_anchor('CHOSEN', detections)
+            region = self._get_region('chosen_list')
+        return self._get_index(detections).count(unit_name, ROI_MIN_FUZZ_RATIO, region=region)
+
+    def _resolve_units(self, unit_names, vocabulary=None):
+        """Reads the unit list once and finds all of unit_names in it in a
+        single matching pass. Returns
+        a dict of unit name to (match, row_region, row_fingerprint), where
+        row_region is the screen region of the matched text and row_fingerprint
+        is the fingerprint of its pixels at the time of reading. Names which
+        can't be found confidently in the unit_list region are looked up in a
+        single read of the whole screen instead.
+        """
+        targets = {}
+        unit_names = list(dict.fromkeys(unit_names))
+        region = self._get_region('unit_list')
+        if region:
+            screenshot = self.capture_screen(region)
+            detections = self._read_capture(screenshot, region, unit_names)
+            for unit_name, match in self._match_units(unit_names, detections, vocabulary).items():
+                if match is not None and match['fuzz_ratio'] >= ROI_MIN_FUZZ_RATIO:
+                    targets[unit_name] = self._pin_match(match, screenshot, region)
+
+        unresolved = [unit_name for unit_name in unit_names if unit_name not in targets]
+        if unresolved:
+            screenshot = self.capture_screen()
+            detections = self._read_capture(screenshot, None, ['CHOSEN'] + unresolved)
+            self._get_anchor('CHOSEN', detections)
+            for unit_name, match in self._match_units(unresolved, detections, vocabulary).items():
+                if match is None:
+                    raise ScreenStateError(f'Could not find unit {unit_name} in the unit list.')
+                targets[unit_name] = self._pin_match(match, screenshot, None)
+
+        return targets
+
+    def _pin_match(self, match, screenshot, region):
+        """Returns (match, row_region, row_fingerprint) for a match found in a
+        screenshot of region. See _resolve_units().
+        """
+        left, top, right, bottom = (int(i) for i in get_bbox_extents(match['bbox']))
+        origin_x, origin_y = region[:2] if region else (0, 0)
+        # OCR bboxes can overhang the captured area slightly
+        left, top = max(left, origin_x), max(top, origin_y)
+        right, bottom = min(right, origin_x + screenshot.width), min(bottom, origin_y + screenshot.height)
+        row = screenshot.crop((left - origin_x, top - origin_y, right - origin_x, bottom - origin_y))
+        return (match, (left, top, right - left, bottom - top), fingerprint(row))
+
+    def _match_units(self, unit_names, detections, vocabulary=None):
+        """Returns a dict of each of unit_names to its best match left of the
+        CHOSEN label, or None if there isn't one. The CHOSEN label must already
+        have been located.
+        """
+        chosen = self._get_layout().anchors['CHOSEN']
+        with tracer.span('match_units', units=len(unit_names), phrases=len(detections)):
+            return self._get_index(detections).match(unit_names, vocabulary=vocabulary, left_of=chosen)
 
     def _click_wave_selection(self, wave_text):
         """Because the OCR is sketchy for picking the correct wave, this
@@ -267,16 +744,21 @@ class CombatMissionDriver():
         is already displayed on screen.
         """
         if wave_text == "On Map":
-            self.click_text(wave_text)
+            self.click_text(wave_text, region='location_list')
             return
 
-        x, y, bbox = self.find_text("On Map")
+        x, y, bbox = self.find_text("On Map", region='location_list')
         logger.debug('##########')
         logger.debug(wave_text)
         reinforce_wave_int = int(wave_text.split(' ')[1])
         logger.debug(reinforce_wave_int)
-        offset = self._get_bbox_height(bbox) * reinforce_wave_int
-        self.click_at_location(x, y + offset)
+        calibration = self._get_calibration()
+        row_height = calibration.get_offset('wave_row_height')
+        if row_height is None:
+            row_height = int(self._get_bbox_height(bbox))
+            calibration.set_offset('wave_row_height', row_height)
+        offset = row_height * reinforce_wave_int
+        self.click_and_settle(x, y + offset, 'location_list')
 
 
 class Screen(Enum):
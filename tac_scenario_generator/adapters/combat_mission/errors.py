@@ -1,3 +1,18 @@
 class ScreenStateError(Exception):
     """Raised when the driver cannot execute a command because the current screen state would not allow it."""
     pass
+
+
+class OcrServiceError(Exception):
+    """Raised when the OCR service fails to handle a request."""
+    pass
+
+
+class ReplayError(Exception):
+    """Raised when the driver diverges from a recording it is replaying."""
+    pass
+
+
+class ScenarioConfigError(Exception):
+    """Raised when a scenario config doesn't match the force data, or is otherwise invalid."""
+    pass
@@ -0,0 +1,224 @@
+"""Compiles a game's force data CSVs into a columnar store, which the adapter
+reads instead of the CSVs once it exists. Run it again after changing the CSVs:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.force_store cmak
+
+The store is a directory of numpy arrays which are memory-mapped, and only
+mapped a column at a time when first needed: the names of the units of every
+force data file, their costs, and a matrix of their rarities with one row per
+(region, month, year). Reading the rarities at one date touches only that
+date's row, so loading time and memory stay flat however many dates the force
+data covers. index.json records the dates, and which units belong to each
+force data file.
+"""
+import argparse
+import csv
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+
+# Marks a unit which has no rarity for a date, because its force data file
+# has no column for it.
+MISSING_RARITY = -1
+
+
+def get_rarity_column(region, month, year):
+    """Returns the name of the force data column holding the rarities at a
+    date.
+    """
+    return f'{region}_{month}_{year}_rarity'
+
+
+def parse_rarity_column(column):
+    """Returns the (region, month, year) of a rarity column, or None if column
+    isn't one. The region may contain underscores, the month and year can't.
+    """
+    if not column.endswith('_rarity'):
+        return None
+    parts = column[:-len('_rarity')].rsplit('_', 2)
+    if len(parts) != 3:
+        return None
+    return tuple(parts)
+
+
+def get_store_directory(game_id):
+    return Path(__file__).parent / game_id / 'force_store'
+
+
+def get_force_data_directory(game_id):
+    return Path(__file__).parent / game_id / 'force_data'
+
+
+class ForceTable():
+    """The force data of one nation, division and unit type. names and costs
+    are lists with an entry per unit, and rarities maps each (region, month,
+    year) the force data covers to a sequence of the units' rarities.
+    """
+    def __init__(self, names, costs, rarities):
+        self.names = names
+        self.costs = costs
+        self.rarities = rarities
+
+    @classmethod
+    def read_csv(cls, path):
+        """Reads a force data file."""
+        with open(path, 'r') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            rows = list(reader)
+            columns = {parse_rarity_column(column): column for column in reader.fieldnames or []}
+        columns.pop(None, None)
+        return cls(
+            [row['unit'] for row in rows],
+            [int(row['cost']) for row in rows],
+            {date: [int(row[column]) for row in rows] for date, column in columns.items()},
+        )
+
+    def get_rarities(self, region, month, year):
+        """Returns the rarity of each unit at a date. Raises a ValueError if the
+        force data doesn't cover the date.
+        """
+        try:
+            return self.rarities[(region, month, str(year))]
+        except KeyError:
+            raise ValueError(
+                f'The force data has no {get_rarity_column(region, month, year)} column.'
+            ) from None
+
+
+class _StoreRarities():
+    """The rarities of one table of a ForceStore, read from the store's
+    rarity matrix a date at a time.
+    """
+    def __init__(self, store, start, end):
+        self._store = store
+        self._start = start
+        self._end = end
+
+    def __getitem__(self, date):
+        row = self._store.get_column('rarities')[self._store.get_date_index(date), self._start:self._end]
+        if (row == MISSING_RARITY).any():
+            raise KeyError(date)
+        return row.tolist()
+
+
+class ForceStore():
+    """A compiled force data store, as written by compile_store()."""
+    def __init__(self, directory):
+        self._directory = Path(directory)
+        with open(self._directory / 'index.json', 'r') as f:
+            index = json.load(f)
+        if index['version'] != STORE_VERSION:
+            raise ValueError(
+                f'{directory} is version {index["version"]} of the force store, but this is version '
+                f'{STORE_VERSION}. Compile it again.'
+            )
+        self.dates = [tuple(date) for date in index['dates']]
+        self._date_indexes = {date: i for i, date in enumerate(self.dates)}
+        self._tables = index['tables']
+        self._columns = {}
+
+    @classmethod
+    def open(cls, game_id):
+        """Returns the store for game_id, or None if it hasn't been compiled.
+        Warns if any of the force data files have changed since it was.
+        """
+        directory = get_store_directory(game_id)
+        index_path = directory / 'index.json'
+        if not index_path.exists():
+            return None
+        compiled = index_path.stat().st_mtime
+        if any(path.stat().st_mtime > compiled for path in get_force_data_directory(game_id).glob('*.csv')):
+            logger.warning(f'The force data for {game_id} has changed since its store was compiled. Compile it again.')
+        return cls(directory)
+
+    def __getstate__(self):
+        # Only the path is pickled, such as when handing tables to worker
+        # processes, which map the columns again themselves.
+        return {**self.__dict__, '_columns': {}}
+
+    def get_column(self, name):
+        """Returns the named array, memory-mapping it the first time."""
+        if name not in self._columns:
+            import numpy
+
+            self._columns[name] = numpy.load(self._directory / f'{name}.npy', mmap_mode='r')
+        return self._columns[name]
+
+    def get_date_index(self, date):
+        """Returns the row of the rarity matrix for a (region, month, year).
+        Raises a KeyError if the store doesn't cover the date.
+        """
+        return self._date_indexes[date]
+
+    def check_date(self, region, month, year):
+        """Raises a ValueError if the store doesn't cover a date."""
+        if (region, month, str(year)) not in self._date_indexes:
+            raise ValueError(
+                f'The force data has no rarities for {region} {month} {year}. It covers '
+                f'{", ".join(" ".join(date) for date in self.dates)}.'
+            )
+
+    def get_table(self, name):
+        """Returns the ForceTable compiled from the force data file name, less
+        its extension. Raises a FileNotFoundError if there wasn't one.
+        """
+        if name not in self._tables:
+            raise FileNotFoundError(f'No force data named {name} in {self._directory}.')
+        start, end = self._tables[name]
+        return ForceTable(
+            [str(unit) for unit in self.get_column('names')[start:end]],
+            self.get_column('costs')[start:end].tolist(),
+            _StoreRarities(self, start, end),
+        )
+
+
+def compile_store(force_data_directory, store_directory):
+    """Compiles every force data file in force_data_directory into a store
+    in store_directory. Returns the number of units and dates compiled.
+    """
+    import numpy
+
+    paths = sorted(Path(force_data_directory).glob('*.csv'))
+    tables = {path.stem: ForceTable.read_csv(path) for path in paths}
+    dates = sorted({date for table in tables.values() for date in table.rarities})
+
+    names, costs, ranges = [], [], {}
+    for name, table in tables.items():
+        ranges[name] = (len(names), len(names) + len(table.names))
+        names.extend(table.names)
+        costs.extend(table.costs)
+    rarities = numpy.full((len(dates), len(names)), MISSING_RARITY, dtype=numpy.int16)
+    for name, table in tables.items():
+        start, end = ranges[name]
+        for date, column in table.rarities.items():
+            rarities[dates.index(date), start:end] = column
+
+    store_directory = Path(store_directory)
+    store_directory.mkdir(parents=True, exist_ok=True)
+    (store_directory / 'index.json').unlink(missing_ok=True)
+    numpy.save(store_directory / 'names.npy', numpy.array(names, dtype=str))
+    numpy.save(store_directory / 'costs.npy', numpy.array(costs, dtype=numpy.int32))
+    numpy.save(store_directory / 'rarities.npy', rarities)
+    # The index is written last, so that a store is only opened once all of
+    # its columns have been written.
+    with open(store_directory / 'index.json', 'w') as f:
+        json.dump({'version': STORE_VERSION, 'dates': dates, 'tables': ranges}, f, indent=4)
+    return (len(names), len(dates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a game's force data CSVs into a columnar store.")
+    parser.add_argument('game_id')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    units, dates = compile_store(get_force_data_directory(args.game_id), get_store_directory(args.game_id))
+    logger.info(f'Compiled {units} units at {dates} dates into {get_store_directory(args.game_id)}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""Template matching OCR for the bitmap fonts of the Combat Mission editors.
+
+The editors draw all their text with a handful of fixed bitmap fonts, so
+rather than running a general purpose recognition model, text can be read by
+splitting it into glyphs and comparing each glyph against templates sampled
+from the game's own UI. That runs on the CPU in milliseconds.
+
+A font is built from screenshots of the game, using easyocr's readings of them
+as the ground truth:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.glyphs cmak debug/screenshots/*.png
+
+which saves it to where get_ocr_backend() looks for it.
+"""
+import argparse
+import logging
+from collections import Counter, defaultdict
+
+import cv2
+import numpy
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.layout import \
+    get_bbox_extents
+from tac_scenario_generator.adapters.combat_mission.ocr import (EasyOcrBackend,
+                                                                OcrBackend,
+                                                                get_font_path)
+
+logger = logging.getLogger(__name__)
+
+# Glyphs which score below this against their best template are considered
+# unrecognized. Scores are the overlap of glyph and template ink, between 0 and
+# 1.
+MIN_GLYPH_SCORE = 0.75
+
+# Blobs of ink whose glyphs score below this on average are assumed not to be
+# text at all, such as icons and borders, and are dropped.
+MIN_BLOB_SCORE = 0.5
+
+
+def get_grey(image):
+    """Returns the image as a 2D uint8 array."""
+    if isinstance(image, Image.Image):
+        return numpy.asarray(image.convert('L'))
+    image = numpy.asarray(image)
+    if image.ndim == 3:
+        return cv2.cvtColor(image[:, :, :3], cv2.COLOR_RGB2GRAY)
+    return image
+
+
+def get_runs(mask):
+    """Returns (start, stop) for each run of True in a 1D boolean array."""
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], mask.view(numpy.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def get_baseline(blob, segments):
+    """Returns the row most glyphs in the blob end on. Descenders are in the
+    minority in any real text, so this is the baseline.
+    """
+    bottoms = [numpy.flatnonzero(blob[:, start:stop].any(axis=1))[-1] for start, stop in segments]
+    return Counter(bottoms).most_common(1)[0][0]
+
+
+class GlyphFont():
+    """Glyph templates for one bitmap font, along with how to tell its ink from
+    the background.
+
+    templates maps each character to a boolean array with ascent + descent
+    rows, where the last of the first ascent rows is the baseline.
+    """
+    def __init__(self, templates, ascent, descent, threshold, ink_is_light, space_gap):
+        self.templates = templates
+        self.ascent = ascent
+        self.descent = descent
+        self.threshold = threshold
+        self.ink_is_light = ink_is_light
+        # Gaps between glyphs of at least this many columns are spaces.
+        self.space_gap = space_gap
+
+        by_width = defaultdict(list)
+        for char, template in templates.items():
+            by_width[template.shape[1]].append((char, template))
+        self._stacks = {}
+        for width, glyphs in by_width.items():
+            chars = [char for char, _ in glyphs]
+            stack = numpy.stack([template for _, template in glyphs])
+            self._stacks[width] = (chars, stack, stack.sum(axis=(1, 2)))
+        self.widths = sorted(self._stacks)
+
+    @property
+    def cell_height(self):
+        return self.ascent + self.descent
+
+    def get_ink(self, image):
+        """Returns a boolean array of which pixels of the image are ink."""
+        grey = get_grey(image)
+        return grey > self.threshold if self.ink_is_light else grey < self.threshold
+
+    def match(self, glyph):
+        """Returns (char, score) for the template which best matches glyph, a
+        boolean array of cell_height rows. Templates up to one column wider or
+        narrower are considered, to absorb segmentation noise.
+        """
+        best_char, best_score = None, 0
+        width = glyph.shape[1]
+        for candidate_width in (width, width - 1, width + 1):
+            if candidate_width not in self._stacks:
+                continue
+            chars, stack, template_ink = self._stacks[candidate_width]
+            if candidate_width < width:
+                candidate = glyph[:, :candidate_width]
+            else:
+                candidate = numpy.pad(glyph, ((0, 0), (0, candidate_width - width)))
+            intersection = (stack & candidate).sum(axis=(1, 2))
+            scores = intersection / (template_ink + candidate.sum() - intersection)
+            i = scores.argmax()
+            if scores[i] > best_score:
+                best_char, best_score = chars[i], float(scores[i])
+        return best_char, best_score
+
+    def save(self, path):
+        chars = list(self.templates)
+        max_width = max(self.widths)
+        bitmaps = numpy.zeros((len(chars), self.cell_height, max_width), bool)
+        for i, char in enumerate(chars):
+            bitmaps[i, :, :self.templates[char].shape[1]] = self.templates[char]
+        numpy.savez_compressed(
+            path,
+            chars=numpy.array(chars),
+            widths=numpy.array([self.templates[char].shape[1] for char in chars]),
+            bitmaps=bitmaps,
+            params=numpy.array([self.ascent, self.descent, self.threshold, self.ink_is_light, self.space_gap]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path) as data:
+            templates = {
+                str(char): bitmap[:, :width]
+                for char, width, bitmap in zip(data['chars'], data['widths'], data['bitmaps'])
+            }
+            ascent, descent, threshold, ink_is_light, space_gap = data['params'].tolist()
+        return cls(templates, ascent, descent, threshold, bool(ink_is_light), space_gap)
+
+
+def find_blobs(ink, font):
+    """Yields (left, top, blob) for each blob of ink which could be a phrase
+    in the font, where blob is the boolean ink of the phrase. Glyphs closer
+    together than two spaces are joined into one phrase, and anything taller
+    than a line of text, such as a panel border, is skipped.
+    """
+    kernel = numpy.ones((1, 2 * font.space_gap), numpy.uint8)
+    dilated = cv2.dilate(ink.view(numpy.uint8), kernel)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(dilated, connectivity=8)
+    for i in range(1, count):
+        left, top, width, height, _ = stats[i]
+        if height > font.cell_height + 1:
+            continue
+        blob = ink[top:top + height, left:left + width] & (labels[top:top + height, left:left + width] == i)
+        yield left, top, blob
+
+
+def get_cell(blob, baseline, font):
+    """Returns the rows of the blob which make up a line of text in the font,
+    positioned so that they line up with the font's templates.
+    """
+    cell = numpy.zeros((font.cell_height, blob.shape[1]), bool)
+    top = baseline - font.ascent + 1
+    src_top, src_bottom = max(top, 0), min(top + font.cell_height, blob.shape[0])
+    cell[src_top - top:src_bottom - top] = blob[src_top:src_bottom]
+    return cell
+
+
+class GlyphBackend(OcrBackend):
+    """OCR backend which reads text by matching glyphs against a GlyphFont."""
+    def __init__(self, font, min_glyph_score=MIN_GLYPH_SCORE):
+        self.font = font
+        self._min_glyph_score = min_glyph_score
+
+    def readtext(self, image):
+        ink = self.font.get_ink(image)
+        detections = []
+        for left, top, blob in find_blobs(ink, self.font):
+            detection = self._read_blob(left, top, blob)
+            if detection:
+                detections.append(detection)
+        return detections
+
+    def _read_blob(self, left, top, blob):
+        segments = get_runs(blob.any(axis=0))
+        if not segments:
+            return None
+        cell = get_cell(blob, get_baseline(blob, segments), self.font)
+
+        text = []
+        scores = []
+        previous_stop = None
+        for start, stop in segments:
+            if previous_stop is not None and start - previous_stop >= self.font.space_gap:
+                text.append(' ')
+            for char, score in self._match_run(cell[:, start:stop]):
+                text.append(char or '?')
+                scores.append(score)
+            previous_stop = stop
+
+        confidence = sum(scores) / len(scores)
+        if confidence < MIN_BLOB_SCORE:
+            return None
+        rows = numpy.flatnonzero(blob.any(axis=1))
+        extents = (left + segments[0][0], top + rows[0], left + segments[-1][1], top + rows[-1] + 1)
+        x1, y1, x2, y2 = (int(i) for i in extents)
+        return ([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], ''.join(text), confidence)
+
+    def _match_run(self, run):
+        """Returns [(char, score)] for a run of ink columns, which is usually
+        one glyph, but may be several glyphs which touch each other.
+        """
+        char, score = self.font.match(run)
+        if score >= self._min_glyph_score or run.shape[1] < 2 * self.font.widths[0]:
+            return [(char, score)]
+
+        # Split off the leading glyph which best matches a template, and read
+        # the rest on its own. Only keep the split if it reads better overall.
+        best_width, best_char, best_score = None, None, 0
+        for width in self.font.widths:
+            if width >= run.shape[1]:
+                break
+            prefix_char, prefix_score = self.font.match(run[:, :width])
+            if prefix_score > best_score:
+                best_width, best_char, best_score = width, prefix_char, prefix_score
+        rest = run[:, best_width:] if best_width else run[:, :0]
+        rest_columns = numpy.flatnonzero(rest.any(axis=0))
+        if not len(rest_columns):
+            return [(char, score)]
+        split = [(best_char, best_score)] + self._match_run(rest[:, rest_columns[0]:rest_columns[-1] + 1])
+        if sum(s for _, s in split) / len(split) > score:
+            return split
+        return [(char, score)]
+
+
+def build_font(samples, min_confidence=0.9):
+    """Builds a GlyphFont from samples of (image, detections), where
+    detections are trusted readings of the image in easyocr's format. Only
+    detections whose ink splits into exactly one run of columns per character
+    are used, so that every glyph can be labelled unambiguously.
+    """
+    samples = [(get_grey(image), detections) for image, detections in samples]
+    crops = []
+    for grey, detections in samples:
+        for bbox, text, confidence in detections:
+            if confidence < min_confidence or not text.strip():
+                continue
+            left, top, right, bottom = (int(i) for i in get_bbox_extents(bbox))
+            crop = grey[max(top, 0):bottom, max(left, 0):right]
+            if crop.size:
+                crops.append((crop, text))
+    if not crops:
+        raise ValueError('No usable text detections in the samples.')
+
+    # Text is a minority of the pixels of its bbox, so the median is the
+    # background, and the ink is whichever extreme is furthest from it.
+    polarities = []
+    thresholds = []
+    for crop, _ in crops:
+        background = numpy.median(crop)
+        ink_is_light = crop.max() - background > background - crop.min()
+        ink_level = numpy.percentile(crop, 98 if ink_is_light else 2)
+        polarities.append(ink_is_light)
+        thresholds.append((background + ink_level) / 2)
+    ink_is_light = Counter(polarities).most_common(1)[0][0]
+    threshold = int(numpy.mean([t for t, p in zip(thresholds, polarities) if p == ink_is_light]))
+
+    glyphs = []
+    word_gaps = []
+    space_gaps = []
+    for crop, text in crops:
+        ink = crop > threshold if ink_is_light else crop < threshold
+        chars = text.replace(' ', '')
+        segments = get_runs(ink.any(axis=0))
+        if len(segments) != len(chars):
+            continue
+        baseline = get_baseline(ink, segments)
+        for char, (start, stop) in zip(chars, segments):
+            glyph = ink[:, start:stop]
+            rows = numpy.flatnonzero(glyph.any(axis=1))
+            glyphs.append((char, glyph[rows[0]:rows[-1] + 1], baseline - rows[0], rows[-1] - baseline))
+        gaps = [b[0] - a[1] for a, b in zip(segments, segments[1:])]
+        # Work out which gaps are spaces from where the spaces are in the text.
+        is_space = [word.endswith(' ') for word in _split_after_chars(text)][:-1]
+        for gap, space in zip(gaps, is_space):
+            (space_gaps if space else word_gaps).append(gap)
+    if not glyphs:
+        raise ValueError('No detection in the samples could be split into glyphs.')
+
+    ascent = max(rise for _, _, rise, _ in glyphs) + 1
+    descent = max(drop for _, _, _, drop in glyphs)
+    renderings = defaultdict(lambda: defaultdict(list))
+    for char, glyph, rise, _ in glyphs:
+        cell = numpy.zeros((ascent + descent, glyph.shape[1]), bool)
+        cell[ascent - 1 - rise:ascent - 1 - rise + glyph.shape[0]] = glyph
+        renderings[char][glyph.shape[1]].append(cell)
+    templates = {}
+    for char, by_width in renderings.items():
+        # Take the most common rendering width, and the majority of each pixel.
+        cells = max(by_width.values(), key=len)
+        templates[char] = numpy.mean(cells, axis=0) >= 0.5
+
+    max_word_gap = int(numpy.percentile(word_gaps, 95)) if word_gaps else 1
+    if space_gaps:
+        space_gap = max((max_word_gap + int(numpy.percentile(space_gaps, 5)) + 1) // 2, max_word_gap + 1)
+    else:
+        space_gap = max_word_gap + 2
+    logger.info(f'Built a font of {len(templates)} glyphs from {len(glyphs)} samples.')
+    return GlyphFont(templates, ascent, descent, threshold, ink_is_light, space_gap)
+
+
+def _split_after_chars(text):
+    """Splits text into one string per non-space character, each followed by
+    any spaces after it.
+    """
+    parts = []
+    for char in text.strip():
+        if char == ' ':
+            parts[-1] += char
+        else:
+            parts.append(char)
+    return parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a glyph font from screenshots of a game.')
+    parser.add_argument('game_id')
+    parser.add_argument('screenshots', nargs='+', help='Screenshots of the game UI.')
+    parser.add_argument('--output', help='Where to save the font. Defaults to where the driver looks for it.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    reader = EasyOcrBackend()
+    samples = []
+    for path in args.screenshots:
+        image = Image.open(path).convert('RGB')
+        samples.append((image, reader.readtext(image)))
+    font = build_font(samples)
+    output = args.output or get_font_path(args.game_id)
+    font.save(output)
+    logger.info(f'Saved font with characters {"".join(sorted(font.templates))} to {output}.')
+
+
+if __name__ == '__main__':
+    main()
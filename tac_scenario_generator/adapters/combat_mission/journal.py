@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class ArmyProgress():
+    """How far populating one army's oob got, according to a journal.
+
+    done is the set of (action index, unit index) of the units which were
+    added. pending is the (action index, unit index, name) of a unit which was
+    being added when the journal stopped, if any, since it may or may not have
+    been added. actions is the set of indexes of the other actions which were
+    carried out. in_unit_editor is True if the unit editor was left open.
+    """
+    def __init__(self):
+        self.done = set()
+        self.actions = set()
+        self.pending = None
+        self.in_unit_editor = False
+        self.finished = False
+
+
+class PopulationJournal():
+    """Write-ahead journal of populating oobs into the game, one JSON object
+    per line. Each unit is journaled before it is clicked and again once it has
+    been added, and every line is flushed to disk before carrying on, so that
+    after a crash the journal tells how far the run got. See
+    CombatMissionDriver.execute_plan() and CombatMissionAdapter.resume().
+    """
+    def __init__(self, path, entries=None):
+        self._path = Path(path)
+        self.entries = entries if entries is not None else []
+
+    @classmethod
+    def start(cls, path, oobs):
+        """Starts a new journal at path, replacing any previous one, for a run
+        which populates oobs, a list of oobs. The oobs themselves are written
+        to the journal, so that resuming the run always populates the same
+        ones, whatever has been generated since.
+        """
+        journal = cls(path)
+        journal._path.parent.mkdir(parents=True, exist_ok=True)
+        journal._path.unlink(missing_ok=True)
+        journal.record(event='start', oobs=list(oobs))
+        return journal
+
+    @classmethod
+    def open(cls, path):
+        """Opens an existing journal to carry on from. A final line which was
+        only partly written is ignored.
+        """
+        entries = []
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f'Ignoring incomplete journal entry: {line.strip()}')
+        if not entries or entries[0].get('event') != 'start':
+            raise ValueError(f'{path} is not a population journal.')
+        return cls(path, entries)
+
+    @property
+    def oobs(self):
+        return self.entries[0]['oobs']
+
+    def record(self, **entry):
+        self.entries.append(entry)
+        with open(self._path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    @contextmanager
+    def adding_unit(self, army, action_index, unit_index, name):
+        """Journals adding a unit around the block which adds it."""
+        unit = {'army': army, 'action': action_index, 'unit': unit_index, 'name': name}
+        self.record(event='adding', **unit)
+        yield
+        self.record(event='added', **unit)
+
+    def get_progress(self, army):
+        """Returns the ArmyProgress of army."""
+        progress = ArmyProgress()
+        for entry in self.entries:
+            if entry.get('army') != army:
+                continue
+            event = entry['event']
+            if event == 'adding':
+                progress.pending = (entry['action'], entry['unit'], entry['name'])
+            elif event == 'added':
+                progress.done.add((entry['action'], entry['unit']))
+                progress.pending = None
+            elif event == 'action':
+                progress.actions.add(entry['index'])
+                if entry['kind'] == 'open_unit_editor':
+                    progress.in_unit_editor = True
+                elif entry['kind'] == 'close_unit_editor':
+                    progress.in_unit_editor = False
+            elif event == 'finished':
+                progress.finished = True
+        return progress
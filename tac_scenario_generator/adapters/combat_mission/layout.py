@@ -0,0 +1,189 @@
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Edge(NamedTuple):
+    """One edge of a region, positioned relative to a side ('left', 'top',
+    'right' or 'bottom') of an anchor label's bbox. offset is measured in
+    multiples of the anchor's text height, so that layouts scale with the UI
+    font.
+    """
+    anchor: str
+    side: str
+    offset: float = 0
+
+
+class RegionSpec(NamedTuple):
+    """Describes a named screen region by its four edges. An edge of None
+    extends the region to the corresponding edge of the screen.
+    """
+    left: Optional[Edge]
+    top: Optional[Edge]
+    right: Optional[Edge]
+    bottom: Optional[Edge]
+
+
+def _dropdown(label):
+    """The list which opens below a dropdown label, such as the nation or
+    division selector.
+    """
+    return RegionSpec(
+        left=Edge(label, 'left', -2),
+        top=Edge(label, 'top'),
+        right=Edge(label, 'left', 25),
+        bottom=Edge(label, 'bottom', 30),
+    )
+
+
+_UNIT_EDITOR_REGIONS = {
+    # Units which can be added. Everything left of the chosen units, below the
+    # unit type tabs.
+    'unit_list': RegionSpec(
+        left=None, top=Edge('Fortification', 'bottom'), right=Edge('CHOSEN', 'left'), bottom=None
+    ),
+    'chosen_list': RegionSpec(
+        left=Edge('CHOSEN', 'left', -1), top=Edge('CHOSEN', 'top', -1), right=None, bottom=None
+    ),
+    # The row of unit type tabs, which all sit on the same line as the
+    # Fortification tab.
+    'unit_type_tabs': RegionSpec(
+        left=None, top=Edge('Fortification', 'top', -1), right=None, bottom=Edge('Fortification', 'bottom', 1)
+    ),
+}
+
+LAYOUTS = {
+    'cmbo': {
+        **_UNIT_EDITOR_REGIONS,
+        'nation_list': _dropdown('FORCE'),
+        'location_list': _dropdown('LOCATION'),
+    },
+    'cmbb': {
+        **_UNIT_EDITOR_REGIONS,
+        'nation_list': _dropdown('Nation'),
+        'location_list': _dropdown('Location'),
+        'division_list': _dropdown('Division'),
+    },
+    'cmak': {
+        **_UNIT_EDITOR_REGIONS,
+        'nation_list': _dropdown('Nation'),
+        'location_list': _dropdown('Location'),
+        'division_list': _dropdown('Division'),
+    },
+}
+
+# Padding, in multiples of the text height, around an anchor label when
+# re-reading the label itself.
+ANCHOR_PADDING = 2
+
+
+def get_bbox_extents(bbox):
+    """Returns (left, top, right, bottom) for a bbox given as four points."""
+    xs = [point[0] for point in bbox]
+    ys = [point[1] for point in bbox]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def get_bbox_from_extents(extents):
+    """The inverse of get_bbox_extents()."""
+    left, top, right, bottom = extents
+    return [[left, top], [right, top], [right, bottom], [left, bottom]]
+
+
+def translate_detections(detections, left, top):
+    """Moves the bboxes of detections read from a cropped capture back into
+    screen coordinates.
+    """
+    return [
+        ([[x + left, y + top] for x, y in bbox], *rest)
+        for bbox, *rest in detections
+    ]
+
+
+class Layout():
+    """Resolves the named regions of a game's layout to pixel regions on the
+    screen, in the (left, top, width, height) format used by pyautogui.
+
+    Regions are fitted from the positions of anchor labels, which the driver
+    reports via observe() whenever it locates one. A region can't be resolved
+    until all the anchors it depends on have been observed. Any anchor label can
+    also be resolved as a region of its own, covering the label and a little
+    padding, so that the label can be re-read cheaply.
+    """
+    def __init__(self, game_id, screen_size):
+        self._specs = LAYOUTS[game_id]
+        self._screen_width, self._screen_height = screen_size
+        self._anchor_names = {
+            edge.anchor for spec in self._specs.values() for edge in spec if edge is not None
+        }
+        self._anchors = {}
+
+    @property
+    def anchors(self):
+        return dict(self._anchors)
+
+    def observe(self, text, bbox):
+        """Records the bbox at which text was found, if text is an anchor."""
+        if text in self._anchor_names:
+            self._anchors[text] = get_bbox_extents(bbox)
+
+    def observe_detections(self, detections):
+        """Records every anchor which appears verbatim in full-screen
+        detections, so that regions become available as early as possible.
+        Anchors which have already been located are left alone.
+        """
+        for bbox, text, *_ in detections:
+            text = text.strip()
+            if text in self._anchor_names and text not in self._anchors:
+                self.observe(text, bbox)
+
+    def forget(self, text):
+        self._anchors.pop(text, None)
+
+    def get_required_anchors(self, name):
+        """Returns the names of the anchors which the named region or anchor
+        depends on.
+        """
+        if name in self._anchor_names:
+            return [name]
+        spec = self._specs.get(name, ())
+        return [edge.anchor for edge in spec if edge is not None]
+
+    def get_region(self, name):
+        """Returns the pixel region for the named region or anchor, or None if
+        it can't be resolved yet.
+        """
+        if name in self._anchors:
+            left, top, right, bottom = self._anchors[name]
+            padding = (bottom - top) * ANCHOR_PADDING
+            return self._clamp(left - padding, top - padding, right + padding, bottom + padding)
+
+        spec = self._specs.get(name)
+        if spec is None:
+            return None
+        try:
+            left = self._resolve(spec.left, 0)
+            top = self._resolve(spec.top, 0)
+            right = self._resolve(spec.right, self._screen_width)
+            bottom = self._resolve(spec.bottom, self._screen_height)
+        except KeyError as e:
+            logger.debug(f'Cannot resolve region {name} until anchor {e} has been found.')
+            return None
+        return self._clamp(left, top, right, bottom)
+
+    def _resolve(self, edge, default):
+        if edge is None:
+            return default
+        left, top, right, bottom = self._anchors[edge.anchor]
+        sides = {'left': left, 'top': top, 'right': right, 'bottom': bottom}
+        return sides[edge.side] + edge.offset * (bottom - top)
+
+    def _clamp(self, left, top, right, bottom):
+        left = int(max(0, left))
+        top = int(max(0, top))
+        right = int(min(self._screen_width, right))
+        bottom = int(min(self._screen_height, bottom))
+        if right <= left or bottom <= top:
+            return None
+        return (left, top, right - left, bottom - top)
@@ -0,0 +1,97 @@
+import logging
+
+import numpy
+from rapidfuzz import fuzz, process
+
+logger = logging.getLogger(__name__)
+
+
+def canonicalise(text):
+    """Normalises case and whitespace, which OCR gets wrong far more often
+    than it gets punctuation wrong. Punctuation is kept, since it is all that
+    tells some unit names apart, such as "L3/33" and "L3/33 (AA)".
+    """
+    return ' '.join(text.split()).casefold()
+
+
+class PhraseMatcher():
+    """Matches target texts against the phrases of one frame's OCR
+    detections. The phrases are canonicalised once, when the matcher is
+    created, and each query scores all of its targets against all of the
+    phrases in one vectorised pass.
+    """
+    def __init__(self, detections):
+        self.detections = detections
+        self._phrases = [canonicalise(text) for _, text, *_ in detections]
+
+    def get_scores(self, targets, substring=True, columns=None):
+        """Returns a matrix of fuzz ratios between 0 and 100, with a row per
+        target and a column per detection. If substring is True, phrases which
+        contain a target verbatim score 100 for it. columns is an optional
+        array of the indexes of the detections to score, in which case the
+        others score 0.
+        """
+        scores = numpy.zeros((len(targets), len(self._phrases)))
+        if columns is None:
+            columns = numpy.arange(len(self._phrases))
+        if not targets or not len(columns):
+            return scores
+        canonical_targets = [canonicalise(target) for target in targets]
+        phrases = [self._phrases[j] for j in columns]
+        scores[:, columns] = numpy.rint(process.cdist(canonical_targets, phrases, scorer=fuzz.ratio))
+        if substring:
+            for i, target in enumerate(canonical_targets):
+                for j, phrase in zip(columns, phrases):
+                    if target in phrase:
+                        scores[i, j] = 100
+        return scores
+
+    def get_result(self, index, score):
+        """Returns the detection at index as a dict of text, bbox and
+        fuzz_ratio, the format used by the driver.
+        """
+        bbox, text, *_ = self.detections[index]
+        return {'text': text, 'bbox': bbox, 'fuzz_ratio': int(score)}
+
+    def get_ranked_results(self, target):
+        """Returns every detection with a non-zero score for target, best
+        first. Ties keep the order of the detections.
+        """
+        scores = self.get_scores([target])[0]
+        order = numpy.argsort(-scores, kind='stable')
+        return [self.get_result(i, scores[i]) for i in order if scores[i] > 0]
+
+    def match(self, targets, vocabulary=None, candidates=None):
+        """Returns a dict of each target to its best match, as returned by
+        get_result(), or None if nothing matches it.
+
+        candidates is an optional sequence of booleans, one per detection,
+        restricting which detections can be matched.
+
+        vocabulary is an optional closed set of the texts which can appear in
+        the detections. Each phrase is attributed to the vocabulary entry it
+        matches best, and a target only matches the phrases attributed to it.
+        This stops a target from matching a phrase which is really a similar
+        looking entry, such as "L3/33" matching "L3/33 (AA)". Targets are added
+        to the vocabulary if they aren't in it already.
+        """
+        targets = list(dict.fromkeys(targets))
+        if vocabulary:
+            vocabulary = list(dict.fromkeys([*vocabulary, *targets]))
+            vocabulary_scores = self.get_scores(vocabulary, substring=False)
+            target_scores = vocabulary_scores[[vocabulary.index(target) for target in targets]]
+            attributed = target_scores >= vocabulary_scores.max(axis=0, initial=0)
+            scores = numpy.where(attributed, target_scores, 0)
+        else:
+            scores = self.get_scores(targets)
+        if candidates is not None and scores.size:
+            scores[:, ~numpy.asarray(candidates, bool)] = 0
+
+        matches = {}
+        for i, target in enumerate(targets):
+            best = scores[i].argmax() if scores.shape[1] else None
+            if best is None or scores[i, best] <= 0:
+                matches[target] = None
+            else:
+                matches[target] = self.get_result(best, scores[i, best])
+        return matches
@@ -0,0 +1,185 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy
+
+from tac_scenario_generator.settings import (OCR_BACKEND, OCR_CPU_PROFILE,
+                                             OCR_THREADS)
+
+logger = logging.getLogger(__name__)
+
+
+class OcrBackend():
+    """ABC for OCR backends. A backend turns an image into a list of
+    detections in the format returned by easyocr's readtext(), which is what the
+    driver consumes:
+        [(bbox, text, confidence)]
+    where bbox is four [x, y] points, clockwise from the top left.
+    """
+    # Seconds it took to load the backend, if it has been loaded.
+    load_time = None
+
+    def load(self):
+        """Prepares the backend for use. Called lazily before the first
+        readtext(), but can be called early to move the cost elsewhere.
+        """
+        pass
+
+    def readtext(self, image):
+        """Returns the detections for the given PIL image or array."""
+        raise NotImplementedError
+
+
+class CpuProfile(NamedTuple):
+    """How easyocr is run on machines without a GPU. The default profile only
+    sets the number of torch threads; its other settings are easyocr's own
+    defaults, and are here so that the ocr benchmark can try others.
+
+    threads is the number of threads torch uses within an operation, or None
+    for one per CPU, and interop_threads the number it runs operations on in
+    parallel. The driver only ever reads one image at a time, so more interop
+    threads only compete with the others for cores. torch only lets the number
+    of interop threads be set before it first runs anything, so it is left as
+    it is if another reader has already run in the process. quantize is passed
+    on to easyocr's Reader, which quantises the models to int8 on the CPU by
+    default anyway.
+
+    canvas_size and mag_ratio are passed on to readtext(), unless they are
+    None, to scale the image the detection model sees, whose cost grows with
+    the image's area. Most reads are small crops of the game's small bitmap
+    text, which shrinking can make unreadable, so images are left at their own
+    size unless a smaller scale is given.
+    """
+    threads: Optional[int] = None
+    interop_threads: int = 1
+    quantize: bool = True
+    canvas_size: Optional[int] = None
+    mag_ratio: Optional[float] = None
+
+    def get_threads(self):
+        return self.threads or os.cpu_count() or 1
+
+
+DEFAULT_CPU_PROFILE = CpuProfile(threads=OCR_THREADS or None)
+
+
+def configure_torch_threads(torch, profile):
+    """Sets the number of threads torch uses to those of a CpuProfile."""
+    torch.set_num_threads(profile.get_threads())
+    try:
+        torch.set_num_interop_threads(profile.interop_threads)
+    except RuntimeError:
+        # The number of interop threads can only be set before torch first
+        # runs anything in parallel, so a reader created later keeps it.
+        logger.debug('Torch has already started its interop threads, not setting how many.')
+
+
+class EasyOcrBackend(OcrBackend):
+    """Runs easyocr in this process. The reader is created on first use,
+    since importing torch and loading the detection and recognition models takes
+    several seconds.
+
+    If CUDA isn't available, the reader is run with cpu_profile, a CpuProfile,
+    unless it is None. The default profile is used unless TSG_OCR_CPU_PROFILE
+    is 0.
+    """
+    def __init__(self, languages=('en',), cpu_profile=DEFAULT_CPU_PROFILE if OCR_CPU_PROFILE else None):
+        self._languages = list(languages)
+        self._cpu_profile = cpu_profile
+        self._reader = None
+        self._readtext_options = {}
+
+    def load(self):
+        if self._reader:
+            return
+        start = time.perf_counter()
+        # TODO: if we stick with easyOCR, we should archive the model weights with this
+        # project so that it's reproducible even if EasyOCR changes in the future.
+        import easyocr
+        import torch
+        gpu = torch.cuda.is_available()
+        profile = None if gpu else self._cpu_profile
+        if not gpu and not profile:
+            logger.warning('CUDA is not available to Torch. OCR may run slowly.')
+        if profile:
+            logger.info(f'CUDA is not available to Torch, running OCR on {profile.get_threads()} CPU threads.')
+            configure_torch_threads(torch, profile)
+        self._reader = easyocr.Reader(self._languages, gpu=gpu, **({'quantize': profile.quantize} if profile else {}))
+        if profile:
+            options = {'canvas_size': profile.canvas_size, 'mag_ratio': profile.mag_ratio}
+            self._readtext_options = {key: value for key, value in options.items() if value is not None}
+        self.load_time = time.perf_counter() - start
+        logger.debug(f'Loaded easyocr reader in {self.load_time:.1f}s.')
+
+    def readtext(self, image):
+        self.load()
+        return self._reader.readtext(numpy.asarray(image), **self._readtext_options)
+
+
+class FallbackOcrBackend(OcrBackend):
+    """Reads with a fast primary backend, and re-reads with a slower fallback
+    backend whenever the primary finds nothing or its mean confidence is below
+    min_confidence. Callers which find the primary's reading is missing text
+    they expected can also re-read with read_fallback().
+    """
+    def __init__(self, primary, fallback, min_confidence=0.8):
+        self.primary = primary
+        self.fallback = fallback
+        self._min_confidence = min_confidence
+        self.fallbacks = 0
+
+    def load(self):
+        self.primary.load()
+
+    def readtext(self, image):
+        detections = self.primary.readtext(image)
+        if detections:
+            confidence = sum(detection[2] for detection in detections) / len(detections)
+            if confidence >= self._min_confidence:
+                return detections
+        else:
+            confidence = 0
+        logger.debug(f'Primary OCR confidence {confidence:.2f} is too low, using the fallback OCR backend.')
+        return self.read_fallback(image)
+
+    def read_fallback(self, image):
+        """Returns the fallback backend's detections for the image."""
+        self.fallbacks += 1
+        return self.fallback.readtext(image)
+
+
+def get_font_path(game_id):
+    """Path to the glyph font sampled from the game's UI."""
+    return Path(__file__).parent / game_id / 'glyphs.npz'
+
+
+def get_ocr_backend(game_id, general_backend=None, backend_name=OCR_BACKEND):
+    """Returns the OCR backend to use for the game.
+
+    backend_name is one of:
+        easyocr: always use general_backend, which defaults to easyocr in
+            process.
+        glyph: match against the glyph font sampled from the game's UI, falling
+            back to general_backend when unsure. Raises a ValueError if no font
+            has been built for the game.
+        auto: glyph if a font has been built for the game, otherwise easyocr.
+    """
+    general_backend = general_backend or EasyOcrBackend()
+    if backend_name not in ['auto', 'easyocr', 'glyph']:
+        raise ValueError(f'Unrecognized OCR backend {backend_name}. Must be one of auto, easyocr, glyph.')
+    if backend_name == 'easyocr':
+        return general_backend
+
+    font_path = get_font_path(game_id)
+    if not font_path.exists():
+        if backend_name == 'glyph':
+            raise ValueError(f'No glyph font has been built for {game_id}. Expected one at {font_path}.')
+        return general_backend
+
+    from tac_scenario_generator.adapters.combat_mission.glyphs import (
+        GlyphBackend, GlyphFont)
+    logger.info(f'Using the glyph OCR backend for {game_id}.')
+    return FallbackOcrBackend(GlyphBackend(GlyphFont.load(font_path)), general_backend)
@@ -0,0 +1,195 @@
+"""A resident OCR service, which keeps an easyocr reader loaded between runs
+of the tool so that torch is imported and the models are loaded only once per
+session. Start it with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.ocr_service
+
+Drivers use the service automatically when it is running, and run OCR in
+process when it isn't.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy
+
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    OcrServiceError
+from tac_scenario_generator.adapters.combat_mission.ocr import (EasyOcrBackend,
+                                                                OcrBackend)
+from tac_scenario_generator.settings import (OCR_SERVICE_ADDRESS,
+                                             OCR_SERVICE_AUTHKEY)
+
+logger = logging.getLogger(__name__)
+
+
+class OcrServiceClient(OcrBackend):
+    """OCR backend which sends images to a running OcrServer."""
+    def __init__(self, connection):
+        self._connection = connection
+        self._lock = threading.Lock()
+
+    def readtext(self, image):
+        return self._request('readtext', numpy.asarray(image))
+
+    def stats(self):
+        return self._request('stats')
+
+    def stop(self):
+        self._request('stop')
+
+    def close(self):
+        self._connection.close()
+
+    def _request(self, command, *args):
+        with self._lock:
+            self._connection.send((command, args))
+            status, result = self._connection.recv()
+        if status != 'ok':
+            raise OcrServiceError(result)
+        return result
+
+
+def connect(address=OCR_SERVICE_ADDRESS, authkey=OCR_SERVICE_AUTHKEY):
+    """Returns a client connected to the OCR service at address, or None if no
+    service is running there.
+    """
+    try:
+        connection = Client(address, authkey=authkey)
+    except OSError:
+        return None
+    logger.info(f'Using the OCR service at {address}.')
+    return OcrServiceClient(connection)
+
+
+class OcrServer():
+    """Serves OCR requests from any number of clients with a single backend.
+    Requests are handled one at a time, since the backend is not thread safe.
+    """
+    def __init__(self, backend, address=OCR_SERVICE_ADDRESS, authkey=OCR_SERVICE_AUTHKEY):
+        self._backend = backend
+        self._address = address
+        self._authkey = authkey
+        self._listener = None
+        self._stopping = False
+        self._backend_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started = None
+        self._requests = 0
+        self._errors = 0
+        self._total_latency = 0
+        self._max_latency = 0
+
+    def serve_forever(self):
+        """Loads the backend and serves requests until a client sends a stop
+        request.
+        """
+        self._remove_stale_socket()
+        self._backend.load()
+        self._started = time.monotonic()
+        self._listener = Listener(self._address, authkey=self._authkey)
+        logger.info(f'OCR service listening at {self._address}.')
+        try:
+            while True:
+                connection = self._listener.accept()
+                if self._stopping:
+                    connection.close()
+                    break
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+        finally:
+            self._listener.close()
+            self._listener = None
+        logger.info('OCR service stopped.')
+
+    def stop(self):
+        """Makes serve_forever() return. Safe to call from any thread."""
+        self._stopping = True
+        # accept() can't be interrupted portably, so wake it up by connecting.
+        Client(self._address, authkey=self._authkey).close()
+
+    def _remove_stale_socket(self):
+        """Removes the socket file left behind by a service which crashed, so
+        that the address can be listened on again.
+        """
+        if os.name == 'nt' or not os.path.exists(self._address):
+            return
+        client = connect(self._address, self._authkey)
+        if client:
+            client.close()
+            raise OcrServiceError(f'An OCR service is already running at {self._address}.')
+        os.unlink(self._address)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'uptime_s': time.monotonic() - self._started,
+                'model_load_s': self._backend.load_time,
+                'requests': self._requests,
+                'errors': self._errors,
+                'mean_latency_ms': 1000 * self._total_latency / self._requests if self._requests else None,
+                'max_latency_ms': 1000 * self._max_latency,
+            }
+
+    def _handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    command, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if command == 'readtext':
+                    connection.send(self._readtext(*args))
+                elif command == 'stats':
+                    connection.send(('ok', self.stats()))
+                elif command == 'stop':
+                    connection.send(('ok', None))
+                    self.stop()
+                    return
+                else:
+                    connection.send(('error', f'Unknown command {command}.'))
+
+    def _readtext(self, image):
+        start = time.perf_counter()
+        try:
+            with self._backend_lock:
+                result = ('ok', self._backend.readtext(image))
+        except Exception as e:
+            logger.exception('OCR request failed.')
+            result = ('error', repr(e))
+        latency = time.perf_counter() - start
+        with self._stats_lock:
+            self._requests += 1
+            self._errors += result[0] != 'ok'
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resident OCR service for the Combat Mission driver.')
+    parser.add_argument('--address', default=OCR_SERVICE_ADDRESS, help='Unix socket path or Windows pipe name.')
+    parser.add_argument('--stats', action='store_true', help='Print the stats of the running service and exit.')
+    parser.add_argument('--stop', action='store_true', help='Stop the running service and exit.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.stats or args.stop:
+        client = connect(args.address)
+        if not client:
+            raise SystemExit(f'No OCR service is running at {args.address}.')
+        if args.stats:
+            for name, value in client.stats().items():
+                print(f'{name}: {value}')
+        if args.stop:
+            client.stop()
+        return
+
+    OcrServer(EasyOcrBackend(), address=args.address).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
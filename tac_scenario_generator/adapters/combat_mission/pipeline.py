@@ -0,0 +1,63 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tac_scenario_generator.adapters.combat_mission.screen_cache import \
+    fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher():
+    """Runs OCR speculatively on a background thread, so that it overlaps
+    with the driver waiting for the UI to settle. Each region has at most one
+    speculative read at a time, of the newest frame submitted for it. The
+    driver takes the result when it reads a capture with the same fingerprint,
+    and otherwise reads as usual.
+    """
+    def __init__(self, read, max_workers=1):
+        """read is called on the background thread with a screenshot and the
+        region it was taken of, and returns the detections.
+        """
+        self._read = read
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ocr-prefetch')
+        self._pending = {}
+        self.hits = 0
+        self.submitted = 0
+
+    def submit(self, screenshot, region):
+        """Starts reading screenshot, taken of region, in the background,
+        replacing any read of an older frame of the region which hasn't started
+        yet. Does nothing if this frame is already being read.
+        """
+        screenshot_fingerprint = fingerprint(screenshot)
+        pending = self._pending.get(region)
+        if pending:
+            if pending[0] == screenshot_fingerprint:
+                return
+            pending[1].cancel()
+        self._pending[region] = (screenshot_fingerprint, self._executor.submit(self._read, screenshot, region))
+        self.submitted += 1
+
+    def take(self, screenshot, region):
+        """Returns the future of the speculative read of screenshot, taken of
+        region, or None if it wasn't read speculatively. A read can only be
+        taken once.
+        """
+        pending = self._pending.get(region)
+        if not pending or pending[0] != fingerprint(screenshot) or pending[1].cancelled():
+            return None
+        del self._pending[region]
+        self.hits += 1
+        return pending[1]
+
+    def discard(self):
+        """Drops every speculative read, such as after a click, when the
+        frames they were started on may no longer be on screen.
+        """
+        for _, future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+
+    def close(self):
+        self.discard()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,226 @@
+"""Turns an OOB into the list of actions the driver takes to enter it into
+the unit editor. To see the plan for an OOB without clicking anything, run:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.planner cmak debug/Axis_oob.json
+
+which prints each action, and the estimated number of clicks compared with
+entering the OOB as it is laid out.
+"""
+import argparse
+import json
+from typing import NamedTuple
+
+# Clicks each kind of action takes, not counting add_units, which takes one
+# per unit.
+ACTION_CLICKS = {
+    'open_unit_editor': 1,
+    'select_army': 2,
+    'select_nation': 2,
+    'select_wave': 2,
+    'select_division': 2,
+    'select_unit_type': 1,
+    'close_unit_editor': 1,
+}
+
+# The selectors below the nation, in the order they are set.
+SELECTORS = ('wave', 'division', 'unit_type')
+
+# The selections each selector resets when it changes. The divisions and unit
+# lists on offer depend on the nation, so changing it resets everything below
+# it. The division is assumed to reset the unit type tab. The location is
+# independent of the others.
+RESETS = {
+    'nation': ('wave', 'division', 'unit_type'),
+    'wave': (),
+    'division': ('unit_type',),
+    'unit_type': (),
+}
+
+
+class Action(NamedTuple):
+    """One step of a plan. kind is one of ACTION_CLICKS or add_units. target
+    is the text to select, or for add_units the tuple of unit names to add.
+    add_units actions also carry the nation, division and unit types the units
+    come from.
+    """
+    kind: str
+    target: object = None
+    nation: str = None
+    division: str = None
+    unit_types: tuple = ()
+
+
+def get_unit_type_label(unit_type, game_id):
+    """Returns the text of the tab for unit_type in the unit editor. Artillery
+    and Air share a tab.
+    """
+    if unit_type == 'Artillery' or unit_type == 'Air':
+        return 'Artillery' if game_id == 'cmbo' else 'Artillery/Air'
+    return unit_type
+
+
+def _group_identical(names):
+    """Orders names so that identical names are next to each other, in the
+    order each name first appears.
+    """
+    first_index = {}
+    for name in names:
+        first_index.setdefault(name, len(first_index))
+    return tuple(sorted(names, key=first_index.get))
+
+
+def _get_groups(waves, game_id):
+    """Returns a dict of (wave, division, unit type tab) to the unit types
+    and unit names to add there, merging groups which share a tab and leaving
+    out those with no units.
+    """
+    groups = {}
+    for wave, divisions in waves.items():
+        for division, unit_types in divisions.items():
+            for unit_type, units in unit_types.items():
+                if not units:
+                    continue
+                key = (wave, division if game_id != 'cmbo' else None, get_unit_type_label(unit_type, game_id))
+                group = groups.setdefault(key, {'division': division, 'unit_types': [], 'units': []})
+                if unit_type not in group['unit_types']:
+                    group['unit_types'].append(unit_type)
+                group['units'].extend(unit['name'] for unit in units)
+    return groups
+
+
+def _go_to(state, key, actions=None):
+    """Updates state, a dict of selector to its active value, with the
+    selections needed to get to the group at key, which is (wave, division,
+    unit type tab), appending them to actions if given. Returns the number of
+    clicks they take. The selections are made in order, since each one resets
+    those below it.
+    """
+    clicks = 0
+    for selector, value in zip(SELECTORS, key):
+        if value is not None and state.get(selector) != value:
+            clicks += ACTION_CLICKS[f'select_{selector}']
+            if actions is not None:
+                actions.append(Action(f'select_{selector}', value))
+            for reset in RESETS[selector]:
+                state.pop(reset, None)
+            state[selector] = value
+    return clicks
+
+
+def plan_oob(oob, game_id, optimise=True):
+    """Returns the list of Actions which enter oob, as prepared by the
+    adapter's generate_oob(), into the unit editor, starting and ending on the
+    scenario editor.
+
+    The plan skips groups with no units, merges groups which are entered on
+    the same tab, orders each nation's groups so as to need the fewest
+    selector clicks, skips selections which are already active, and puts
+    identical units next to each other. If optimise is False, the plan
+    instead selects every nation, wave, division and unit type in the order
+    they are laid out in the oob, which is useful for comparison.
+    """
+    if oob['army'] not in ['Allied', 'Axis']:
+        raise ValueError(f'Army must be either "Allied" or "Axis". Got {oob["army"]}.')
+
+    actions = [Action('open_unit_editor')]
+    if oob['army'] == 'Allied':
+        actions.append(Action('select_army', 'Allied'))
+
+    for nation, waves in oob['nations'].items():
+        if not optimise:
+            actions.extend(_plan_nation_as_laid_out(nation, waves, game_id))
+            continue
+        groups = _get_groups(waves, game_id)
+        if not groups:
+            continue
+        actions.append(Action('select_nation', nation))
+        state = {'nation': nation}
+        remaining = list(groups)
+        while remaining:
+            # Greedily go to whichever group is cheapest to get to next. Ties
+            # keep the order of the oob.
+            key = min(remaining, key=lambda key: _go_to(dict(state), key))
+            remaining.remove(key)
+            _go_to(state, key, actions)
+            group = groups[key]
+            actions.append(Action(
+                'add_units', _group_identical(group['units']), nation=nation, division=group['division'],
+                unit_types=tuple(group['unit_types'])
+            ))
+
+    actions.append(Action('close_unit_editor'))
+    return actions
+
+
+def _plan_nation_as_laid_out(nation, waves, game_id):
+    actions = [Action('select_nation', nation)]
+    for wave, divisions in waves.items():
+        actions.append(Action('select_wave', wave))
+        for division, unit_types in divisions.items():
+            if game_id != 'cmbo':
+                actions.append(Action('select_division', division))
+            for unit_type, units in unit_types.items():
+                actions.append(Action('select_unit_type', get_unit_type_label(unit_type, game_id)))
+                actions.append(Action(
+                    'add_units', tuple(unit['name'] for unit in units), nation=nation, division=division,
+                    unit_types=(unit_type,)
+                ))
+    return actions
+
+
+def get_active_selections(actions):
+    """Returns the selection actions in effect once actions, the start of a
+    plan, have been carried out, in the order they need to be made to get back
+    to the same place, such as when resuming a plan part way through.
+    """
+    selections = {}
+    for action in actions:
+        if not action.kind.startswith('select_'):
+            continue
+        selector = action.kind[len('select_'):]
+        for reset in RESETS.get(selector, ()):
+            selections.pop(reset, None)
+        selections[selector] = action
+    order = ('army', 'nation') + SELECTORS
+    return [selections[selector] for selector in order if selector in selections]
+
+
+def estimate_clicks(actions):
+    """Returns the estimated number of clicks a plan takes."""
+    return sum(len(action.target) if action.kind == 'add_units' else ACTION_CLICKS[action.kind] for action in actions)
+
+
+def format_plan(actions):
+    """Returns a plan as a human readable string, one action per line."""
+    lines = []
+    for i, action in enumerate(actions, 1):
+        if action.kind == 'add_units':
+            lines.append(f'{i:4d}. add_units {", ".join(action.target)}')
+        elif action.target is None:
+            lines.append(f'{i:4d}. {action.kind}')
+        else:
+            lines.append(f'{i:4d}. {action.kind} {action.target}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the plan for entering OOBs, without clicking anything.')
+    parser.add_argument('game_id')
+    parser.add_argument('oobs', nargs='+', help='OOB JSON files, such as the debug artifacts of a run.')
+    args = parser.parse_args()
+
+    for path in args.oobs:
+        with open(path, 'r') as f:
+            oob = json.load(f)
+        actions = plan_oob(oob, args.game_id)
+        print(f'{path} ({oob["army"]})')
+        print(format_plan(actions))
+        print(
+            f'Estimated clicks: {estimate_clicks(actions)}, '
+            f'or {estimate_clicks(plan_oob(oob, args.game_id, optimise=False))} as laid out.'
+        )
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Records runs of the driver against the game, so that they can be replayed
+without it, such as on Linux or in CI. Record a bundle with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.replay scenario_config.yaml replays/cmak
+
+which generates and populates the scenario as main.py does, saving what was on
+screen before each click, where each click was, and the generated OOBs. The
+replay benchmark in benchmark.py then populates the same OOBs again from the
+bundle.
+"""
+import argparse
+import json
+import logging
+import math
+import time
+from pathlib import Path
+
+import yaml
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.errors import ReplayError
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_VERSION = 1
+
+# Replayed clicks further than this many pixels from the recorded click count as
+# clicking something else.
+CLICK_TOLERANCE = 5
+
+
+class ReplayBundle():
+    """A recording of one run of the driver. Frame i is what was on screen
+    before click i, and the last frame is what was on screen at the end, so
+    there is always one more frame than there are clicks.
+    """
+    def __init__(self, game_id, screen_size, frames=None, clicks=None, oobs=None):
+        self.game_id = game_id
+        self.screen_size = tuple(screen_size)
+        self.frames = frames if frames is not None else []
+        self.clicks = clicks if clicks is not None else []
+        self.oobs = oobs if oobs is not None else []
+
+    def save(self, directory):
+        directory = Path(directory)
+        frames_directory = directory / 'frames'
+        frames_directory.mkdir(parents=True, exist_ok=True)
+        for i, frame in enumerate(self.frames):
+            # PNG is lossless, so replayed frames have the same fingerprints as
+            # the recorded ones.
+            frame.save(frames_directory / f'{i:05d}.png')
+        data = {
+            'version': BUNDLE_VERSION,
+            'game_id': self.game_id,
+            'screen_size': list(self.screen_size),
+            'clicks': [list(click) for click in self.clicks],
+            'oobs': self.oobs,
+        }
+        with open(directory / 'bundle.json', 'w') as f:
+            json.dump(data, f, indent=4)
+
+    @classmethod
+    def load(cls, directory):
+        """Loads a bundle saved by save(), decoding all of its frames up front
+        so that decoding doesn't count towards replay timings.
+        """
+        directory = Path(directory)
+        with open(directory / 'bundle.json', 'r') as f:
+            data = json.load(f)
+        if data.get('version') != BUNDLE_VERSION:
+            raise ValueError(f'Replay bundle {directory} has version {data.get("version")}, expected {BUNDLE_VERSION}.')
+        frames = [
+            Image.open(directory / 'frames' / f'{i:05d}.png').convert('RGB') for i in range(len(data['clicks']) + 1)
+        ]
+        clicks = [tuple(click) for click in data['clicks']]
+        return cls(data['game_id'], data['screen_size'], frames, clicks, data['oobs'])
+
+
+class RecordingGui():
+    """Wraps pyautogui, or anything with the same interface, and records what
+    was on screen before every click, and where the click was, into a bundle.
+    Call finish() once the run is over to record the final frame.
+    """
+    def __init__(self, gui, bundle):
+        self._gui = gui
+        self.bundle = bundle
+        self._position = (0, 0)
+
+    def size(self):
+        return self._gui.size()
+
+    def screenshot(self, region=None):
+        return self._gui.screenshot(region=region)
+
+    def moveTo(self, x, y):
+        self._position = (int(x), int(y))
+        self._gui.moveTo(x, y)
+
+    def click(self):
+        self.bundle.frames.append(self._gui.screenshot())
+        self.bundle.clicks.append(self._position)
+        self._gui.click()
+
+    def finish(self):
+        self.bundle.frames.append(self._gui.screenshot())
+
+
+class ReplayGui():
+    """Stands in for pyautogui by replaying a bundle. Screenshots are taken
+    from the current frame, and each click moves on to the next frame. Raises a
+    ReplayError if a click isn't where the recorded click was, since the
+    recording says nothing about what would have happened instead.
+
+    click_times holds the time.perf_counter() of each click, for benchmarking.
+    """
+    def __init__(self, bundle, tolerance=CLICK_TOLERANCE):
+        self.bundle = bundle
+        self._tolerance = tolerance
+        self._position = (0, 0)
+        self._frame = 0
+        self.click_times = []
+
+    @property
+    def finished(self):
+        """True once every recorded click has been replayed."""
+        return self._frame == len(self.bundle.clicks)
+
+    def size(self):
+        return self.bundle.screen_size
+
+    def screenshot(self, region=None):
+        frame = self.bundle.frames[self._frame]
+        if region is None:
+            return frame.copy()
+        left, top, width, height = region
+        return frame.crop((left, top, left + width, top + height))
+
+    def moveTo(self, x, y):
+        self._position = (x, y)
+
+    def click(self):
+        if self.finished:
+            raise ReplayError(f'Clicked {self._position} after the end of the recording.')
+        expected = self.bundle.clicks[self._frame]
+        if math.dist(self._position, expected) > self._tolerance:
+            raise ReplayError(f'Click {self._frame} was at {self._position}, but was recorded at {expected}.')
+        self.click_times.append(time.perf_counter())
+        self._frame += 1
+
+
+def record(scenario_config, directory):
+    """Generates and populates the scenario against the running game, as
+    main.py does, and saves a recording of the run to directory.
+    """
+    # Imported here rather than at the top, since they need pyautogui and a
+    # display, and the rest of this module is used to replay without either.
+    import pyautogui
+
+    from tac_scenario_generator.adapters.combat_mission.adapter import \
+        CombatMissionAdapter
+    from tac_scenario_generator.adapters.combat_mission.driver import \
+        CombatMissionDriver
+
+    game_id = scenario_config['game_id']
+    recorder = RecordingGui(pyautogui, ReplayBundle(game_id, pyautogui.size()))
+    adapter = CombatMissionAdapter(game_id, driver=CombatMissionDriver(game_id, gui=recorder))
+    oobs = adapter.generate_and_populate(scenario_config)
+    recorder.finish()
+    recorder.bundle.oobs = [oob for oob in oobs if oob]
+    recorder.bundle.save(directory)
+    logger.info(f'Recorded {len(recorder.bundle.clicks)} clicks to {directory}.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record a run of the driver for offline replay.')
+    parser.add_argument('scenario_config', help='Path to the scenario config to generate and populate.')
+    parser.add_argument('directory', help='Directory to save the recording to.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.scenario_config, 'r') as f:
+        scenario_config = yaml.safe_load(f)
+    print('Recording. Please navigate to the scenario editor in the game now.')
+    time.sleep(5)
+    record(scenario_config, args.directory)
+
+
+if __name__ == '__main__':
+    main()
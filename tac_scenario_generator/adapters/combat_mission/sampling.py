@@ -0,0 +1,88 @@
+import random
+
+
+def get_rarity_weight(rarity):
+    """Converts a force data rarity, a percentage surcharge on the unit's
+    cost, to the weight with which the unit is picked at random. Rarer units
+    are picked less often.
+    """
+    return int(100 / ((100 + rarity) / 100))
+
+
+class UnitSampler():
+    """Picks unit names at random, weighted by their rarity, in constant time
+    per draw using Vose's alias method. Build one with compile_sampler().
+    """
+    def __init__(self, names, weights):
+        if not names or len(names) != len(weights):
+            raise ValueError('A sampler needs at least one name, and exactly one weight per name.')
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError('A sampler needs at least one positive weight.')
+        self.names = list(names)
+        self.weights = list(weights)
+        self._arrays = None
+
+        # Scale the weights so that they average 1, then pair off each column
+        # which is short of 1 with a column which has weight to spare, until
+        # every column is full. Each column then holds its own name with
+        # probabilities[i], and its alias otherwise.
+        count = len(self.names)
+        scaled = [weight * count / total for weight in weights]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            i = small.pop()
+            j = large.pop()
+            self.probabilities[i] = scaled[i]
+            self.aliases[i] = j
+            scaled[j] -= 1 - scaled[i]
+            (small if scaled[j] < 1 else large).append(j)
+        # Anything left over is full, give or take floating point error.
+
+    def draw_one(self, rng=random):
+        """Returns one name. rng is a random.Random, or the random module."""
+        u = rng.random() * len(self.names)
+        i = int(u)
+        if u - i >= self.probabilities[i]:
+            i = self.aliases[i]
+        return self.names[i]
+
+    def draw(self, n, rng=random):
+        """Returns a list of n names drawn independently."""
+        return [self.draw_one(rng) for _ in range(n)]
+
+    def draw_indices(self, n, rng):
+        """Returns a numpy array of the indices into names of n independent
+        draws. rng is a numpy.random.Generator.
+        """
+        # numpy is only needed for bulk draws, such as by the simulator, so
+        # generating a single scenario doesn't pay to import it.
+        import numpy
+
+        if self._arrays is None:
+            self._arrays = (numpy.array(self.probabilities), numpy.array(self.aliases))
+        probabilities, aliases = self._arrays
+        u = rng.random(n) * len(self.names)
+        indices = u.astype(numpy.intp)
+        return numpy.where(u - indices >= probabilities[indices], aliases[indices], indices)
+
+
+def compile_sampler(names, rarities, unavailable_rarity, exclude=()):
+    """Returns a UnitSampler over the units called names, weighted by their
+    rarities, as read from the force data. Units whose rarity is
+    unavailable_rarity, or whose name is in exclude, are left out. Raises a
+    ValueError if no units are left.
+    """
+    available_names = []
+    weights = []
+    for name, rarity in zip(names, rarities):
+        if rarity == unavailable_rarity or name in exclude:
+            continue
+        available_names.append(name)
+        weights.append(get_rarity_weight(rarity))
+    if not available_names:
+        raise ValueError('No units are available at this date.')
+    return UnitSampler(available_names, weights)
@@ -0,0 +1,227 @@
+"""Compiles a scenario config into a validated ScenarioPlan before anything is
+generated or clicked, so that mistakes in the config fail straight away rather
+than part way through populating the game. To check a config on its own, run:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.scenario scenario_config.yaml
+
+Compiled plans are cached on disk, keyed by a hash of the config and the
+game's force data, so an unchanged config is only checked once.
+"""
+import argparse
+import difflib
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import yaml
+
+from tac_scenario_generator.adapters import get_adapter
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    ScenarioConfigError
+from tac_scenario_generator.adapters.combat_mission.force_store import \
+    get_force_data_directory
+from tac_scenario_generator.settings import SCENARIO_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+ARMIES = ('Allied', 'Axis')
+
+# The keys a unit config may have, besides unit_name. See
+# CombatMissionAdapter._generate_units().
+UNIT_CONFIG_KEYS = ('count', 'count_min', 'count_max', 'chance_per_unit', 'chance', 'all_same')
+
+
+class UnitGroup(NamedTuple):
+    """One unit config of a scenario, with where it is entered and the force
+    data file it is drawn from.
+    """
+    army: str
+    nation: str
+    wave: str
+    division: str
+    unit_type: str
+    force_data: str
+    unit_name: str
+    count: int = 1
+    count_min: Optional[int] = None
+    count_max: Optional[int] = None
+    chance_per_unit: int = 100
+    chance: int = 100
+    all_same: bool = False
+
+
+class ScenarioPlan(NamedTuple):
+    """A scenario config which has been checked against the force data."""
+    game_id: str
+    year: int
+    month: str
+    region: str
+    groups: tuple
+    budgets: dict
+
+    def to_json(self):
+        return {**self._asdict(), 'groups': [group._asdict() for group in self.groups]}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**{**data, 'groups': tuple(UnitGroup(**group) for group in data['groups'])})
+
+
+def get_scenario_hash(scenario_config):
+    """Returns a hash of scenario_config and the force data files of its
+    game, which changes whenever either does.
+    """
+    digest = hashlib.sha256(json.dumps(scenario_config, sort_keys=True, default=str).encode())
+    for path in sorted(get_force_data_directory(scenario_config.get('game_id', '')).glob('*.csv')):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def compile_scenario(adapter, scenario_config, cache_dir=SCENARIO_CACHE_DIR):
+    """Returns the ScenarioPlan for scenario_config, checked against the force
+    data of adapter, a CombatMissionAdapter for the config's game. Raises a
+    ScenarioConfigError listing every problem with the config.
+
+    Every nation, division and unit type must have force data, explicitly
+    named units must be in it, and the force data of random units must have
+    rarities for the scenario's region and date. Plans are cached in
+    cache_dir, if given.
+    """
+    cache_path = None
+    if cache_dir:
+        cache_path = Path(cache_dir) / f'{get_scenario_hash(scenario_config)}.json'
+        if cache_path.exists():
+            with open(cache_path, 'r') as f:
+                return ScenarioPlan.from_json(json.load(f))
+
+    problems = []
+    plan = _compile(adapter, scenario_config, problems)
+    if problems:
+        raise ScenarioConfigError(
+            'The scenario config has {} problem{}:\n{}'.format(
+                len(problems), 's' if len(problems) > 1 else '', '\n'.join(f'  {problem}' for problem in problems)
+            )
+        )
+
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(plan.to_json(), f, indent=4)
+    return plan
+
+
+def _compile(adapter, scenario_config, problems):
+    """Builds the ScenarioPlan for scenario_config, appending a description
+    of each problem found to problems.
+    """
+    missing = [key for key in ('game_id', 'year', 'month', 'region') if key not in scenario_config]
+    if missing:
+        problems.append(f'Missing {", ".join(missing)}.')
+        return None
+    try:
+        adapter.set_scenario(scenario_config)
+    except ValueError as e:
+        problems.append(str(e))
+        return None
+
+    groups = []
+    armies = scenario_config.get('armies') or {}
+    for army, nations in armies.items():
+        if army not in ARMIES:
+            problems.append(f'Army must be either "Allied" or "Axis". Got {army}.')
+            continue
+        for nation, waves in (nations or {}).items():
+            for wave, divisions in (waves or {}).items():
+                for division, unit_types in (divisions or {}).items():
+                    for unit_type, unit_configs in (unit_types or {}).items():
+                        where = f'{army} {nation} {wave} {division} {unit_type}'
+                        for unit_config in unit_configs or []:
+                            group = _compile_group(
+                                adapter, army, nation, wave, division, unit_type, unit_config, where, problems
+                            )
+                            if group:
+                                groups.append(group)
+
+    budgets = scenario_config.get('budgets') or {}
+    nations = {nation for army_nations in armies.values() for nation in (army_nations or {})}
+    for scope, budget in budgets.items():
+        if scope not in ARMIES and scope not in nations:
+            problems.append(f'Budget {scope} is not an army or a nation of the scenario.')
+        if not isinstance(budget, dict) or not _is_number(budget.get('points'), whole=True):
+            problems.append(f'Budget {scope} must have a whole number of points.')
+        elif not _is_number(budget.get('tolerance', 0)) or budget.get('tolerance', 0) < 0:
+            problems.append(f'Budget {scope} must have a tolerance of 0 or more points.')
+
+    return ScenarioPlan(
+        scenario_config['game_id'], scenario_config['year'], scenario_config['month'], scenario_config['region'],
+        tuple(groups), budgets
+    )
+
+
+def _is_number(value, whole=False):
+    # bool is an int, but true isn't a number of points.
+    return isinstance(value, int if whole else (int, float)) and not isinstance(value, bool)
+
+
+def _compile_group(adapter, army, nation, wave, division, unit_type, unit_config, where, problems):
+    """Returns the UnitGroup for one unit config, or None if it has
+    problems, which are appended to problems.
+    """
+    found = len(problems)
+    unit_name = unit_config.get('unit_name')
+    if not unit_name:
+        problems.append(f'{where}: every unit config needs a unit_name.')
+    unknown = [key for key in unit_config if key != 'unit_name' and key not in UNIT_CONFIG_KEYS]
+    if unknown:
+        problems.append(f'{where}: unknown unit config keys {", ".join(unknown)}.')
+    count_min, count_max = unit_config.get('count_min'), unit_config.get('count_max')
+    if (count_min is None) != (count_max is None):
+        problems.append(f'{where}: if count_min is provided, count_max must also be provided.')
+    elif count_min is not None and count_min >= count_max:
+        problems.append(f'{where}: count_min must be less than count_max.')
+    for key in ('chance', 'chance_per_unit'):
+        if not 0 <= unit_config.get(key, 100) <= 100:
+            problems.append(f'{where}: {key} must be between 0 and 100.')
+
+    force_data = adapter.get_force_data_name(nation=nation, division=division, unit_type=unit_type)
+    unit_names = adapter.get_unit_names(nation=nation, division=division, unit_type=unit_type)
+    if unit_names is None:
+        problems.append(f'{where}: no force data named {force_data}. Check the nation, division and unit type.')
+    elif unit_name == 'random':
+        try:
+            adapter.get_sampler(nation=nation, unit_type=unit_type, division=division)
+        except ValueError as e:
+            problems.append(f'{where}: {e}')
+    elif unit_name and unit_name not in unit_names:
+        suggestions = difflib.get_close_matches(unit_name, unit_names, n=3)
+        hint = f' Did you mean {" or ".join(suggestions)}?' if suggestions else ''
+        problems.append(f'{where}: {unit_name} is not in the force data.{hint}')
+
+    if len(problems) > found:
+        return None
+    return UnitGroup(army, nation, wave, division, unit_type, force_data, **unit_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a scenario config against the force data.')
+    parser.add_argument('scenario_config', help='Path to the scenario config to check.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.scenario_config, 'r') as f:
+        scenario_config = yaml.safe_load(f)
+
+    try:
+        plan = compile_scenario(get_adapter(scenario_config['game_id']), scenario_config, cache_dir=None)
+    except ScenarioConfigError as e:
+        logger.error(e)
+        sys.exit(1)
+    logger.info(f'{args.scenario_config} is valid, with {len(plan.groups)} unit configs.')
+
+
+if __name__ == '__main__':
+    main()
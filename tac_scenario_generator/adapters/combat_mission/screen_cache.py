@@ -0,0 +1,61 @@
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(image):
+    """Returns a hash of the raw pixels of the given PIL image. Hashing the
+    pixel buffer is orders of magnitude cheaper than running OCR over it, and
+    two captures with the same fingerprint are guaranteed to produce the same
+    OCR detections.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{image.mode}{image.size}'.encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ScreenCache():
+    """Holds the OCR detections for the most recently read frame, so that
+    repeated text queries against an unchanged screen are answered from memory
+    instead of running another recognition pass.
+    """
+    def __init__(self):
+        self._fingerprint = None
+        self._detections = None
+        # Whether the cached detections are a reading of the frame which
+        # can't be improved on. See replace().
+        self.final = False
+        self.hits = 0
+        self.misses = 0
+
+    def get_detections(self, image, read):
+        """Returns the detections for the given image. read is a callable
+        which takes no arguments and performs OCR on the image; it is only
+        called if the image differs from the one whose detections are cached.
+        """
+        image_fingerprint = fingerprint(image)
+        if image_fingerprint == self._fingerprint:
+            self.hits += 1
+            logger.debug(f'Screen unchanged, reusing {len(self._detections)} cached detections.')
+            return self._detections
+
+        self.misses += 1
+        self._detections = read()
+        self._fingerprint = image_fingerprint
+        self.final = False
+        return self._detections
+
+    def replace(self, detections):
+        """Replaces the cached detections with a final reading of the same
+        frame, such as one by a slower, more thorough OCR backend.
+        """
+        self._detections = detections
+        self.final = True
+
+    def invalidate(self):
+        """Forgets the cached detections, forcing the next read to run OCR."""
+        self._fingerprint = None
+        self._detections = None
+        self.final = False
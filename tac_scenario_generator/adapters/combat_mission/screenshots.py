@@ -0,0 +1,94 @@
+import atexit
+import itertools
+import logging
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from tac_scenario_generator.adapters.combat_mission.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class ScreenshotWriter():
+    """Persists debug screenshots from a background thread, so that PNG
+    encoding never sits on the driver's hot path.
+
+    Screenshots are queued without blocking. If the queue is full the
+    screenshot is dropped rather than stalling the caller. Only the newest
+    retention screenshots in the directory are kept; a retention of 0 disables
+    persistence entirely.
+    """
+    def __init__(self, directory, retention=100, max_queued=8):
+        self._directory = Path(directory)
+        self._retention = retention
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._sequence = itertools.count()
+        self._saved = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, image):
+        """Queues the PIL image to be saved, and returns the path it will be
+        saved to, or None if the screenshot will not be saved.
+        """
+        if self._retention <= 0:
+            return None
+        self._ensure_started()
+
+        # The sequence number keeps names unique and ordered even when several
+        # captures happen within the same timestamp tick.
+        path = self._directory / f'{datetime.now():%Y%m%d-%H%M%S-%f}-{next(self._sequence):06d}.png'
+        try:
+            self._queue.put_nowait((path, image))
+        except queue.Full:
+            self.dropped += 1
+            logger.debug(f'Screenshot queue full, dropping {path.name}.')
+            return None
+        return path
+
+    def flush(self):
+        """Blocks until every queued screenshot has been written."""
+        if self._thread:
+            self._queue.join()
+
+    def close(self):
+        """Writes any queued screenshots and stops the writer thread."""
+        with self._lock:
+            if not self._thread:
+                return
+            self._queue.put((None, None))
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread:
+                return
+            if self._saved is None:
+                self._saved = deque(sorted(self._directory.glob('*.png')))
+            self._thread = threading.Thread(target=self._run, name='screenshot-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            path, image = self._queue.get()
+            try:
+                if path is None:
+                    return
+                with tracer.span('save_screenshot'):
+                    image.save(path)
+                self._saved.append(path)
+                self._prune()
+            except OSError:
+                logger.exception(f'Failed to save debug screenshot {path}.')
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        while len(self._saved) > self._retention:
+            self._saved.popleft().unlink(missing_ok=True)
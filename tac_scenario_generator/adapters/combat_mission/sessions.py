@@ -0,0 +1,257 @@
+"""Populates many scenarios at once, across several instances of the game, each
+on its own X display or in its own region of a shared one. Run with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.sessions cmak library/*.json --display :1
+
+with a --display for each display with a game filling it, or a --region for
+each game window, such as --region left=0,0,960,1080 --region right=960,0,960,1080.
+
+Each scenario file, as written by batch.py, is populated by whichever session
+is free next. Every session runs in its own process, with its own driver,
+layout and calibration, and they all share the resident OCR service, so start
+that first (see ocr_service.py) or each session loads its own models. On Linux,
+virtual displays for the game instances can be started with Xvfb, such as
+`Xvfb :1 -screen 0 1920x1080x24`.
+
+Each session must already be on the scenario editor, and is left there after
+each scenario. Saving the scenario and starting the next one between jobs is
+up to whoever runs the game instances.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from typing import NamedTuple, Optional
+
+from tac_scenario_generator.adapters.combat_mission import ocr_service
+from tac_scenario_generator.settings import CALIBRATION_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class Session(NamedTuple):
+    """Where one instance of the game is. display is the X display it is on,
+    or None for the default one. region is the (left, top, width, height) of its
+    window on the display, or None if it fills the display.
+    """
+    name: str
+    display: Optional[str] = None
+    region: Optional[tuple] = None
+
+
+class RegionGui():
+    """Presents one region of a display to a driver as though it were the
+    whole screen, translating coordinates in and out of it, so that several
+    drivers can share one display.
+
+    Sessions on one display share its mouse, so a move and the click which
+    follows it are made together while holding input_lock. The cursor is then
+    parked at the region's top left corner, rather than the display's, so that
+    it stays clear of the other sessions' windows.
+    """
+    def __init__(self, gui, region, input_lock):
+        self._gui = gui
+        self._region = tuple(region)
+        self._input_lock = input_lock
+        self._position = (0, 0)
+
+    def size(self):
+        return self._region[2:]
+
+    def screenshot(self, region=None):
+        left, top, width, height = self._region
+        if region is not None:
+            left, top, width, height = left + region[0], top + region[1], region[2], region[3]
+        return self._gui.screenshot(region=(left, top, width, height))
+
+    def moveTo(self, x, y):
+        self._position = (x, y)
+
+    def click(self):
+        left, top = self._region[:2]
+        with self._input_lock:
+            self._gui.moveTo(left + self._position[0], top + self._position[1])
+            self._gui.click()
+            self._gui.moveTo(left, top)
+
+
+def make_driver(game_id, session, gui):
+    """Returns the driver for a session, with its own calibration. gui is the
+    session's screen, or None for the whole of its display.
+    """
+    from tac_scenario_generator.adapters.combat_mission.driver import \
+        CombatMissionDriver
+
+    return CombatMissionDriver(game_id, gui=gui, calibration_dir=CALIBRATION_DIR / session.name)
+
+
+def _run_session(game_id, session, jobs, results, input_lock, driver_factory):
+    """Populates scenario files from jobs in one session until it is empty,
+    putting (session name, path, error or None) on results for each.
+    """
+    # pyautogui connects to the display when it is imported, which the driver
+    # only does once it is first needed, so this decides which display this
+    # process drives.
+    if session.display:
+        os.environ['DISPLAY'] = session.display
+    logging.basicConfig(level=logging.INFO)
+
+    from tac_scenario_generator.adapters.combat_mission.adapter import \
+        CombatMissionAdapter
+
+    gui = None
+    if session.region:
+        import pyautogui
+
+        gui = RegionGui(pyautogui, session.region, input_lock)
+    driver = driver_factory(game_id, session, gui)
+    adapter = CombatMissionAdapter(game_id, driver=driver)
+
+    while True:
+        path = jobs.get()
+        if path is None:
+            return
+        try:
+            with open(path, 'r') as f:
+                scenario = json.load(f)
+            for oob in (scenario['allied_oob'], scenario['axis_oob']):
+                if oob:
+                    driver.populate_oob(oob, get_vocabulary=adapter.get_unit_names)
+        except Exception as e:
+            # The session's game is now in an unknown state, so it takes no
+            # more jobs.
+            logger.exception(f'Session {session.name} failed to populate {path}.')
+            results.put((session.name, path, repr(e)))
+            results.put((session.name, None, None))
+            return
+        results.put((session.name, path, None))
+
+
+def drain_results(results):
+    """Yields the (session name, path, error) still on the results queue,
+    without waiting for more, skipping the markers of sessions stopping.
+    """
+    while True:
+        try:
+            name, path, error = results.get_nowait()
+        except queue.Empty:
+            return
+        if path is not None:
+            yield (name, path, error)
+
+
+def populate_scenarios(game_id, paths, sessions, driver_factory=make_driver):
+    """Populates the scenario files at paths across sessions, a list of
+    Session, with one process per session. Yields (session name, path, error)
+    as each scenario finishes, where error is None if it succeeded. A session
+    which fails stops taking jobs, and any scenarios no session could take are
+    yielded with an error at the end.
+
+    driver_factory is called in each session's process with the game id, the
+    session and its gui, and returns its driver. See make_driver().
+    """
+    context = multiprocessing.get_context()
+    jobs, results = context.Queue(), context.Queue()
+    for path in paths:
+        jobs.put(str(path))
+    for _ in sessions:
+        jobs.put(None)
+    input_locks = {session.display: context.Lock() for session in sessions}
+
+    processes = [
+        context.Process(
+            target=_run_session, name=f'session-{session.name}',
+            args=(game_id, session, jobs, results, input_locks[session.display], driver_factory)
+        )
+        for session in sessions
+    ]
+    for process in processes:
+        process.start()
+
+    remaining = len(paths)
+    running = len(processes)
+    while remaining and running:
+        try:
+            name, path, error = results.get(timeout=1)
+        except queue.Empty:
+            running = sum(process.is_alive() for process in processes)
+            continue
+        if path is None:
+            running -= 1
+            continue
+        remaining -= 1
+        yield (name, path, error)
+
+    # A session can put its last results and exit between the checks above.
+    # And a process doesn't exit until everything it put on a queue has been
+    # read, so results are collected while waiting for the sessions to stop,
+    # rather than after.
+    while any(process.is_alive() for process in processes):
+        try:
+            name, path, error = results.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if path is not None:
+            yield (name, path, error)
+    for process in processes:
+        process.join()
+    yield from drain_results(results)
+    while True:
+        try:
+            path = jobs.get_nowait()
+        except queue.Empty:
+            break
+        if path is not None:
+            yield (None, path, 'No session was left to populate it.')
+
+
+def parse_region(text):
+    """Parses a session given as NAME=LEFT,TOP,WIDTH,HEIGHT[@DISPLAY]."""
+    name, _, rest = text.partition('=')
+    region, _, display = rest.partition('@')
+    return Session(name, display or None, tuple(int(i) for i in region.split(',')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Populate scenarios across several game sessions.')
+    parser.add_argument('game_id')
+    parser.add_argument('scenarios', nargs='+', help='Scenario JSON files, as written by batch.py.')
+    parser.add_argument(
+        '--display', action='append', default=[], help='An X display with a game filling it, such as :1.'
+    )
+    parser.add_argument(
+        '--region', action='append', default=[], type=parse_region,
+        help='A game window, as NAME=LEFT,TOP,WIDTH,HEIGHT[@DISPLAY].'
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sessions = [Session(display.lstrip(':'), display) for display in args.display] + args.region
+    if not sessions:
+        parser.error('Give at least one --display or --region.')
+
+    client = ocr_service.connect()
+    if client:
+        client.close()
+    else:
+        logger.warning('The OCR service is not running, so every session will load its own OCR models.')
+
+    start = time.perf_counter()
+    failed = 0
+    for name, path, error in populate_scenarios(args.game_id, args.scenarios, sessions):
+        if error:
+            failed += 1
+            logger.error(f'{path} failed in session {name}: {error}')
+        else:
+            logger.info(f'{path} populated in session {name}.')
+    logger.info(
+        f'{len(args.scenarios) - failed} of {len(args.scenarios)} scenarios populated across {len(sessions)} '
+        f'sessions in {time.perf_counter() - start:.1f}s.'
+    )
+
+
+if __name__ == '__main__':
+    main()
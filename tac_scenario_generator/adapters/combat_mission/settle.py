@@ -0,0 +1,62 @@
+import logging
+import time
+
+from PIL import ImageChops
+
+logger = logging.getLogger(__name__)
+
+# Frames are compared after shrinking them so that neither side is larger than
+# this, which keeps each comparison to a fraction of a millisecond.
+THUMBNAIL_SIZE = (256, 256)
+
+# Per-pixel difference, out of 255, below which a thumbnail pixel counts as
+# unchanged. Absorbs scaling and compression noise.
+PIXEL_THRESHOLD = 8
+
+
+def get_thumbnail(image):
+    """Returns a small greyscale copy of the image for frame comparisons."""
+    thumbnail = image.convert('L')
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    return thumbnail
+
+
+def frames_differ(a, b):
+    """Returns True if two thumbnails from get_thumbnail() differ anywhere."""
+    if a.size != b.size:
+        return True
+    diff = ImageChops.difference(a, b).point(lambda v: 255 if v > PIXEL_THRESHOLD else 0)
+    return diff.getbbox() is not None
+
+
+def wait_for_change(capture, reference, timeout, interval):
+    """Polls capture(), which returns an image, until it differs from the
+    reference thumbnail. Returns True once it does, or False if nothing has
+    changed within timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if frames_differ(get_thumbnail(capture()), reference):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def wait_for_stable(capture, timeout, interval, stable_frames=2):
+    """Polls capture(), which returns an image, until stable_frames
+    consecutive captures are the same. Returns True once they are, or False if
+    the screen is still changing after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    previous = get_thumbnail(capture())
+    unchanged = 1
+    while unchanged < stable_frames:
+        if time.monotonic() >= deadline:
+            logger.debug(f'Screen still changing after {timeout}s, carrying on.')
+            return False
+        time.sleep(interval)
+        current = get_thumbnail(capture())
+        unchanged = 1 if frames_differ(current, previous) else unchanged + 1
+        previous = current
+    return True
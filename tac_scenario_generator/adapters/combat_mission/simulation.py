@@ -0,0 +1,188 @@
+"""Monte-Carlo statistics for a scenario config, for balancing it without
+generating OOBs one at a time. Run with:
+
+    poetry run python -m tac_scenario_generator.adapters.combat_mission.simulation scenario_config.yaml -n 100000
+
+to print, for each army, the distribution of its unit count and total cost,
+and how often each unit appears in it. The simulation follows the same rules as
+the adapter's generate_oob(), but draws whole batches of OOBs at once.
+"""
+import argparse
+import logging
+
+import numpy
+import yaml
+
+from tac_scenario_generator.adapters.combat_mission.adapter import \
+    CombatMissionAdapter
+from tac_scenario_generator.adapters.combat_mission.tables import print_table
+
+logger = logging.getLogger(__name__)
+
+# OOBs simulated per batch, which bounds memory use however many are simulated.
+BATCH_SIZE = 100000
+
+PERCENTILES = [5, 50, 95]
+
+
+def get_unit_count_distribution(rng, n, count=1, count_min=None, count_max=None, chance_per_unit=100, chance=100):
+    """Returns a numpy array of the number of units in a unit group, for n
+    OOBs. See the adapter's _generate_units() and _get_unit_count() for the
+    meanings of the arguments.
+    """
+    if (count_min is not None and count_max is None) or (count_max is not None and count_min is None):
+        raise ValueError('if count_min is provided, count_max must also be provided.')
+    elif count_min is not None and count_max is not None:
+        if count_min >= count_max:
+            raise ValueError('count_min must be less that count_max.')
+        counts = rng.integers(count_min, count_max, n, endpoint=True)
+    else:
+        # Each unit is included if randint(1, 100) < chance_per_unit.
+        counts = rng.binomial(count, min(max((chance_per_unit - 1) / 100, 0), 1), n)
+    # The whole group is left out if randint(1, 100) > chance.
+    present = rng.integers(1, 100, n, endpoint=True) <= chance
+    return counts * present
+
+
+class ArmySimulation():
+    """Accumulates statistics for one army over batches of simulated OOBs."""
+    def __init__(self, adapter, army, config):
+        self._adapter = adapter
+        self.army = army
+        self._config = config
+        # Every unit which can appear in the army, as (nation, name), and its
+        # cost. Filled in as units are first seen.
+        self.units = []
+        self._unit_ids = {}
+        self._costs = []
+
+        self.unit_counts = []
+        self.costs = []
+        self.appearances = numpy.zeros(0, dtype=numpy.int64)
+        self.totals = numpy.zeros(0, dtype=numpy.int64)
+        self.n = 0
+
+    def _get_unit_id(self, nation, name, cost):
+        key = (nation, name)
+        if key not in self._unit_ids:
+            self._unit_ids[key] = len(self.units)
+            self.units.append(key)
+            self._costs.append(cost)
+        return self._unit_ids[key]
+
+    def simulate(self, n, rng):
+        """Simulates n more OOBs."""
+        batch_oobs = []
+        batch_units = []
+        for nation, waves in self._config.items():
+            for divisions in waves.values():
+                for division, unit_types in divisions.items():
+                    for unit_type, unit_configs in unit_types.items():
+                        for unit_config in unit_configs:
+                            oobs, units = self._simulate_group(n, rng, nation, division, unit_type, **unit_config)
+                            batch_oobs.append(oobs)
+                            batch_units.append(units)
+
+        oobs = numpy.concatenate(batch_oobs + [numpy.zeros(0, dtype=numpy.int64)])
+        units = numpy.concatenate(batch_units + [numpy.zeros(0, dtype=numpy.int64)])
+        unit_counts = numpy.bincount(oobs, minlength=n)
+        costs = numpy.bincount(oobs, weights=numpy.array(self._costs, dtype=float)[units], minlength=n)
+
+        # Count each unit once per OOB it appears in, however many times it
+        # appears there.
+        unit_total = len(self.units)
+        appearing = numpy.unique(oobs * unit_total + units) % max(unit_total, 1)
+        appearances = numpy.bincount(appearing, minlength=unit_total)
+        totals = numpy.bincount(units, minlength=unit_total)
+        self.appearances = numpy.pad(self.appearances, (0, unit_total - len(self.appearances))) + appearances
+        self.totals = numpy.pad(self.totals, (0, unit_total - len(self.totals))) + totals
+        self.unit_counts.append(unit_counts)
+        self.costs.append(costs)
+        self.n += n
+
+    def _simulate_group(self, n, rng, nation, division, unit_type, unit_name, all_same=False, **count_config):
+        """Simulates one unit group for n OOBs, and returns two numpy arrays,
+        the OOB and the unit id of every unit generated.
+        """
+        counts = get_unit_count_distribution(rng, n, **count_config)
+        oobs = numpy.repeat(numpy.arange(n), counts)
+        if unit_name == 'random':
+            sampler = self._adapter.get_sampler(nation=nation, unit_type=unit_type, division=division)
+            unit_costs = self._adapter.get_unit_costs(nation=nation, division=division, unit_type=unit_type)
+            unit_ids = numpy.array([
+                self._get_unit_id(nation, name, unit_costs[name]) for name in sampler.names
+            ])
+            if all_same:
+                indices = numpy.repeat(sampler.draw_indices(n, rng), counts)
+            else:
+                indices = sampler.draw_indices(len(oobs), rng)
+            units = unit_ids[indices]
+        else:
+            try:
+                cost = self._adapter.get_unit_costs(nation=nation, division=division, unit_type=unit_type)[unit_name]
+            except (FileNotFoundError, KeyError):
+                logger.warning(f'No cost for {nation} {unit_name} in the force data, counting it as 0.')
+                cost = 0
+            units = numpy.full(len(oobs), self._get_unit_id(nation, unit_name, cost))
+        return oobs, units
+
+    def get_summary(self):
+        """Returns a dict of the unit count and cost distributions, and a dict
+        of each unit to how often it appears.
+        """
+        distributions = {}
+        for name, batches in [('units', self.unit_counts), ('cost', self.costs)]:
+            values = numpy.concatenate(batches)
+            distributions[name] = {'mean': float(values.mean())}
+            for percentile, value in zip(PERCENTILES, numpy.percentile(values, PERCENTILES)):
+                distributions[name][f'p{percentile}'] = float(value)
+        units = {
+            f'{nation} / {name}': {
+                'appears_%': 100 * self.appearances[i] / self.n,
+                'mean_count': self.totals[i] / self.n,
+            }
+            for i, (nation, name) in enumerate(self.units)
+        }
+        units = dict(sorted(units.items(), key=lambda item: item[1]['appears_%'], reverse=True))
+        return distributions, units
+
+
+def simulate(scenario_config, n, seed=None, batch_size=BATCH_SIZE):
+    """Simulates n OOBs for each army in the scenario config, and returns a
+    dict of army name to its ArmySimulation.
+    """
+    adapter = CombatMissionAdapter(scenario_config['game_id'])
+    adapter.compile_scenario(scenario_config)
+    adapter.set_scenario(scenario_config)
+    rng = numpy.random.default_rng(seed)
+    simulations = {}
+    for army, config in (scenario_config.get('armies') or {}).items():
+        if not config:
+            continue
+        simulation = simulations[army] = ArmySimulation(adapter, army, config)
+        for start in range(0, n, batch_size):
+            simulation.simulate(min(batch_size, n - start), rng)
+    return simulations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the OOBs a scenario config generates.')
+    parser.add_argument('scenario_config', help='Path to the scenario config to simulate.')
+    parser.add_argument('-n', type=int, default=100000, help='Number of OOBs to simulate per army.')
+    parser.add_argument('--seed', type=int, help='Seed, for reproducible statistics.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.scenario_config, 'r') as f:
+        scenario_config = yaml.safe_load(f)
+    for army, simulation in simulate(scenario_config, args.n, seed=args.seed).items():
+        distributions, units = simulation.get_summary()
+        print(f'{army}, {simulation.n} OOBs')
+        print_table(distributions)
+        print()
+        print_table(units)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import numpy
+
+from tac_scenario_generator.adapters.combat_mission.layout import \
+    get_bbox_extents
+from tac_scenario_generator.adapters.combat_mission.matching import \
+    PhraseMatcher
+
+
+class DetectionIndex():
+    """Answers positional queries over one frame's OCR detections, such as
+    "the text most like Infantry on the same row as the Fortification tab",
+    or "every phrase left of the CHOSEN label".
+
+    The bbox extents of the detections are held as arrays, with the
+    detections sorted by the height of their centre, so that vertical
+    constraints are binary searches and horizontal ones a single vectorised
+    comparison. Only the detections which satisfy every constraint are then
+    scored against the target text. Anchors are given as (left, top, right,
+    bottom) extents, as kept by the Layout.
+    """
+    def __init__(self, detections):
+        self.detections = detections
+        self.matcher = PhraseMatcher(detections)
+        extents = numpy.array([get_bbox_extents(detection[0]) for detection in detections], float)
+        self.extents = extents.reshape(-1, 4)
+        self._centers_x = (self.extents[:, 0] + self.extents[:, 2]) / 2
+        centers_y = (self.extents[:, 1] + self.extents[:, 3]) / 2
+        self._order = numpy.argsort(centers_y, kind='stable')
+        self._sorted_centers_y = centers_y[self._order]
+
+    def _get_rows(self, top, bottom):
+        """Returns a mask of the detections whose centre lies between top and
+        bottom, either of which may be None for no limit.
+        """
+        start = 0 if top is None else numpy.searchsorted(self._sorted_centers_y, top, side='left')
+        end = len(self._order) if bottom is None else numpy.searchsorted(self._sorted_centers_y, bottom, side='right')
+        mask = numpy.zeros(len(self._order), bool)
+        mask[self._order[start:end]] = True
+        return mask
+
+    def select(self, region=None, left_of=None, below=None, above=None, same_row_as=None, row_tolerance=None):
+        """Returns a mask of the detections which satisfy every constraint
+        given.
+
+        region is a (left, top, width, height) region the centre of a
+        detection must lie in. left_of is an anchor a detection must start left
+        of. below and above are anchors the centre of a detection must be below
+        or above. same_row_as is an anchor whose top edge the top of a
+        detection must be within row_tolerance pixels of, which defaults to
+        half the anchor's height.
+        """
+        top = bottom = None
+        if region is not None:
+            top, bottom = region[1], region[1] + region[3]
+        if below is not None:
+            top = below[3] if top is None else max(top, below[3])
+        if above is not None:
+            bottom = above[1] if bottom is None else min(bottom, above[1])
+        mask = self._get_rows(top, bottom)
+
+        if region is not None:
+            mask &= (self._centers_x >= region[0]) & (self._centers_x <= region[0] + region[2])
+        if left_of is not None:
+            mask &= self.extents[:, 0] < left_of[0]
+        if same_row_as is not None:
+            if row_tolerance is None:
+                row_tolerance = (same_row_as[3] - same_row_as[1]) / 2
+            mask &= numpy.abs(self.extents[:, 1] - same_row_as[1]) < row_tolerance
+        return mask
+
+    def query(self, text, min_score=1, substring=True, limit=None, **constraints):
+        """Returns the detections which satisfy constraints, as for select(),
+        and score at least min_score for text, as a list of dicts of text, bbox
+        and fuzz_ratio, best first. Ties keep the order of the detections.
+        """
+        columns = numpy.flatnonzero(self.select(**constraints))
+        scores = self.matcher.get_scores([text], substring=substring, columns=columns)[0]
+        ranked = [j for j in columns[numpy.argsort(-scores[columns], kind='stable')] if scores[j] >= min_score]
+        return [self.matcher.get_result(j, scores[j]) for j in ranked[:limit]]
+
+    def find(self, text, **constraints):
+        """Returns the best match for text among the detections which satisfy
+        constraints, or None if nothing matches it.
+        """
+        results = self.query(text, limit=1, **constraints)
+        return results[0] if results else None
+
+    def match(self, targets, vocabulary=None, **constraints):
+        """Matches each of targets to the detections which satisfy
+        constraints, as for PhraseMatcher.match().
+        """
+        return self.matcher.match(targets, vocabulary=vocabulary, candidates=self.select(**constraints))
+
+    def count(self, text, min_score, **constraints):
+        """Returns how many of the detections which satisfy constraints score
+        at least min_score for text, as a whole phrase.
+        """
+        return len(self.query(text, min_score=min_score, substring=False, **constraints))
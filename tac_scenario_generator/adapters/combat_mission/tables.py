@@ -0,0 +1,15 @@
+def print_table(results):
+    """Prints a dict of name to a dict of stats as a table."""
+    columns = list(next(iter(results.values())))
+    name_width = max(len(name) for name in results)
+    print(' '.join([''.ljust(name_width)] + [column.rjust(10) for column in columns]))
+    for name, stats in results.items():
+        cells = [name.ljust(name_width)]
+        for column in columns:
+            value = stats[column]
+            if value is None:
+                value = '-'
+            elif isinstance(value, float):
+                value = f'{value:.3f}'
+            cells.append(str(value).rjust(10))
+        print(' '.join(cells))
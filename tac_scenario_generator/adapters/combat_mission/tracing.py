@@ -0,0 +1,119 @@
+"""Span timing for the driver's hot paths. Wrap a stage in a span:
+
+    with tracer.span('readtext', region=region):
+        ...
+
+When tracing is enabled, each span is recorded, and save() writes them to a
+trace file which can be opened in chrome://tracing or https://ui.perfetto.dev,
+along with a table summarising the time spent in each kind of span. When it is
+disabled, span() returns a shared no-op context manager, so instrumented code
+costs one attribute check per span.
+
+Tracing is enabled by setting TSG_TRACE=1.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from pathlib import Path
+
+from tac_scenario_generator.settings import TRACE
+
+logger = logging.getLogger(__name__)
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span():
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        self._tracer._events.append((self._name, self._start, end - self._start, threading.get_ident(), self._args))
+        return False
+
+
+class Tracer():
+    """Records spans of time spent in named stages. See the module
+    docstring.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._events = []
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name, **args):
+        """Returns a context manager which records the time spent inside it
+        as a span called name, with args as its details in the trace.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def clear(self):
+        self._events = []
+        self._origin = time.perf_counter_ns()
+
+    def get_summary(self):
+        """Returns a dict of span name to its count, and its total, mean and
+        max duration in milliseconds, slowest total first.
+        """
+        durations = defaultdict(list)
+        for name, _, duration, _, _ in self._events:
+            durations[name].append(duration / 1e6)
+        summary = {
+            name: {'count': len(d), 'total_ms': sum(d), 'mean_ms': sum(d) / len(d), 'max_ms': max(d)}
+            for name, d in durations.items()
+        }
+        return dict(sorted(summary.items(), key=lambda item: item[1]['total_ms'], reverse=True))
+
+    def save(self, directory):
+        """Writes the recorded spans to trace.json, in Chrome's trace event
+        format, and the summary to trace_summary.txt, both in directory.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        pid = os.getpid()
+        trace_events = [
+            {
+                'name': name,
+                'ph': 'X',
+                'ts': (start - self._origin) / 1000,
+                'dur': duration / 1000,
+                'pid': pid,
+                'tid': tid,
+                'args': {key: str(value) for key, value in args.items()},
+            }
+            for name, start, duration, tid, args in list(self._events)
+        ]
+        trace_path = directory / 'trace.json'
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+        summary = self.get_summary()
+        name_width = max([len(name) for name in summary] + [4])
+        lines = [f'{"span".ljust(name_width)} {"count":>8} {"total_ms":>12} {"mean_ms":>10} {"max_ms":>10}']
+        for name, stats in summary.items():
+            lines.append(
+                f'{name.ljust(name_width)} {stats["count"]:>8} {stats["total_ms"]:>12.1f} '
+                f'{stats["mean_ms"]:>10.2f} {stats["max_ms"]:>10.2f}'
+            )
+        summary_path = directory / 'trace_summary.txt'
+        with open(summary_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        logger.info(f'Trace of {len(trace_events)} spans dumped to {trace_path}, summary in {summary_path}')
+        return trace_path, summary_path
+
+
+# The tracer shared by the driver and adapter.
+tracer = Tracer(enabled=TRACE)
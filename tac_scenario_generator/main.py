@@ -1,11 +1,18 @@
+import argparse
+import json
 import logging
+import sys
 import time
 from pathlib import Path
 
-import torch
 import yaml
 from adapters import get_adapter
 
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    ScenarioConfigError
+from tac_scenario_generator.adapters.combat_mission.tracing import tracer
+from tac_scenario_generator.settings import DEBUG_DIR
+
 logging.basicConfig(level=logging.DEBUG)
 logging.getLogger('PIL').setLevel(logging.INFO)
 
@@ -13,6 +20,52 @@ logger = logging.getLogger(__name__)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Generate forces and populate them into the game.')
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Carry on populating the forces of a run which stopped part way through, from its journal.'
+    )
+    parser.add_argument(
+        '--generate-only', action='store_true',
+        help='Only generate the forces, and print them as JSON, without touching the game.'
+    )
+    parser.add_argument('--output', help='With --generate-only, write the forces to this JSON file instead.')
+    args = parser.parse_args()
+
+    # For now, this tool only supports Combat mission games, and supports
+    # "generate forces and populate into game" mode, and generating the forces
+    # alone. Thus, the main script does that directly. Can make this more
+    # sophisticated and build a proper interface when needed.
+
+    # read the input yaml into memory.
+    # TODO: nasty hack to read the input from a hardcoded location. works for now.
+    project_directory = Path(__file__).resolve().parent.parent
+    with open(project_directory / 'scenario_config.yaml', 'r') as f:
+        run_config = yaml.safe_load(f)
+
+    # load adapter class for the selected game, and check the config before
+    # anything slow happens, so that mistakes in it fail straight away.
+    adapter = get_adapter(run_config['game_id'])
+    try:
+        plan = adapter.compile_scenario(run_config)
+    except ScenarioConfigError as e:
+        logger.error(e)
+        sys.exit(1)
+
+    # Generating alone never needs the game, so doesn't wait for it, and never
+    # loads the screen capture and OCR dependencies. Nor does it overwrite the
+    # debug oobs of the last run which populated the game.
+    if args.generate_only:
+        allied_oob, axis_oob = adapter.generate(run_config, save_debug=False, plan=plan)
+        oobs = json.dumps({'allied_oob': allied_oob, 'axis_oob': axis_oob}, indent=4)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(oobs)
+            logger.info(f'Forces written to {args.output}')
+        else:
+            print(oobs)
+        return
+
     # The script currently assumes that the user will navigate to the game
     # window after initializing the script, to simplify development. We'll want
     # to replace this with something which automatically maximizes the game in
@@ -26,28 +79,20 @@ def main():
     )
     time.sleep(5)
 
-    # For now, this tool only supports Combat mission games, and only supports
-    # "generate forces and populate into game" mode. Thus, the main script does
-    # that directly. Can make this more sophisticated and build a proper
-    # interface when needed.
-
-    # read the input yaml into memory.
-    # TODO: nasty hack to read the input from a hardcoded location. works for now.
-    project_directory = Path(__file__).resolve().parent.parent
-    with open(project_directory / 'scenario_config.yaml', 'r') as f:
-        run_config = yaml.safe_load(f)
-
-    # load adapter class for the selected game
-    adapter = get_adapter(run_config['game_id'])
-
-    # call the generate_and_populate() method
-    adapter.generate_and_populate(run_config)
+    # call the generate_and_populate() method, or carry on from where the
+    # last run stopped.
+    try:
+        if args.resume:
+            adapter.resume(run_config)
+        else:
+            adapter.generate_and_populate(run_config, plan=plan)
+    finally:
+        if tracer.enabled:
+            tracer.save(DEBUG_DIR)
 
     # TODO: add a simple audio indicator when the script has completed or
     # error'd out.
 
 
 if __name__ == "__main__":
-    if not torch.cuda.is_available():
-        logger.warn('CUDA is not available to Torch. Script may run slowly.')
     main()
@@ -1,6 +1,52 @@
 import os
 import pathlib
+import tempfile
 
 # TODO: pretty sure these aren't portable, but whatever I can fix that later.
 DEBUG_DIR = os.getenv('TSG_DEBUG_DIR', pathlib.Path(os.getcwd()) / 'debug')
 SCREENSHOTS_DIR = DEBUG_DIR / 'screenshots'
+
+# The journal of populating oobs into the game, which a crashed run resumes
+# from. See main.py --resume.
+JOURNAL_PATH = DEBUG_DIR / 'journal.jsonl'
+
+# Scenario configs which have already been checked against the force data. See
+# adapters.combat_mission.scenario.
+SCENARIO_CACHE_DIR = DEBUG_DIR / 'scenarios'
+
+# Number of debug screenshots to keep on disk. Older ones are deleted as new
+# ones are written. Set to 0 to stop saving screenshots altogether.
+SCREENSHOT_RETENTION = int(os.getenv('TSG_SCREENSHOT_RETENTION', 100))
+
+# Calibration profiles, which remember where the game's static labels are.
+CALIBRATION_DIR = pathlib.Path(os.getenv('TSG_CALIBRATION_DIR', pathlib.Path(os.getcwd()) / 'calibration'))
+
+# Where the resident OCR service listens. Named pipe on Windows, unix socket
+# elsewhere.
+if os.name == 'nt':
+    _DEFAULT_OCR_SERVICE_ADDRESS = r'\\.\pipe\tac-scenario-generator-ocr'
+else:
+    _DEFAULT_OCR_SERVICE_ADDRESS = str(pathlib.Path(tempfile.gettempdir()) / 'tac-scenario-generator-ocr.sock')
+OCR_SERVICE_ADDRESS = os.getenv('TSG_OCR_SERVICE_ADDRESS', _DEFAULT_OCR_SERVICE_ADDRESS)
+OCR_SERVICE_AUTHKEY = os.getenv('TSG_OCR_SERVICE_AUTHKEY', 'tac-scenario-generator').encode()
+
+# Which OCR backend the driver uses: auto, easyocr or glyph. See
+# adapters.combat_mission.ocr.get_ocr_backend().
+OCR_BACKEND = os.getenv('TSG_OCR_BACKEND', 'auto')
+
+# Run easyocr with its CPU profile when CUDA isn't available, and how many
+# threads it uses, where 0 is one per CPU. See
+# adapters.combat_mission.ocr.CpuProfile.
+OCR_CPU_PROFILE = os.getenv('TSG_OCR_CPU_PROFILE', '1') == '1'
+OCR_THREADS = int(os.getenv('TSG_OCR_THREADS', '0'))
+
+# OCR regions the driver is about to read on a background thread, while it
+# waits for them to settle.
+OCR_PIPELINE = os.getenv('TSG_OCR_PIPELINE', '0') == '1'
+
+# Check the CHOSEN panel after adding each unit, rather than clicking blind.
+VERIFY_ADDS = os.getenv('TSG_VERIFY_ADDS', '1') == '1'
+
+# Record span timings of the driver's stages, and dump them to DEBUG_DIR at the
+# end of the run. See adapters.combat_mission.tracing.
+TRACE = os.getenv('TSG_TRACE', '0') == '1'
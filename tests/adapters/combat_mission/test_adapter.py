@@ -0,0 +1,45 @@
+import pytest
+
+from tac_scenario_generator.adapters.combat_mission.adapter import \
+    CombatMissionAdapter
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    ScenarioConfigError
+
+
+def test_generate_units_draws_random_units_from_force_data():
+    adapter = CombatMissionAdapter('cmak')
+    adapter.year, adapter.month, adapter.region = 1943, 'july', 'italy'
+    unit_names = adapter.get_unit_names(nation='Italian', division='Infantry', unit_type='Fortification')
+
+    units = adapter._generate_units(
+        army='Axis', nation='Italian', division='Infantry', unit_type='Fortification', unit_name='random', count_min=2,
+        count_max=8
+    )
+
+    assert 2 <= len(units) <= 8
+    assert all(unit['name'] in unit_names for unit in units)
+
+
+def test_generate_oob_fits_budget():
+    adapter = CombatMissionAdapter('cmak')
+    adapter.set_scenario({
+        'year': 1943, 'month': 'july', 'region': 'italy', 'budgets': {'Italian': {'points': 300, 'tolerance': 10}},
+    })
+    config = {'Italian': {'On Map': {'Infantry': {'Fortification': [{'unit_name': 'random', 'count': 50}]}}}}
+
+    oob = adapter.generate_oob('Axis', config, save_debug=False)
+
+    report = oob['budgets']['Italian']
+    costs = adapter.get_unit_costs(nation='Italian', division='Infantry', unit_type='Fortification')
+    units = oob['nations']['Italian']['On Map']['Infantry']['Fortification']
+    assert report['within_tolerance']
+    assert sum(costs[unit['name']] for unit in units) == report['total']
+
+
+def test_budget_without_force_data_names_the_missing_file():
+    adapter = CombatMissionAdapter('cmak')
+    adapter.set_scenario({'year': 1943, 'month': 'july', 'region': 'italy', 'budgets': {'Italian': {'points': 300}}})
+    config = {'Italian': {'On Map': {'Parachute': {'Fortification': [{'unit_name': 'Bunker', 'count': 1}]}}}}
+
+    with pytest.raises(ScenarioConfigError, match='italian_parachute_fortification.csv'):
+        adapter.generate_oob('Axis', config, save_debug=False)
@@ -0,0 +1,33 @@
+import json
+
+from tac_scenario_generator.adapters.combat_mission.batch import (
+    ScenarioWriter, generate_batch)
+
+SCENARIO_CONFIG = {
+    'game_id': 'cmak',
+    'year': 1943,
+    'month': 'july',
+    'region': 'italy',
+    'armies': {
+        'Axis': {
+            'Italian': {
+                'On Map': {
+                    'Infantry': {
+                        'Fortification': [{'unit_name': 'random', 'count_min': 2, 'count_max': 8}],
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+def test_batch_scenarios_are_reproducible_individually(tmp_path):
+    paths = sorted(generate_batch(SCENARIO_CONFIG, tmp_path / 'batch', 6, master_seed=7, workers=2))
+    scenarios = [json.loads(path.read_text()) for path in paths]
+
+    reproduced = ScenarioWriter(SCENARIO_CONFIG, 7, tmp_path).write(4)
+
+    assert [scenario['index'] for scenario in scenarios] == list(range(6))
+    assert json.loads(reproduced.read_text()) == scenarios[4]
+    assert len({json.dumps(scenario['axis_oob']) for scenario in scenarios}) > 1
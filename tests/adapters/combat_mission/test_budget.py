@@ -0,0 +1,28 @@
+import random
+
+from tac_scenario_generator.adapters.combat_mission.budget import (BudgetGroup,
+                                                                   fit_budget)
+
+COSTS = {'Trench': 10, 'Pillbox': 80, 'Roadblock': 15}
+OPTIONS = [('Trench', 100, 10), ('Pillbox', 100, 80), ('Roadblock', 50, 15)]
+
+
+def test_fit_budget_adds_units_within_tolerance():
+    group = BudgetGroup([{'name': 'Trench'}], COSTS, OPTIONS, min_count=0, max_count=100)
+
+    report = fit_budget([group], points=500, tolerance=5, rng=random.Random(3))
+
+    assert report['within_tolerance']
+    assert report['total'] == sum(COSTS[unit['name']] for unit in group.units)
+    assert len(group.units) <= 100
+
+
+def test_fit_budget_removes_units_and_respects_limits():
+    fixed = BudgetGroup([{'name': 'Pillbox'}] * 3, COSTS, OPTIONS[1:2], min_count=2, max_count=3)
+    capped = BudgetGroup([], COSTS, OPTIONS, min_count=0, max_count=5, extendable=False)
+
+    report = fit_budget([fixed, capped], points=50, rng=random.Random(3))
+
+    assert len(fixed.units) == 2
+    assert capped.units == []
+    assert report == {'points': 50, 'tolerance': 0, 'total': 160, 'difference': 110, 'within_tolerance': False}
@@ -0,0 +1,50 @@
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.calibration import \
+    CalibrationProfile
+from tac_scenario_generator.adapters.combat_mission.settle import get_thumbnail
+
+
+def _label(color, size=(80, 20)):
+    return get_thumbnail(Image.new('RGB', size, color))
+
+
+def test_calibration_profile_round_trip(tmp_path):
+    profile = CalibrationProfile.load(tmp_path, 'cmak', (1920, 1080))
+    profile.set_label('CHOSEN', (900, 200, 980, 220), _label('white'))
+    profile.set_offset('wave_row_height', 14)
+
+    loaded = CalibrationProfile.load(tmp_path, 'cmak', (1920, 1080))
+
+    assert loaded.get_label('CHOSEN')[0] == (900, 200, 980, 220)
+    assert loaded.matches_label('CHOSEN', _label('white'))
+    assert not loaded.matches_label('CHOSEN', _label('black'))
+    assert loaded.get_offset('wave_row_height') == 14
+    assert CalibrationProfile.load(tmp_path, 'cmak', (1280, 720)).get_label('CHOSEN') is None
+
+
+def test_calibration_profile_ignores_invalid_file(tmp_path):
+    (tmp_path / 'cmak_1920x1080.json').write_text('not json')
+
+    assert CalibrationProfile.load(tmp_path, 'cmak', (1920, 1080)).get_label('CHOSEN') is None
+
+
+def test_calibration_profile_remembers_each_appearance_of_a_label(tmp_path):
+    profile = CalibrationProfile.load(tmp_path, 'cmak', (1920, 1080))
+    profile.set_label('Fortification', (10, 200, 90, 220), _label('white'))
+    profile.set_label('Fortification', (10, 200, 90, 220), _label('yellow'))
+    # Within the comparison's noise threshold of a remembered appearance, so
+    # not another one.
+    profile.set_label('Fortification', (10, 200, 90, 220), _label((250, 250, 250)))
+    modified = (tmp_path / 'cmak_1920x1080.json').stat().st_mtime_ns
+
+    loaded = CalibrationProfile.load(tmp_path, 'cmak', (1920, 1080))
+
+    assert len(loaded.get_label('Fortification')[1]) == 2
+    assert loaded.matches_label('Fortification', _label('white'))
+    assert loaded.matches_label('Fortification', _label('yellow'))
+    loaded.set_label('Fortification', (10, 200, 90, 220), _label('yellow'))
+    assert (tmp_path / 'cmak_1920x1080.json').stat().st_mtime_ns == modified
+
+    loaded.set_label('Fortification', (12, 200, 92, 220), _label('yellow'))
+    assert len(loaded.get_label('Fortification')[1]) == 1
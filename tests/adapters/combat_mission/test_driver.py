@@ -1,8 +1,194 @@
-from tac_scenario_generator.adapters.combat_mission.driver import \
-    CombatMissionDriver
+import threading
+
+import pytest
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.driver import (
+    SETTLE_CHANGE_TIMEOUT, CombatMissionDriver)
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    ScreenStateError
+from tac_scenario_generator.adapters.combat_mission.layout import Layout
+from tac_scenario_generator.adapters.combat_mission.ocr import (
+    FallbackOcrBackend, OcrBackend)
+from tac_scenario_generator.adapters.combat_mission.screenshots import \
+    ScreenshotWriter
 
 
 def test_find_center_of_bounding_box():
     driver = CombatMissionDriver('cmak')
     bbox = ((0, 0), (0, 10), (20, 0), (20, 10))
     assert driver._find_center_of_bounding_box(bbox) == (10, 5)
+
+
+# The (left, top, right, bottom) of each unit in a FakeScreen's unit list.
+UNITS = {'Rifle Squad': (5, 20, 60, 30), 'Sniper Team': (5, 40, 60, 50)}
+
+
+class FakeScreen():
+    """A 200x200 unit editor, with the two units of UNITS in its unit list.
+    Each click marks a new row in the CHOSEN panel, delay seconds later, and
+    then runs the next of on_click, if there are any left.
+    """
+    def __init__(self, on_click=(), delay=0):
+        self.image = Image.new('RGB', (200, 200), 'black')
+        for left, top, right, bottom in UNITS.values():
+            self.image.paste('gray', (left, top, right, bottom))
+        self.on_click = list(on_click)
+        self.delay = delay
+        self.clicks = []
+        self.position = None
+
+    def size(self):
+        return self.image.size
+
+    def screenshot(self, region=None):
+        if region is None:
+            return self.image.copy()
+        left, top, width, height = region
+        return self.image.crop((left, top, left + width, top + height))
+
+    def moveTo(self, x, y):
+        self.position = (x, y)
+
+    def click(self):
+        self.clicks.append(self.position)
+        row = (110, 20 + 10 * len(self.clicks), 190, 28 + 10 * len(self.clicks))
+        if self.delay:
+            threading.Timer(self.delay, self.image.paste, ('white', row)).start()
+        else:
+            self.image.paste('white', row)
+        if self.on_click:
+            self.on_click.pop(0)(self)
+
+
+class FakeUnitListReader():
+    """Stands in for the driver's OCR, reading every capture as the units of
+    a FakeScreen's unit list, in screen coordinates.
+    """
+    def __init__(self):
+        self.reads = 0
+
+    def __call__(self, image, region=None):
+        self.reads += 1
+        return [
+            (((left, top), (right, top), (right, bottom), (left, bottom)), text, 0.9)
+            for text, (left, top, right, bottom) in UNITS.items()
+        ]
+
+
+def _get_unit_editor_driver(gui):
+    """Returns a driver which captures and clicks gui, and reads it with a
+    FakeUnitListReader, with the unit editor's anchors already located.
+    """
+    def click_at_location(x, y):
+        gui.moveTo(x, y)
+        gui.click()
+
+    driver = CombatMissionDriver('cmak')
+    driver.capture_screen = lambda region=None, save_debug=True: gui.screenshot(region)
+    driver.click_at_location = click_at_location
+    driver._readtext = FakeUnitListReader()
+    driver._layout = Layout('cmak', gui.size())
+    driver._layout.observe('Fortification', ((0, 0), (40, 0), (40, 10), (0, 10)))
+    driver._layout.observe('CHOSEN', ((100, 0), (140, 0), (140, 10), (100, 10)))
+    return driver
+
+
+def test_add_units_reads_unit_list_once():
+    gui = FakeScreen()
+    driver = _get_unit_editor_driver(gui)
+
+    driver.add_units(['Rifle Squad', 'Sniper Team', 'Rifle Squad'])
+
+    assert driver._readtext.reads == 1
+    assert gui.clicks == [(32, 25), (32, 45), (32, 25)]
+
+
+def test_add_units_reads_unit_list_again_after_row_changes():
+    def repaint_sniper_team(gui):
+        gui.image.paste('red', UNITS['Sniper Team'])
+
+    gui = FakeScreen(on_click=[repaint_sniper_team])
+    driver = _get_unit_editor_driver(gui)
+
+    driver.add_units(['Rifle Squad', 'Sniper Team', 'Rifle Squad'])
+
+    assert driver._readtext.reads == 2
+    assert gui.clicks == [(32, 25), (32, 45), (32, 25)]
+
+
+def test_add_units_waits_for_slow_chosen_panel_instead_of_clicking_again():
+    # The game takes longer than SETTLE_CHANGE_TIMEOUT to draw the new row.
+    gui = FakeScreen(delay=SETTLE_CHANGE_TIMEOUT + 0.2)
+    driver = _get_unit_editor_driver(gui)
+
+    driver.add_units(['Rifle Squad'])
+
+    assert gui.clicks == [(32, 25)]
+
+
+def _get_chosen_driver():
+    driver = CombatMissionDriver('cmak', gui=object())
+    driver._layout = Layout('cmak', (200, 200))
+    driver._layout.observe('CHOSEN', ((100, 0), (140, 0), (140, 10), (100, 10)))
+    return driver
+
+
+def _get_panel(*rows):
+    """Returns a capture of a 100x100 CHOSEN panel with a white band for each
+    (top, bottom) of rows.
+    """
+    image = Image.new('RGB', (100, 100), 'black')
+    for top, bottom in rows:
+        image.paste('white', (0, top, 100, bottom))
+    return image
+
+
+def test_unit_not_added_if_chosen_panel_unchanged():
+    driver = _get_chosen_driver()
+    before = _get_panel((0, 10))
+    assert not driver._is_unit_added('Rifle Squad', before, before.copy(), (100, 20, 100, 100))
+
+
+def test_unit_added_if_one_row_appears():
+    driver = _get_chosen_driver()
+    assert driver._is_unit_added('Rifle Squad', _get_panel((0, 10)), _get_panel((0, 10), (12, 22)), (100, 20, 100, 100))
+
+
+def test_tall_change_is_read(monkeypatch):
+    driver = _get_chosen_driver()
+    read = []
+
+    def readtext(image, region):
+        read.append((image.size, region))
+        return [(((100, 20), (150, 20), (150, 30), (100, 30)), 'Rifle Squad', 0.9)]
+
+    monkeypatch.setattr(driver, '_readtext', readtext)
+    assert driver._is_unit_added('Rifle Squad', _get_panel((0, 10)), _get_panel((20, 60)), (100, 20, 100, 100))
+    assert read == [((100, 60), (100, 20, 100, 60))]
+    with pytest.raises(ScreenStateError):
+        driver._is_unit_added('Sniper Team', _get_panel((0, 10)), _get_panel((20, 60)), (100, 20, 100, 100))
+
+
+def test_read_screen_falls_back_when_expected_text_is_missing(tmp_path):
+    class Backend(OcrBackend):
+        def __init__(self, texts):
+            self.texts = texts
+            self.reads = 0
+
+        def readtext(self, image):
+            self.reads += 1
+            return [(((0, 0), (50, 0), (50, 10), (0, 10)), text, 0.99) for text in self.texts]
+
+    # The glyph backend confidently reads the labels drawn in its font's
+    # polarity, and misses the rest.
+    primary, fallback = Backend(['Unit', 'OK']), Backend(['Unit', 'OK', 'Fortification'])
+    driver = CombatMissionDriver('cmak', gui=FakeScreen(), calibration_dir=tmp_path)
+    driver._screenshot_writer = ScreenshotWriter(tmp_path, retention=0)
+    driver._ocr_backend = FallbackOcrBackend(primary, fallback)
+
+    assert [text for _, text, _ in driver.read_screen(expected=['OK'])] == ['Unit', 'OK']
+    assert fallback.reads == 0
+    assert [text for _, text, _ in driver.read_screen(expected=['Fortification'])][-1] == 'Fortification'
+    assert driver.read_screen(expected=['Fortification', 'Artillery/Air'])[-1][1] == 'Fortification'
+    assert (primary.reads, fallback.reads) == (1, 1)
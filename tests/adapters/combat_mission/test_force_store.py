@@ -0,0 +1,37 @@
+import pickle
+
+import pytest
+
+from tac_scenario_generator.adapters.combat_mission.force_store import (
+    ForceStore, ForceTable, compile_store, get_force_data_directory)
+
+
+def test_compiled_store_matches_force_data(tmp_path):
+    compile_store(get_force_data_directory('cmak'), tmp_path)
+    store = ForceStore(tmp_path)
+
+    for path in get_force_data_directory('cmak').glob('*.csv'):
+        expected = ForceTable.read_csv(path)
+        table = store.get_table(path.stem)
+        assert table.names == expected.names
+        assert table.costs == expected.costs
+        assert table.get_rarities('italy', 'july', 1943) == expected.get_rarities('italy', 'july', 1943)
+
+
+def test_missing_date_fails_fast(tmp_path):
+    force_data = tmp_path / 'force_data'
+    force_data.mkdir()
+    (force_data / 'a.csv').write_text(
+        'unit\tcost\titaly_july_1943_rarity\tnorth_africa_may_1943_rarity\nTrench\t5\t0\t10\n'
+    )
+    (force_data / 'b.csv').write_text('unit\tcost\titaly_july_1943_rarity\nBunker\t50\t20\n')
+    compile_store(force_data, tmp_path / 'store')
+    store = pickle.loads(pickle.dumps(ForceStore(tmp_path / 'store')))
+
+    assert store.get_table('a').get_rarities('north_africa', 'may', 1943) == [10]
+    with pytest.raises(ValueError, match='north_africa_may_1943_rarity'):
+        store.get_table('b').get_rarities('north_africa', 'may', 1943)
+    with pytest.raises(ValueError, match='italy july 1943'):
+        store.check_date('italy', 'august', 1943)
+    with pytest.raises(FileNotFoundError):
+        store.get_table('c')
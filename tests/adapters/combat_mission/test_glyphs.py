@@ -0,0 +1,46 @@
+import numpy
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.glyphs import (
+    GlyphBackend, GlyphFont, build_font)
+
+GLYPHS = {
+    'O': ['###', '#.#', '#.#', '#.#', '###', '...'],
+    'K': ['#.#', '##.', '#..', '##.', '#.#', '...'],
+    'A': ['.#.', '#.#', '###', '#.#', '#.#', '...'],
+    'y': ['...', '#.#', '#.#', '###', '..#', '###'],
+}
+
+
+def _render(lines, width=60, height=30):
+    """Draws lines of (x, y, text) in the test font, light on dark, with one
+    column between glyphs and four for a space.
+    """
+    pixels = numpy.zeros((height, width), numpy.uint8)
+    for x, y, text in lines:
+        for char in text:
+            if char == ' ':
+                x += 3
+                continue
+            glyph = numpy.array([[c == '#' for c in row] for row in GLYPHS[char]])
+            pixels[y:y + 6, x:x + 3][glyph] = 220
+            x += 4
+    return Image.fromarray(pixels).convert('RGB')
+
+
+def _bbox(left, top, right, bottom):
+    return [[left, top], [right, top], [right, bottom], [left, bottom]]
+
+
+def test_build_font_and_read_text(tmp_path):
+    sample = _render([(2, 2, 'OK Ay'), (2, 12, 'KAyO')])
+    detections = [(_bbox(1, 1, 25, 9), 'OK Ay', 0.99), (_bbox(1, 11, 20, 19), 'KAyO', 0.99)]
+    font = build_font([(sample, detections)])
+    font.save(tmp_path / 'glyphs.npz')
+
+    backend = GlyphBackend(GlyphFont.load(tmp_path / 'glyphs.npz'))
+    detections = backend.readtext(_render([(30, 5, 'yAK'), (5, 20, 'KO OK')]))
+
+    assert sorted(text for _, text, _ in detections) == ['KO OK', 'yAK']
+    assert all(confidence == 1 for _, _, confidence in detections)
+    assert [_bbox(30, 5, 41, 11)] == [bbox for bbox, text, _ in detections if text == 'yAK']
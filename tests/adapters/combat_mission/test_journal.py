@@ -0,0 +1,84 @@
+from tac_scenario_generator.adapters.combat_mission.driver import (
+    CombatMissionDriver, Screen)
+from tac_scenario_generator.adapters.combat_mission.journal import \
+    PopulationJournal
+from tac_scenario_generator.adapters.combat_mission.planner import plan_oob
+
+OOB = {
+    'army': 'Axis',
+    'nations': {
+        'German': {
+            'On Map': {
+                'Infantry': {
+                    'Infantry': [{'name': 'Rifle'}, {'name': 'Rifle'}, {'name': 'MG'}],
+                },
+            },
+        },
+    },
+}
+
+
+class RecordingDriver(CombatMissionDriver):
+    """Records the actions it would take instead of taking them, and adds
+    units by calling track like add_units() does.
+    """
+    def __init__(self, chosen=()):
+        super().__init__('cmak')
+        self.chosen = list(chosen)
+        self.taken = []
+
+    def _execute_action(self, action, get_vocabulary=None, track=None):
+        self.taken.append((action.kind, action.target))
+        if action.kind != 'add_units':
+            return
+        for i, unit_name in enumerate(action.target):
+            with track(i):
+                self.chosen.append(unit_name)
+
+    def count_chosen(self, unit_name):
+        return self.chosen.count(unit_name)
+
+
+def test_journal_ignores_incomplete_final_line(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = PopulationJournal.start(path, [OOB])
+    with journal.adding_unit('Axis', 4, 0, 'Rifle'):
+        pass
+    with open(path, 'a') as f:
+        f.write('{"event": "adding", "ar')
+
+    journal = PopulationJournal.open(path)
+    progress = journal.get_progress('Axis')
+
+    assert journal.oobs == [OOB]
+    assert progress.done == {(4, 0)}
+    assert progress.pending is None
+
+
+def test_resume_skips_done_units_and_checks_the_unit_in_flight(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    actions = plan_oob(OOB, 'cmak')
+    journal = PopulationJournal.start(path, [OOB])
+    for i, action in enumerate(actions[:5]):
+        journal.record(event='action', army='Axis', index=i, kind=action.kind)
+    with journal.adding_unit('Axis', 5, 0, 'Rifle'):
+        pass
+    # The run stopped after clicking the second Rifle, but before journaling
+    # that it had been added.
+    journal.record(event='adding', army='Axis', action=5, unit=1, name='Rifle')
+
+    journal = PopulationJournal.open(path)
+    driver = RecordingDriver(chosen=['Rifle', 'Rifle'])
+    driver.populate_oob(OOB, journal=journal)
+
+    assert driver._current_screen is Screen.UNIT_EDITOR
+    assert driver.taken == [
+        ('select_nation', 'German'),
+        ('select_wave', 'On Map'),
+        ('select_division', 'Infantry'),
+        ('select_unit_type', 'Infantry'),
+        ('add_units', ('MG',)),
+        ('close_unit_editor', None),
+    ]
+    assert driver.chosen == ['Rifle', 'Rifle', 'MG']
+    assert PopulationJournal.open(path).get_progress('Axis').finished
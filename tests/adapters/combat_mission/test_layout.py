@@ -0,0 +1,31 @@
+from tac_scenario_generator.adapters.combat_mission.layout import (
+    Layout, translate_detections)
+
+
+def _bbox(left, top, right, bottom):
+    return [[left, top], [right, top], [right, bottom], [left, bottom]]
+
+
+def test_layout_region_unresolved_until_anchors_observed():
+    layout = Layout('cmak', (1920, 1080))
+    assert layout.get_region('unit_list') is None
+
+    layout.observe_detections([
+        (_bbox(900, 200, 980, 220), 'CHOSEN', 0.9),
+        (_bbox(300, 100, 400, 120), 'Fortification', 0.9),
+    ])
+
+    assert layout.get_region('unit_list') == (0, 120, 900, 960)
+
+
+def test_layout_anchor_region_pads_label():
+    layout = Layout('cmak', (1920, 1080))
+    layout.observe('Nation', _bbox(100, 50, 150, 60))
+
+    assert layout.get_region('Nation') == (80, 30, 90, 50)
+
+
+def test_translate_detections():
+    detections = [(_bbox(0, 0, 10, 10), 'OK', 0.5)]
+
+    assert translate_detections(detections, 100, 200) == [(_bbox(100, 200, 110, 210), 'OK', 0.5)]
@@ -0,0 +1,32 @@
+from tac_scenario_generator.adapters.combat_mission.matching import \
+    PhraseMatcher
+
+
+def _detection(text, x=0):
+    return ([[x, 0], [x + 1, 0], [x + 1, 1], [x, 1]], text, 0.9)
+
+
+def test_match_with_vocabulary_keeps_look_alike_names_apart():
+    matcher = PhraseMatcher([_detection('L3/33 (AA)'), _detection('L3/35'), _detection('l3/33')])
+    vocabulary = ['L3/35', 'L3/33', 'L3/33 (AA)']
+
+    matches = matcher.match(['L3/33', 'L3/33 (AA)'], vocabulary=vocabulary)
+
+    assert matches['L3/33']['text'] == 'l3/33'
+    assert matches['L3/33 (AA)']['text'] == 'L3/33 (AA)'
+
+
+def test_match_respects_candidates():
+    matcher = PhraseMatcher([_detection('Trench', x=0), _detection('Trench', x=10)])
+
+    matches = matcher.match(['Trench', 'Roadblock'], candidates=[False, True])
+
+    assert matches['Trench']['bbox'][0] == [10, 0]
+    assert matches['Trench']['fuzz_ratio'] == 100
+    assert matches['Roadblock']['fuzz_ratio'] < 50
+
+
+def test_get_ranked_results_prefers_first_exact_match():
+    matcher = PhraseMatcher([_detection('Nationality'), _detection('Natio'), _detection('Nation')])
+
+    assert [r['text'] for r in matcher.get_ranked_results('Nation')] == ['Nationality', 'Nation', 'Natio']
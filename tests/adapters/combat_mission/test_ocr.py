@@ -0,0 +1,58 @@
+import pytest
+
+from tac_scenario_generator.adapters.combat_mission.ocr import (
+    CpuProfile, FallbackOcrBackend, OcrBackend, configure_torch_threads,
+    get_ocr_backend)
+
+
+class FakeBackend(OcrBackend):
+    def __init__(self, detections):
+        self.detections = detections
+
+    def readtext(self, image):
+        return self.detections
+
+
+def test_fallback_backend_uses_fallback_when_unsure():
+    confident = FakeBackend([(None, 'OK', 0.95)])
+    unsure = FakeBackend([(None, '0K', 0.4)])
+    fallback = FakeBackend([(None, 'OK', 0.7)])
+
+    assert FallbackOcrBackend(confident, fallback).readtext(None) == [(None, 'OK', 0.95)]
+    assert FallbackOcrBackend(unsure, fallback).readtext(None) == [(None, 'OK', 0.7)]
+    assert FallbackOcrBackend(FakeBackend([]), fallback).readtext(None) == [(None, 'OK', 0.7)]
+
+
+def test_get_ocr_backend_without_font():
+    general = FakeBackend([])
+
+    assert get_ocr_backend('cmbo', general, backend_name='auto') is general
+    with pytest.raises(ValueError, match='No glyph font'):
+        get_ocr_backend('cmbo', general, backend_name='glyph')
+
+
+class FakeTorch():
+    def __init__(self, interop_started=False):
+        self.threads = None
+        self.interop_threads = None
+        self._interop_started = interop_started
+
+    def set_num_threads(self, threads):
+        self.threads = threads
+
+    def set_num_interop_threads(self, threads):
+        if self._interop_started:
+            raise RuntimeError('Error: cannot set number of interop threads after parallel work has started')
+        self.interop_threads = threads
+
+
+def test_configure_torch_threads():
+    torch = FakeTorch()
+    configure_torch_threads(torch, CpuProfile(threads=3, interop_threads=2))
+    assert (torch.threads, torch.interop_threads) == (3, 2)
+
+    torch = FakeTorch(interop_started=True)
+    configure_torch_threads(torch, CpuProfile(threads=3))
+    assert (torch.threads, torch.interop_threads) == (3, None)
+
+    assert CpuProfile().get_threads() >= 1
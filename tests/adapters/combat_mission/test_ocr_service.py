@@ -0,0 +1,40 @@
+import os
+import threading
+from multiprocessing.connection import arbitrary_address
+
+import numpy
+
+from tac_scenario_generator.adapters.combat_mission import ocr_service
+
+
+class FakeBackend():
+    load_time = 0
+
+    def load(self):
+        pass
+
+    def readtext(self, image):
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], 'OK', image.shape[0])]
+
+
+def test_ocr_service_round_trip():
+    address = arbitrary_address('AF_PIPE' if os.name == 'nt' else 'AF_UNIX')
+    server = ocr_service.OcrServer(FakeBackend(), address=address, authkey=b'test')
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        client = None
+        while client is None:
+            client = ocr_service.connect(address, authkey=b'test')
+
+        assert client.readtext(numpy.zeros((7, 3))) == [([[0, 0], [1, 0], [1, 1], [0, 1]], 'OK', 7)]
+        assert client.stats()['requests'] == 1
+    finally:
+        server.stop()
+        thread.join()
+
+
+def test_ocr_service_connect_returns_none_without_service():
+    address = arbitrary_address('AF_PIPE' if os.name == 'nt' else 'AF_UNIX')
+
+    assert ocr_service.connect(address, authkey=b'test') is None
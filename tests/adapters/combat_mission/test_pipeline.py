@@ -0,0 +1,44 @@
+import threading
+
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.pipeline import Prefetcher
+
+
+def test_prefetcher_hands_over_reads_of_the_same_frame():
+    reads = []
+    prefetcher = Prefetcher(lambda image, region: reads.append(region) or [image.getpixel((0, 0))])
+    region = (0, 0, 4, 4)
+    try:
+        prefetcher.submit(Image.new('RGB', (4, 4), 'white'), region)
+        prefetcher.submit(Image.new('RGB', (4, 4), 'white'), region)
+
+        assert prefetcher.take(Image.new('RGB', (4, 4), 'black'), region) is None
+        assert prefetcher.take(Image.new('RGB', (4, 4), 'white'), region).result() == [(255, 255, 255)]
+        assert prefetcher.take(Image.new('RGB', (4, 4), 'white'), region) is None
+        assert reads == [region]
+    finally:
+        prefetcher.close()
+
+
+def test_prefetcher_replaces_reads_of_older_frames():
+    started = threading.Event()
+    release = threading.Event()
+
+    def read(image, region):
+        started.set()
+        release.wait()
+        return image.getpixel((0, 0))
+
+    prefetcher = Prefetcher(read)
+    try:
+        prefetcher.submit(Image.new('RGB', (4, 4), 'red'), None)
+        started.wait()
+        prefetcher.submit(Image.new('RGB', (4, 4), 'green'), None)
+        prefetcher.submit(Image.new('RGB', (4, 4), 'blue'), None)
+        release.set()
+
+        assert prefetcher.take(Image.new('RGB', (4, 4), 'blue'), None).result() == (0, 0, 255)
+        assert prefetcher.submitted == 3
+    finally:
+        prefetcher.close()
@@ -0,0 +1,61 @@
+from tac_scenario_generator.adapters.combat_mission.planner import (
+    Action, estimate_clicks, get_active_selections, plan_oob)
+
+
+def _units(*names):
+    return [{'name': name} for name in names]
+
+
+OOB = {
+    'army': 'Allied',
+    'nations': {
+        'Canadian': {
+            'On Map': {
+                'Infantry': {
+                    'Artillery': _units('Spotter'),
+                    'Armor': [],
+                    'Air': _units('Spitfire', 'Hurricane', 'Spitfire'),
+                },
+            },
+            'Reinforce 1': {
+                'Infantry': {
+                    'Air': _units('Hurricane'),
+                },
+            },
+        },
+    },
+}
+
+
+def test_plan_merges_groups_and_skips_active_selections():
+    actions = plan_oob(OOB, 'cmak')
+
+    assert [(action.kind, action.target) for action in actions] == [
+        ('open_unit_editor', None),
+        ('select_army', 'Allied'),
+        ('select_nation', 'Canadian'),
+        ('select_wave', 'On Map'),
+        ('select_division', 'Infantry'),
+        ('select_unit_type', 'Artillery/Air'),
+        ('add_units', ('Spotter', 'Spitfire', 'Spitfire', 'Hurricane')),
+        ('select_wave', 'Reinforce 1'),
+        ('add_units', ('Hurricane',)),
+        ('close_unit_editor', None),
+    ]
+    assert actions[6] == Action(
+        'add_units', ('Spotter', 'Spitfire', 'Spitfire', 'Hurricane'), nation='Canadian', division='Infantry',
+        unit_types=('Artillery', 'Air')
+    )
+    assert estimate_clicks(actions) < estimate_clicks(plan_oob(OOB, 'cmak', optimise=False))
+
+
+def test_get_active_selections_applies_resets():
+    actions = plan_oob(OOB, 'cmak')
+
+    assert [(action.kind, action.target) for action in get_active_selections(actions[:9])] == [
+        ('select_army', 'Allied'),
+        ('select_nation', 'Canadian'),
+        ('select_wave', 'Reinforce 1'),
+        ('select_division', 'Infantry'),
+        ('select_unit_type', 'Artillery/Air'),
+    ]
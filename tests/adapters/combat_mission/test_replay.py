@@ -0,0 +1,73 @@
+import pytest
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.driver import \
+    CombatMissionDriver
+from tac_scenario_generator.adapters.combat_mission.errors import ReplayError
+from tac_scenario_generator.adapters.combat_mission.replay import (
+    RecordingGui, ReplayBundle, ReplayGui)
+
+
+class FakeGui():
+    def __init__(self, colors):
+        self.colors = list(colors)
+        self.clicks = []
+        self.position = None
+
+    def size(self):
+        return (40, 30)
+
+    def screenshot(self, region=None):
+        image = Image.new('RGB', self.size(), self.colors[0])
+        if region:
+            left, top, width, height = region
+            image = image.crop((left, top, left + width, top + height))
+        return image
+
+    def moveTo(self, x, y):
+        self.position = (x, y)
+
+    def click(self):
+        self.clicks.append(self.position)
+        self.colors.pop(0)
+
+
+def _record(colors, clicks):
+    recorder = RecordingGui(FakeGui(colors), ReplayBundle('cmak', (40, 30)))
+    for x, y in clicks:
+        recorder.moveTo(x, y)
+        recorder.click()
+    recorder.finish()
+    return recorder.bundle
+
+
+def test_bundle_round_trip(tmp_path):
+    bundle = _record(['black', 'white'], [(10, 20)])
+    bundle.oobs = [{'army': 'Axis', 'nations': {}}]
+    bundle.save(tmp_path)
+
+    loaded = ReplayBundle.load(tmp_path)
+
+    assert loaded.clicks == [(10, 20)]
+    assert loaded.oobs == bundle.oobs
+    assert [frame.getpixel((0, 0)) for frame in loaded.frames] == [(0, 0, 0), (255, 255, 255)]
+
+
+def test_replay_gui_rejects_clicks_off_the_recording():
+    gui = ReplayGui(_record(['black', 'white'], [(10, 20)]))
+
+    gui.moveTo(30, 20)
+    with pytest.raises(ReplayError):
+        gui.click()
+
+
+def test_driver_runs_against_replay_gui(tmp_path):
+    gui = ReplayGui(_record(['black', 'white', 'red'], [(10, 20), (12, 5)]))
+    driver = CombatMissionDriver('cmak', gui=gui, calibration_dir=tmp_path)
+
+    driver.click_and_settle(10, 20)
+    assert driver.capture_screen((0, 0, 4, 4), save_debug=False).getpixel((0, 0)) == (255, 255, 255)
+    driver.click_and_settle(12, 5)
+
+    assert gui.finished
+    assert len(gui.click_times) == 2
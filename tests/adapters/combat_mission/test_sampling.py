@@ -0,0 +1,28 @@
+import random
+from collections import Counter
+
+import pytest
+
+from tac_scenario_generator.adapters.combat_mission.sampling import (
+    UnitSampler, compile_sampler)
+
+
+def test_sampler_draws_in_proportion_to_weights():
+    sampler = UnitSampler(['a', 'b', 'c', 'd'], [1, 2, 3, 0])
+
+    counts = Counter(sampler.draw(60000, rng=random.Random(1)))
+
+    assert counts['d'] == 0
+    for name, weight in [('a', 1), ('b', 2), ('c', 3)]:
+        assert counts[name] / 60000 == pytest.approx(weight / 6, abs=0.01)
+
+
+def test_compile_sampler_leaves_out_unavailable_and_excluded_units():
+    names = ['Trench', 'Bunker', 'Assault Boat']
+    rarities = [0, 999, 0]
+
+    sampler = compile_sampler(names, rarities, 999, exclude=['Assault Boat'])
+
+    assert sampler.names == ['Trench']
+    with pytest.raises(ValueError):
+        compile_sampler(names[1:2], rarities[1:2], 999)
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from tac_scenario_generator.adapters.combat_mission.adapter import \
+    CombatMissionAdapter
+from tac_scenario_generator.adapters.combat_mission.errors import \
+    ScenarioConfigError
+from tac_scenario_generator.adapters.combat_mission.scenario import (
+    ScenarioPlan, compile_scenario)
+
+PROJECT_DIRECTORY = Path(__file__).resolve().parents[3]
+
+
+@pytest.mark.parametrize('file_name', ['scenario_config.yaml', 'scenario_config_example.yaml'])
+def test_shipped_configs_compile(file_name, tmp_path):
+    with open(PROJECT_DIRECTORY / file_name, 'r') as f:
+        scenario_config = yaml.safe_load(f)
+
+    plan = compile_scenario(CombatMissionAdapter('cmak'), scenario_config, cache_dir=tmp_path)
+
+    assert plan.groups
+    assert [plan] == [ScenarioPlan.from_json(plan.to_json())]
+    assert len(list(tmp_path.glob('*.json'))) == 1
+
+
+def test_compile_reports_every_problem():
+    scenario_config = {
+        'game_id': 'cmak', 'year': 1943, 'month': 'july', 'region': 'italy',
+        'armies': {'Axis': {'Italian': {'On Map': {
+            'Infanrty': {'Armor': [{'unit_name': 'random'}]},
+            'Infantry': {'Infantry': [{'unit_name': 'Infantry Compnay', 'count_min': 3, 'count_max': 2}]},
+        }}}},
+        'budgets': {'German': {'points': 100}, 'Axis': {'points': 500, 'tolerance': -50}},
+    }
+
+    with pytest.raises(ScenarioConfigError) as e:
+        compile_scenario(CombatMissionAdapter('cmak'), scenario_config, cache_dir=None)
+
+    message = str(e.value)
+    assert 'has 5 problems' in message
+    assert 'italian_infanrty_armor' in message
+    assert 'Did you mean Infantry Company?' in message
+    assert 'count_min must be less than count_max' in message
+    assert 'Budget German' in message
+    assert 'Budget Axis must have a tolerance' in message
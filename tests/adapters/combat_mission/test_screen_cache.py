@@ -0,0 +1,30 @@
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.screen_cache import \
+    ScreenCache
+
+
+def test_screen_cache_reuses_detections_for_unchanged_screen():
+    cache = ScreenCache()
+    reads = []
+
+    def read():
+        reads.append(1)
+        return [(((0, 0), (10, 0), (10, 10), (0, 10)), 'OK', 0.9)]
+
+    first = cache.get_detections(Image.new('RGB', (20, 20), 'black'), read)
+    second = cache.get_detections(Image.new('RGB', (20, 20), 'black'), read)
+
+    assert first is second
+    assert len(reads) == 1
+    assert cache.hits == 1
+
+
+def test_screen_cache_rereads_changed_screen():
+    cache = ScreenCache()
+    cache.get_detections(Image.new('RGB', (20, 20), 'black'), lambda: ['old'])
+    changed = Image.new('RGB', (20, 20), 'black')
+    changed.putpixel((5, 5), (255, 255, 255))
+
+    assert cache.get_detections(changed, lambda: ['new']) == ['new']
+    assert cache.misses == 2
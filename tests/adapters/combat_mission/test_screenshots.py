@@ -0,0 +1,20 @@
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.screenshots import \
+    ScreenshotWriter
+
+
+def test_screenshot_writer_keeps_unique_files_within_retention(tmp_path):
+    writer = ScreenshotWriter(tmp_path, retention=3)
+    paths = [writer.submit(Image.new('RGB', (4, 4))) for _ in range(5)]
+    writer.close()
+
+    assert len(set(paths)) == 5
+    assert sorted(tmp_path.glob('*.png')) == paths[-3:]
+
+
+def test_screenshot_writer_disabled_with_zero_retention(tmp_path):
+    writer = ScreenshotWriter(tmp_path, retention=0)
+
+    assert writer.submit(Image.new('RGB', (4, 4))) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,130 @@
+import json
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+
+from tac_scenario_generator.adapters.combat_mission.sessions import (
+    RegionGui, Session, drain_results, populate_scenarios)
+
+
+class FakeGui():
+    def __init__(self):
+        self.calls = []
+
+    def screenshot(self, region=None):
+        self.calls.append(('screenshot', region))
+
+    def moveTo(self, x, y):
+        self.calls.append(('moveTo', x, y))
+
+    def click(self):
+        self.calls.append(('click',))
+
+
+class StubDriver():
+    """Stands in for the driver of a game session, taking a little time over
+    each oob, and failing on any oob for the army 'Broken'.
+    """
+    def __init__(self, game_id, session, gui):
+        self.session = session
+
+    def populate_oob(self, oob, get_vocabulary=None):
+        time.sleep(0.05)
+        if oob['army'] == 'Broken':
+            raise RuntimeError('Misclicked.')
+
+
+def _write_scenarios(directory, armies):
+    paths = []
+    for i, army in enumerate(armies):
+        path = directory / f'scenario_{i:06d}.json'
+        path.write_text(json.dumps({'allied_oob': None, 'axis_oob': {'army': army, 'nations': {}}}))
+        paths.append(str(path))
+    return paths
+
+
+def test_region_gui_translates_and_clicks_atomically():
+    gui = FakeGui()
+    region_gui = RegionGui(gui, (100, 200, 800, 600), threading.Lock())
+
+    region_gui.screenshot(region=(10, 20, 30, 40))
+    region_gui.moveTo(5, 6)
+    region_gui.click()
+    region_gui.moveTo(0, 0)
+
+    assert region_gui.size() == (800, 600)
+    assert gui.calls == [
+        ('screenshot', (110, 220, 30, 40)), ('moveTo', 105, 206), ('click',), ('moveTo', 100, 200)
+    ]
+
+
+def test_populate_scenarios_spreads_jobs_across_sessions(tmp_path):
+    paths = _write_scenarios(tmp_path, ['Axis'] * 6)
+    sessions = [Session('a'), Session('b')]
+
+    results = list(populate_scenarios('cmak', paths, sessions, driver_factory=StubDriver))
+
+    assert sorted(path for _, path, _ in results) == paths
+    assert all(error is None for _, _, error in results)
+    # Which session takes which job depends on timing.
+    assert {name for name, _, _ in results} <= {'a', 'b'}
+
+
+def test_failed_session_stops_taking_jobs(tmp_path):
+    paths = _write_scenarios(tmp_path, ['Broken', 'Broken'])
+
+    results = list(populate_scenarios('cmak', paths, [Session('a')], driver_factory=StubDriver))
+
+    assert [(path, error is not None) for _, path, error in results] == [(paths[0], True), (paths[1], True)]
+
+
+def test_drain_results_collects_results_left_on_the_queue():
+    results = queue.Queue()
+    results.put(('a', 'one.json', None))
+    results.put(('a', 'two.json', 'Misclicked.'))
+    results.put(('a', None, None))
+
+    assert list(drain_results(results)) == [('a', 'one.json', None), ('a', 'two.json', 'Misclicked.')]
+    assert results.empty()
+
+
+class ScreenDriver():
+    """Checks that the session drives its own display."""
+    def __init__(self, game_id, session, gui):
+        import pyautogui
+
+        self.gui = gui or pyautogui
+
+    def populate_oob(self, oob, get_vocabulary=None):
+        assert self.gui.size() == tuple(oob['size'])
+        self.gui.moveTo(10, 10)
+        self.gui.click()
+
+
+@pytest.mark.skipif(not shutil.which('Xvfb'), reason='Needs Xvfb for virtual displays.')
+def test_sessions_on_virtual_displays(tmp_path):
+    pytest.importorskip('pyautogui')
+    displays = [':91', ':92']
+    servers = [
+        subprocess.Popen(['Xvfb', display, '-screen', '0', f'{width}x600x24'])
+        for display, width in zip(displays, [800, 1024])
+    ]
+    try:
+        time.sleep(1)
+        paths = []
+        for i, width in enumerate([800, 1024]):
+            path = tmp_path / f'{i}.json'
+            path.write_text(json.dumps({'allied_oob': None, 'axis_oob': {'army': 'Axis', 'size': [width, 600]}}))
+            paths.append(str(path))
+        sessions = [Session('a', displays[0]), Session('b', displays[1])]
+
+        results = list(populate_scenarios('cmak', paths, sessions, driver_factory=ScreenDriver))
+
+        assert len(results) == 2
+    finally:
+        for server in servers:
+            server.terminate()
@@ -0,0 +1,26 @@
+from PIL import Image
+
+from tac_scenario_generator.adapters.combat_mission.settle import (
+    get_thumbnail, wait_for_change, wait_for_stable)
+
+
+def _frames(*colors):
+    frames = [Image.new('RGB', (40, 40), color) for color in colors]
+
+    def capture():
+        return frames.pop(0) if len(frames) > 1 else frames[0]
+
+    return capture
+
+
+def test_wait_for_stable_returns_once_frames_stop_changing():
+    capture = _frames('black', 'white', 'red', 'red', 'red')
+
+    assert wait_for_stable(capture, timeout=1, interval=0, stable_frames=3)
+
+
+def test_wait_for_change_times_out_on_static_screen():
+    reference = get_thumbnail(Image.new('RGB', (40, 40), 'black'))
+
+    assert not wait_for_change(_frames('black'), reference, timeout=0.05, interval=0.01)
+    assert wait_for_change(_frames('black', 'white'), reference, timeout=1, interval=0)
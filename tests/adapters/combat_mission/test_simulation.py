@@ -0,0 +1,39 @@
+import pytest
+
+from tac_scenario_generator.adapters.combat_mission.simulation import simulate
+
+SCENARIO_CONFIG = {
+    'game_id': 'cmak',
+    'year': 1943,
+    'month': 'july',
+    'region': 'italy',
+    'armies': {
+        'Axis': {
+            'Italian': {
+                'On Map': {
+                    'Infantry': {
+                        'Fortification': [
+                            {'unit_name': 'random', 'count_min': 2, 'count_max': 8, 'all_same': True},
+                        ],
+                        'Support': [
+                            {'unit_name': 'random', 'count': 4, 'chance_per_unit': 51, 'chance': 50},
+                        ],
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+def test_simulate_matches_generation_rules():
+    simulation = simulate(SCENARIO_CONFIG, 20000, seed=1, batch_size=7000)['Axis']
+    distributions, units = simulation.get_summary()
+
+    assert simulation.n == 20000
+    # 2 to 8 fortifications, plus half the time 4 support units at 50% each.
+    assert distributions['units']['mean'] == pytest.approx(5 + 0.5 * 4 * 0.5, abs=0.05)
+    assert distributions['units']['p5'] >= 2
+    assert distributions['cost']['mean'] > 0
+    assert sum(stats['mean_count'] for stats in units.values()) == pytest.approx(distributions['units']['mean'])
+    assert all(0 < stats['appears_%'] <= 100 for stats in units.values())
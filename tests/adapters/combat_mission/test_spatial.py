@@ -0,0 +1,62 @@
+import random
+
+from tac_scenario_generator.adapters.combat_mission.spatial import \
+    DetectionIndex
+
+
+def _detection(text, left, top, width=40, height=12):
+    return ([[left, top], [left + width, top], [left + width, top + height], [left, top + height]], text, 0.9)
+
+
+# The unit type tabs, the unit list, and the CHOSEN panel to its right.
+DETECTIONS = [
+    _detection('Infantry', 300, 100),
+    _detection('Fortification', 100, 50),
+    _detection('Infantry', 20, 52),
+    _detection('Vehicle', 200, 49),
+    _detection('CHOSEN', 250, 80),
+    _detection('Rifle Platoon', 20, 100),
+    _detection('Rifle Platoon', 300, 120),
+]
+FORTIFICATION = (100, 50, 140, 62)
+CHOSEN = (250, 80, 290, 92)
+
+
+def test_find_on_same_row():
+    index = DetectionIndex(DETECTIONS)
+
+    match = index.find('Infantry', same_row_as=FORTIFICATION)
+
+    assert match['bbox'][0] == [20, 52]
+    assert match['fuzz_ratio'] == 100
+
+
+def test_query_left_of_and_below_anchor():
+    index = DetectionIndex(DETECTIONS)
+
+    results = index.query('Rifle Platoon', left_of=CHOSEN, below=FORTIFICATION)
+
+    assert [result['bbox'][0] for result in results] == [[20, 100]]
+    assert index.find('Vehicle', below=FORTIFICATION, min_score=80) is None
+
+
+def test_count_within_region():
+    index = DetectionIndex(DETECTIONS)
+
+    assert index.count('Rifle Platoon', 80, region=(249, 79, 200, 200)) == 1
+    assert index.count('Rifle', 80, region=(249, 79, 200, 200)) == 0
+
+
+def test_select_matches_brute_force_on_a_full_screen():
+    rng = random.Random(0)
+    words = ['Rifle', 'Platoon', 'Panzer', 'IV', 'Sherman', 'Mortar', 'HQ', 'Squad']
+    detections = [
+        _detection(' '.join(rng.sample(words, 3)), rng.randrange(1900), rng.randrange(1060)) for _ in range(500)
+    ]
+    index = DetectionIndex(detections)
+
+    selected = index.select(left_of=(1500, 0, 1600, 20), same_row_as=(0, 500, 40, 512))
+    expected = [bbox[0][0] < 1500 and abs(bbox[0][1] - 500) < 6 for bbox, _, _ in detections]
+    assert selected.tolist() == expected
+    result = index.find('Panzer IV Squad', left_of=(1500, 0, 1600, 20), same_row_as=(0, 500, 40, 512))
+    assert result['text'] in [detections[i][1] for i in range(500) if expected[i]]
@@ -0,0 +1,29 @@
+import json
+
+from tac_scenario_generator.adapters.combat_mission.tracing import Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+
+    with tracer.span('readtext', region=None):
+        pass
+
+    assert tracer.get_summary() == {}
+
+
+def test_tracer_saves_trace_and_summary(tmp_path):
+    tracer = Tracer(enabled=True)
+    with tracer.span('add_units', unit_type='Armor'):
+        with tracer.span('click'):
+            pass
+        with tracer.span('click'):
+            pass
+
+    trace_path, summary_path = tracer.save(tmp_path)
+
+    events = json.loads(trace_path.read_text())['traceEvents']
+    assert [event['name'] for event in events] == ['click', 'click', 'add_units']
+    assert events[2]['args'] == {'unit_type': 'Armor'}
+    assert tracer.get_summary()['click']['count'] == 2
+    assert 'add_units' in summary_path.read_text()
@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 import pytest
 
 from tac_scenario_generator.adapters import get_adapter
@@ -16,3 +19,23 @@ def test_get_adapter_happy_case():
 def test_get_adapter_invalid_game_id(game_id):
     with pytest.raises(ValueError, match=".* Must be one of .*"):
         get_adapter(game_id)
+
+
+def test_get_adapter_does_not_load_driver():
+    code = (
+        'import sys\n'
+        'from tac_scenario_generator.adapters import get_adapter\n'
+        'get_adapter("cmak").generate_oobs({}, save_debug=False)\n'
+        'assert "tac_scenario_generator.adapters.combat_mission.driver" not in sys.modules\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_simulation_does_not_load_driver():
+    code = (
+        'import sys\n'
+        'import tac_scenario_generator.adapters.combat_mission.simulation\n'
+        'assert "tac_scenario_generator.adapters.combat_mission.driver" not in sys.modules\n'
+        'assert "PIL" not in sys.modules\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)